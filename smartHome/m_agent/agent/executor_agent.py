@@ -8,7 +8,7 @@ from langchain.tools import tool
 from smartHome.m_agent.common.global_config import GLOBALCONFIG
 from smartHome.m_agent.memory.fact_memory import get_device_all_entities_states, get_device_all_entities_capabilities
 from smartHome.m_agent.memory.fake.tools_fake_request import tool_get_states_by_entity_id, tool_get_services_by_domain, \
-    tool_execute_action_by_entity_id
+    tool_execute_action_by_entity_id, tool_execute_actions_batch
 
 
 @tool
@@ -130,6 +130,7 @@ def execute_device_action(device_id: str, action: str):
                 """
     agent = create_agent(model=get_llm(),
                          tools=[get_device_all_entities_capabilities,tool_get_states_by_entity_id,tool_get_services_by_domain,tool_execute_action_by_entity_id,
+                                tool_execute_actions_batch,
                                 # check_smart_home_action_execution
                                 ],
                          middleware=[log_before, log_response, log_before_agent, log_after_agent],
@@ -15,6 +15,8 @@ from smartHome.m_agent.agent.langchain_middleware import AgentContext, log_befor
     log_after_agent
 from smartHome.m_agent.common.get_llm import get_llm
 from smartHome.m_agent.common.global_config import GLOBALCONFIG
+from smartHome.m_agent.memory.area_index import AREAINDEX
+from smartHome.m_agent.memory.capability_index import CAPABILITYINDEX
 from smartHome.m_agent.memory.fact_memory import SMARTHOMEMEMORY
 
 from pydantic import BaseModel, Field
@@ -93,6 +95,7 @@ class SmartHomeAgentState(TypedDict):
     messages: Annotated[list[AnyMessage], operator.add]
     command: str
 
+    area_candidate_devices: list[str] | None
     first_filter_devices: str
     second_filter_devices: str
     planning_result:str
@@ -111,28 +114,27 @@ class SmartHomeAgentState(TypedDict):
     llm_calls: int
 
 
-def node_filter_1(state:SmartHomeAgentState)-> Command[Literal["filter_2_node", END]]:
+def _filter_1_by_llm(state:SmartHomeAgentState, area_match)->DeviceIdList:
     """
-    筛选设备
-    :param state:
-    :return:
+    过滤一的LLM部分：根据设备的状态/能力简介选出可能的设备
+    :param area_match: 房间预筛结果，为None时考虑所有设备
     """
-    # json_str_compact = """{"devices":[{"device_id":"c86e3c14d0egbfc02g4cae35662d6944","device_name":"灯泡 灯","device_reason":"支持开关控制，可关闭"},{"device_id":"164c1a92b8ce9cda0e2a8c13440b4722","device_name":"灯泡  灯","device_reason":"支持开关控制，可关闭"},{"device_id":"b75d2b03c9dfaebf1f3b9d24551c5833","device_name":"灯泡  灯","device_reason":"支持开关控制，可关闭"},{"device_id":"31ae92d8a163d77f8d6a5741c0d1b89c","device_name":"米家智能台灯Lite","device_reason":"支持开关控制，可关闭"},{"device_id":"e2bf03e9b274e88f9e7b6852d1e2c90d","device_name":"米家智能台灯Lite","device_reason":"支持开关控制，可关闭"}]}"""
-    # content = [AIMessage(content=json_str_compact)]
-    # return Command(
-    #     update={"messages": content,
-    #             "first_filter_devices": json_str_compact},  # Store raw results or error
-    #     goto="filter_2_node"
-    # )
+    if area_match is None:
+        tools = [get_device_all_states, get_device_all_capabilities]
+        area_prompt = ""
+    else:
+        tools = [get_devices_states, get_devices_capabilities]
+        area_prompt = f"""
+        - 已按房间（{'、'.join(area_match.rooms)}）预筛出候选设备，只能从这些设备中选择，调用工具时传入这些设备ID：{area_match.device_ids}"""
 
     system_prompt = f"""
         根据所有的设备简介（设备能做什么，能从设备获取到什么），选出可能能用于完成此次任务的设备ID列表，并简单说明理由.
         - 通过调用工具获取设备信息
         - 如果【任务】里的设备有限定条件，比如床边的灯、卧室的空调等，你不需要在意限定条件，只需要根据设备能做什么、能获取什么来筛选可能的设备，之后会根据限定条件进一步筛选
-        - 如果理由是可能性的，那么说明理由应该包含"可能"，否则容易误导。比如插座，可能连接着服务器。
+        - 如果理由是可能性的，那么说明理由应该包含"可能"，否则容易误导。比如插座，可能连接着服务器。{area_prompt}
         """
     agent = create_agent(model=get_llm(),
-                         tools=[get_device_all_states, get_device_all_capabilities],
+                         tools=tools,
                         system_prompt=system_prompt,
                          response_format=DeviceIdList,
                          middleware=[log_before, log_response, log_before_agent, log_after_agent],
@@ -145,7 +147,35 @@ def node_filter_1(state:SmartHomeAgentState)-> Command[Literal["filter_2_node",
         context=AgentContext(agent_name="过滤一")
     )
 
-    deviceInfoList = result["structured_response"]
+    return result["structured_response"]
+
+def node_filter_1(state:SmartHomeAgentState)-> Command[Literal["filter_2_node", END]]:
+    """
+    筛选设备
+    :param state:
+    :return:
+    """
+    # json_str_compact = """{"devices":[{"device_id":"c86e3c14d0egbfc02g4cae35662d6944","device_name":"灯泡 灯","device_reason":"支持开关控制，可关闭"},{"device_id":"164c1a92b8ce9cda0e2a8c13440b4722","device_name":"灯泡  灯","device_reason":"支持开关控制，可关闭"},{"device_id":"b75d2b03c9dfaebf1f3b9d24551c5833","device_name":"灯泡  灯","device_reason":"支持开关控制，可关闭"},{"device_id":"31ae92d8a163d77f8d6a5741c0d1b89c","device_name":"米家智能台灯Lite","device_reason":"支持开关控制，可关闭"},{"device_id":"e2bf03e9b274e88f9e7b6852d1e2c90d","device_name":"米家智能台灯Lite","device_reason":"支持开关控制，可关闭"}]}"""
+    # content = [AIMessage(content=json_str_compact)]
+    # return Command(
+    #     update={"messages": content,
+    #             "first_filter_devices": json_str_compact},  # Store raw results or error
+    #     goto="filter_2_node"
+    # )
+
+    # 房间预筛：指令提到的房间能在注册表中确定时，只考虑这些房间内的设备
+    area_match = AREAINDEX.match(state['command'])
+    # 能力索引：意图明确（如关灯、查电量）时直接由domain/服务/传感器类型确定候选设备，不调用LLM
+    candidates = CAPABILITYINDEX.resolve(state['command'], area_match.device_ids if area_match else None)
+    if candidates is not None:
+        deviceInfoList = DeviceIdList(devices=[
+            DeviceInfo(device_id=candidate.device_id, device_name=candidate.device_name,
+                       device_reason=candidate.reason)
+            for candidate in candidates
+        ])
+        GLOBALCONFIG.print_nested_log(f"过滤一：能力索引直接给出{len(candidates)}个候选设备，跳过LLM")
+    else:
+        deviceInfoList = _filter_1_by_llm(state, area_match)
     # 无缩进（紧凑格式，适合传输/存储）
     json_str_compact = deviceInfoList.model_dump_json()
     # 带缩进（美化格式，适合调试/查看）
@@ -154,10 +184,26 @@ def node_filter_1(state:SmartHomeAgentState)-> Command[Literal["filter_2_node",
     content = [AIMessage(content=json_str_compact)]
     return Command(
         update={"messages": content,
+                "area_candidate_devices": area_match.device_ids if area_match else None,
                 "first_filter_devices":json_str_compact},  # Store raw results or error
         goto="filter_2_node"
     )
 
+def _restrict_to_area(first_filter_devices: str, area_device_ids: list[str]) -> str | None:
+    """
+    把过滤一的候选设备限制在房间预筛的设备内
+    :return: 限制后的候选设备JSON；无法解析或限制后为空时返回None（保持原候选）
+    """
+    try:
+        deviceInfoList = DeviceIdList.model_validate_json(first_filter_devices)
+    except ValueError:
+        return None
+    area_device_ids = set(area_device_ids)
+    devices = [device for device in deviceInfoList.devices if device.device_id in area_device_ids]
+    if not devices:
+        return None
+    return DeviceIdList(devices=devices).model_dump_json()
+
 def node_filter_2(state:SmartHomeAgentState)-> Command[Literal["planner_node", END]]:
     """
     筛选设备
@@ -165,6 +211,16 @@ def node_filter_2(state:SmartHomeAgentState)-> Command[Literal["planner_node", E
     :return:
     """
     # 不需要工具，从记忆里获取信息，进行初筛 和 细筛
+    # 房间预筛：候选设备只保留预筛房间内的设备，向量检索只针对这些设备，且不再检索已由注册表确定的房间约束
+    first_filter_devices = state["first_filter_devices"]
+    area_prompt = ""
+    area_device_ids = state.get("area_candidate_devices")
+    if area_device_ids is not None:
+        restricted = _restrict_to_area(first_filter_devices, area_device_ids)
+        if restricted is not None:
+            first_filter_devices = restricted
+            area_prompt = f"""
+        - 候选设备已按注册表确认位于指令提到的房间内，房间约束无需再检索，只能对这些设备ID调用工具：{area_device_ids}"""
     # json_str_compact = """{"devices":[{"device_id":"164c1a92b8ce9cda0e2a8c13440b4722","device_name":"灯泡  盏","device_reason":"标注为卧室灯，支持开/关及亮度/色温调节"}"""
     #
     # content = [AIMessage(content=json_str_compact)]
@@ -176,7 +232,7 @@ def node_filter_2(state:SmartHomeAgentState)-> Command[Literal["planner_node", E
 
     prompt=f"""
     【任务】：{state["command"]}
-    【候选设备集】：{state["first_filter_devices"]}
+    【候选设备集】：{first_filter_devices}
     - 候选设备的理由仅供参考，并不能说明该设备就一定满足条件。
     如果用户指令包含约束条件，根据约束条件（设备环境信息、用户对设备的称呼等），从候选设备里挑出满足的设备。
     - 比如用户要打开客厅餐桌的灯和卧室床边的灯，候选设备集里有两盏灯（灯1和灯2），那么需要调用tool获取这两盏灯各自与[[客厅，餐桌],[卧室，床边]]的相似记忆内容。
@@ -188,13 +244,13 @@ def node_filter_2(state:SmartHomeAgentState)-> Command[Literal["planner_node", E
     """
     prompt = f"""
         【任务】：{state["command"]}
-        【候选设备集】：{state["first_filter_devices"]}
+        【候选设备集】：{first_filter_devices}
         - 候选设备的理由仅供参考，并不能说明该设备就一定满足条件。
         如果用户指令包含约束条件，根据约束条件（设备环境信息、用户对设备的称呼等），从候选设备里挑出满足的设备。
         - 比如用户要打开客厅餐桌的灯和卧室床边的灯，候选设备集里有两盏灯（灯1和灯2），那么需要调用tool获取这两盏灯各自与[[客厅，餐桌],[卧室，床边]]的相似记忆内容。
         - 然后检查是否有说明这两盏灯满足条件，如果都不满足，那么不应该选用。比如灯1的检索到的记忆既没说明其在卧室，也没说明其在客厅，那么不该选出灯1
         - 用户如果明确给出了设备ID，那就直接用好了，不用再分析
-        - 不要选出明显没用的设备
+        - 不要选出明显没用的设备{area_prompt}
         最后保留设备ID，和简单说明理由。如果没有任何设备满足约束条件，说明原因。
         """
     agent = create_agent(model=get_llm(),
@@ -4,10 +4,10 @@ from langchain_core.callbacks import CallbackManager
 from smartHome.m_agent.common.global_config import GLOBALCONFIG
 
 
-def get_llm():
+def get_llm(model: str = None):
     # max_tokens: int = 1000
     provider=GLOBALCONFIG.provider
-    model = GLOBALCONFIG.model
+    model = model or GLOBALCONFIG.model
     base_url = GLOBALCONFIG.base_url
     api_key = GLOBALCONFIG.api_key
 
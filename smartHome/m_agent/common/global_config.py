@@ -1,16 +1,21 @@
 import configparser
 import os
+import threading
 
 from smartHome.m_agent.common.logger import get_logger, setup_dynamic_indent_logger
 
 
 class Global_Config():
     def __init__(self):
+        # 后台线程（如记忆更新）可隔离自己的嵌套日志器与层级计数，避免与前台agent互相串日志
+        self._thread_local = threading.local()
         self.configparser=self.load_configparser()
         self.provider = self.configparser.get("base", 'selected_llm_provider')
         self.model = self.configparser.get(self.provider, 'model')
         self.base_url = self.configparser.get(self.provider, 'base_url')
         self.api_key = self.configparser.get(self.provider, 'api_key')
+        # 轻量判断（如记忆门控）使用的小模型，未配置时沿用主模型
+        self.small_model = self.configparser.get(self.provider, 'small_model', fallback="") or self.model
 
         # 日志
         self.logger = get_logger("my_test","logs/my_test.log")
@@ -31,6 +36,21 @@ class Global_Config():
         self.homeassitant_api_isopen=False
         self.homeassitant_token = self.configparser.get("homeassitant", 'homeassitant_token')
         self.homeassitant_server = self.configparser.get("homeassitant", 'homeassitant_server_ip_port')
+        # HA交互录制/回放（见memory/fake/ha_recorder.py）：录制日志路径、回放日志路径（优先于录制）、回放耗时倍数
+        self.ha_record_path = self.configparser.get("homeassitant", 'ha_record_path', fallback="") or None
+        self.ha_replay_path = self.configparser.get("homeassitant", 'ha_replay_path', fallback="") or None
+        self.ha_replay_latency_scale = self.configparser.getfloat("homeassitant", 'ha_replay_latency_scale', fallback=1.0)
+        # 模拟HA（见memory/fake/fake_do_service.py）：为True时打印服务执行异常的完整堆栈，默认只打印一行异常信息
+        self.fake_ha_debug = self.configparser.getboolean("homeassitant", 'fake_ha_debug', fallback=False)
+        # HA客户端（见common/ha_client.py）：连接池大小、连接池个数、连接超时、读取超时（秒）、是否保持长连接
+        self.ha_pool_size = self.configparser.getint("homeassitant", 'ha_pool_size', fallback=10)
+        self.ha_pool_connections = self.configparser.getint("homeassitant", 'ha_pool_connections', fallback=1)
+        self.ha_connect_timeout = self.configparser.getfloat("homeassitant", 'ha_connect_timeout', fallback=3.05)
+        self.ha_read_timeout = self.configparser.getfloat("homeassitant", 'ha_read_timeout', fallback=30)
+        self.ha_keep_alive = self.configparser.getboolean("homeassitant", 'ha_keep_alive', fallback=True)
+
+        # 测试用例的记忆快照名（见memory/memory_snapshot.py）：每个用例开始前恢复该快照；快照需事先保存，不存在时测试直接报错
+        self.test_snapshot = self.configparser.get("test", 'test_snapshot', fallback="test_baseline")
     def load_configparser(self):
         # 获取当前文件(global_config.py)的绝对路径
         current_file_path = os.path.abspath(__file__)
@@ -50,6 +70,42 @@ class Global_Config():
 
         return llm_configparser
 
+    @property
+    def nested_logger(self):
+        if getattr(self._thread_local, "isolated", False):
+            return self._thread_local.nested_logger
+        return self._nested_logger
+
+    @nested_logger.setter
+    def nested_logger(self, logger):
+        if getattr(self._thread_local, "isolated", False):
+            self._thread_local.nested_logger = logger
+        else:
+            self._nested_logger = logger
+
+    @property
+    def nested_agent_map(self):
+        if getattr(self._thread_local, "isolated", False):
+            return self._thread_local.nested_agent_map
+        return self._nested_agent_map
+
+    @nested_agent_map.setter
+    def nested_agent_map(self, agent_map):
+        if getattr(self._thread_local, "isolated", False):
+            self._thread_local.nested_agent_map = agent_map
+        else:
+            self._nested_agent_map = agent_map
+
+    def isolate_thread_logger(self, logger):
+        """
+        让当前线程使用独立的嵌套日志器和agent层级计数；
+        之后该线程内对nested_logger/nested_agent_map的读写都不会影响其他线程
+        :param logger: 当前线程使用的日志器
+        """
+        self._thread_local.isolated = True
+        self._thread_local.nested_logger = logger
+        self._thread_local.nested_agent_map = {}
+
     def print_nested_log(self, message: str,level: int=-1):
         """
         封装嵌套日志打印函数，根据层级自动计算缩进
@@ -0,0 +1,106 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HAClient():
+    """
+    Home Assistant REST接口的共享客户端：
+    - 连接池（requests.Session + HTTPAdapter），HTTP/1.1 keep-alive复用TCP连接，避免每次调用重新握手
+    - 认证等请求头只构建一次
+    - 连接/读取超时，避免HA无响应时工具调用一直阻塞
+    - 声明接受gzip压缩的响应（/api/states等大响应体传输更快，requests自动解压）
+    """
+    def __init__(self, base_url: str, token: str, pool_size: int = 10, connect_timeout: float = 3.05,
+                 read_timeout: float = 30, keep_alive: bool = True, pool_connections: int = 1):
+        """
+        :param base_url: 如 http://192.168.1.2:8123
+        :param pool_size: 连接池大小（同时保持的连接数，并发调用超过时会新建临时连接）
+        :param keep_alive: False时每个请求后关闭连接
+        :param pool_connections: 缓存的连接池个数（每个主机一个池；只访问一个HA地址时1即可）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive" if keep_alive else "close",
+        })
+
+    def request(self, method: str, path: str, payload: Any = None, timeout: Optional[float] = None) -> Any:
+        """
+        发送请求并返回JSON响应
+        :param timeout: 可选，覆盖本次请求的超时（秒）
+        :raise requests.HTTPError: 响应状态码不是2xx
+        """
+        response = self.session.request(method, f"{self.base_url}{path}", json=payload,
+                                        timeout=timeout or self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get(self, path: str, timeout: Optional[float] = None) -> Any:
+        return self.request("GET", path, timeout=timeout)
+
+    def post(self, path: str, payload: Any, timeout: Optional[float] = None) -> Any:
+        return self.request("POST", path, payload, timeout=timeout)
+
+    # ---------------------- HA接口 ----------------------
+    def get_states(self) -> Any:
+        return self.get("/api/states")
+
+    def get_state(self, entity_id: str) -> Any:
+        return self.get(f"/api/states/{entity_id}")
+
+    def get_services(self) -> Any:
+        return self.get("/api/services")
+
+    def call_service(self, domain: str, service: str, payload: Dict[str, Any]) -> Any:
+        return self.post(f"/api/services/{domain}/{service}", payload)
+
+    def close(self):
+        self.session.close()
+
+
+_clients: Dict[Tuple[str, str], HAClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_ha_client(base_url: Optional[str] = None, token: Optional[str] = None) -> HAClient:
+    """
+    获取共享的HA客户端（同一地址和令牌只创建一次，连接池在所有工具间共享）。
+    使用GLOBALCONFIG中的地址和令牌时，连接池大小、超时和keep-alive也取自GLOBALCONFIG的ha_*配置
+    :param base_url: 默认为GLOBALCONFIG中的HA地址
+    :param token: 默认为GLOBALCONFIG中的令牌
+    """
+    config = None
+    if base_url is None or token is None:
+        # 延迟导入：sage等基线使用自己的配置，显式传入地址和令牌时不需要加载全局配置
+        from smartHome.m_agent.common.global_config import GLOBALCONFIG
+        config = GLOBALCONFIG
+        base_url = base_url or f"http://{config.homeassitant_server}"
+        token = token or config.homeassitant_token
+    key = (base_url.rstrip("/"), token)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                options = {}
+                if config is not None:
+                    options = {
+                        "pool_size": config.ha_pool_size,
+                        "pool_connections": config.ha_pool_connections,
+                        "connect_timeout": config.ha_connect_timeout,
+                        "read_timeout": config.ha_read_timeout,
+                        "keep_alive": config.ha_keep_alive,
+                    }
+                client = HAClient(base_url, token, **options)
+                _clients[key] = client
+    return client
@@ -0,0 +1,32 @@
+import threading
+from contextlib import contextmanager
+
+
+class KeyedLock():
+    """
+    按key分配的可重入锁：相同key的操作串行执行，不同key之间互不阻塞。
+    不再被持有的key会自动回收，避免锁字典无限增长
+    """
+    def __init__(self):
+        self._mutex = threading.Lock()
+        # key -> [RLock, 引用计数]
+        self._locks = {}
+
+    @contextmanager
+    def hold(self, key):
+        """持有key对应的锁（with语句使用）"""
+        with self._mutex:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = [threading.RLock(), 0]
+                self._locks[key] = entry
+            entry[1] += 1
+        entry[0].acquire()
+        try:
+            yield
+        finally:
+            entry[0].release()
+            with self._mutex:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
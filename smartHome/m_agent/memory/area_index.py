@@ -0,0 +1,169 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from smartHome.m_agent.memory.device_info import DEVICEINFO
+
+# 常见房间：规范名 -> 别名（中文称呼、拼音片段、英文）。拼音片段用于从HA的area_id（如3108946409de_jia_ke_ting）识别房间
+ROOM_ALIASES: Dict[str, List[str]] = {
+    "客厅": ["客厅", "起居室", "大厅", "ke_ting", "keting", "living_room", "living room", "livingroom", "lounge"],
+    "主卧": ["主卧", "主卧室", "zhu_wo", "zhuwo", "master_bedroom", "master bedroom"],
+    "次卧": ["次卧", "次卧室", "ci_wo", "ciwo", "guest_room", "guest room", "second bedroom"],
+    "卧室": ["卧室", "睡房", "wo_shi", "woshi", "bedroom", "bed room"],
+    "儿童房": ["儿童房", "儿童间", "小孩房", "er_tong_fang", "kids_room", "kids room", "nursery"],
+    "书房": ["书房", "工作间", "办公室", "shu_fang", "shufang", "study", "office"],
+    "厨房": ["厨房", "chu_fang", "chufang", "kitchen"],
+    "餐厅": ["餐厅", "饭厅", "can_ting", "canting", "dining_room", "dining room", "dining"],
+    "卫生间": ["卫生间", "洗手间", "浴室", "厕所", "wei_sheng_jian", "weishengjian", "yu_shi", "bathroom",
+            "restroom", "toilet"],
+    "阳台": ["阳台", "yang_tai", "yangtai", "balcony"],
+    "玄关": ["玄关", "门厅", "入户", "xuan_guan", "xuanguan", "entrance", "entryway", "hallway"],
+    "走廊": ["走廊", "过道", "zou_lang", "corridor"],
+    "车库": ["车库", "che_ku", "garage"],
+    "花园": ["花园", "院子", "hua_yuan", "garden", "yard"],
+}
+
+
+@dataclass
+class AreaMatch:
+    """指令中识别出的房间及其包含的设备/实体"""
+    rooms: List[str]
+    area_ids: List[str]
+    device_ids: List[str]
+    entity_ids: List[str] = field(default_factory=list)
+
+
+class AreaIndex():
+    """
+    房间索引：area_id -> 设备ID -> 实体ID，并支持中文房间名/拼音/英文别名匹配。
+    用作设备过滤的前置筛选：指令中提到房间时，确定性地把候选设备缩小到这些房间内。
+    只有能安全缩小范围时才返回结果：
+    - 指令里没有提到房间、提到的房间在注册表里找不到对应area，返回None（交给后续的向量检索和LLM判断）
+    - 匹配到的设备覆盖了全部设备（没有缩小范围），同样返回None
+    """
+    def __init__(self, device_info=DEVICEINFO):
+        self.device_info = device_info
+        self._lock = threading.Lock()
+        self._built = False
+        self.area_devices: Dict[str, List[str]] = {}
+        self.area_rooms: Dict[str, Set[str]] = {}
+        self.custom_aliases: Dict[str, Set[str]] = {}
+
+    def _area_to_rooms(self, area_id: str) -> Set[str]:
+        """根据area_id中的拼音/英文片段识别规范房间名"""
+        normalized = area_id.lower()
+        rooms = set()
+        for room, aliases in ROOM_ALIASES.items():
+            for alias in aliases:
+                alias = alias.lower()
+                if not alias.isascii():
+                    if alias in normalized:
+                        rooms.add(room)
+                    continue
+                # 拼音/英文片段需按单词边界匹配，避免wo_shi匹配到其他拼音
+                pattern = r"(^|[_\s])" + re.escape(alias.replace(" ", "_")) + r"($|[_\s])"
+                if re.search(pattern, normalized.replace(" ", "_")):
+                    rooms.add(room)
+        return rooms
+
+    def build(self):
+        """从DEVICEINFO建立索引（设备归入其注册信息中的area，以及其实体单独指定的area）"""
+        with self._lock:
+            area_devices: Dict[str, List[str]] = {}
+            for device_id in self.device_info.device_entity_mapping:
+                device_record = self.device_info.get_device_record(device_id)
+                area_ids = set()
+                if device_record and device_record.area_id:
+                    area_ids.add(device_record.area_id)
+                for entity_id in self.device_info.device_entity_mapping[device_id]:
+                    entity_record = self.device_info.get_entity_record(entity_id)
+                    if entity_record and entity_record.area_id:
+                        area_ids.add(entity_record.area_id)
+                for area_id in area_ids:
+                    area_devices.setdefault(area_id, []).append(device_id)
+            self.area_devices = area_devices
+            self.area_rooms = {area_id: self._area_to_rooms(area_id) for area_id in area_devices}
+            for area_id, aliases in self.custom_aliases.items():
+                self.area_rooms.setdefault(area_id, set()).update(aliases)
+            self._built = True
+
+    def _ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def invalidate(self):
+        """注册表变化后调用，下次查询时重建索引"""
+        self._built = False
+
+    def add_alias(self, area_id: str, alias: str):
+        """为area添加自定义别名（如「主卧」对应某个area_id）"""
+        self.custom_aliases.setdefault(area_id, set()).add(alias)
+        if self._built:
+            self.area_rooms.setdefault(area_id, set()).add(alias)
+
+    def find_rooms(self, command: str) -> List[str]:
+        """识别指令中提到的房间（返回规范名；自定义别名原样返回）"""
+        text = command.lower()
+        mentions = []
+        for room, aliases in ROOM_ALIASES.items():
+            # 长别名优先，「主卧」不会被同时识别为「卧室」
+            for alias in sorted(aliases, key=len, reverse=True):
+                if alias.isascii():
+                    if re.search(r"\b" + re.escape(alias) + r"\b", text):
+                        mentions.append((text.find(alias), len(alias), room))
+                        break
+                elif alias in text:
+                    mentions.append((text.find(alias), len(alias), room))
+                    break
+        for aliases in self.custom_aliases.values():
+            for alias in aliases:
+                if alias.lower() in text:
+                    mentions.append((text.find(alias.lower()), len(alias), alias))
+        # 去掉被更长提及覆盖的房间（如「主卧室」里的「卧室」）
+        rooms = []
+        for start, length, room in sorted(mentions, key=lambda m: -m[1]):
+            covered = any(s <= start and start + length <= s + l and (s, l) != (start, length)
+                          for s, l, _ in mentions)
+            if not covered and room not in rooms:
+                rooms.append(room)
+        return rooms
+
+    def match(self, command: str) -> Optional[AreaMatch]:
+        """
+        按指令中提到的房间预筛设备
+        :return: AreaMatch；无法确定性缩小范围时返回None
+        """
+        self._ensure_built()
+        rooms = self.find_rooms(command)
+        if not rooms:
+            return None
+        area_ids = []
+        for room in rooms:
+            room_area_ids = [area_id for area_id, area_rooms in self.area_rooms.items() if room in area_rooms]
+            if not room_area_ids:
+                # 提到的房间在注册表中没有对应area（房间信息可能只存在于用户记忆里），不能安全缩小范围
+                return None
+            area_ids.extend(room_area_ids)
+        device_ids = []
+        for area_id in area_ids:
+            for device_id in self.area_devices.get(area_id, []):
+                if device_id not in device_ids:
+                    device_ids.append(device_id)
+        if not device_ids or len(device_ids) >= len(self.device_info.device_entity_mapping):
+            return None
+        entity_ids = [
+            entity_id for device_id in device_ids
+            for entity_id in self.device_info.device_entity_mapping.get(device_id, [])
+        ]
+        return AreaMatch(rooms=rooms, area_ids=area_ids, device_ids=device_ids, entity_ids=entity_ids)
+
+
+AREAINDEX = AreaIndex()
+
+if __name__ == "__main__":
+    AREAINDEX.build()
+    for area_id, device_ids in AREAINDEX.area_devices.items():
+        print(area_id, AREAINDEX.area_rooms[area_id], len(device_ids))
+    for command in ["打开客厅灯", "打开主卧床边的灯", "turn on the living room light", "关闭所有灯"]:
+        print(command, AREAINDEX.find_rooms(command), AREAINDEX.match(command))
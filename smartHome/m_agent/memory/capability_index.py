@@ -0,0 +1,291 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from smartHome.m_agent.memory.device_info import DEVICEINFO
+from smartHome.m_agent.memory.fact_store import FACTSTORE
+
+
+@dataclass(slots=True)
+class EntityCapability():
+    """单个实体的能力：domain、可用服务、颜色模式、数值范围、传感器类型"""
+    entity_id: str
+    device_id: str
+    domain: str
+    friendly_name: str
+    services: Tuple[str, ...] = ()
+    color_modes: Tuple[str, ...] = ()
+    device_class: Optional[str] = None
+    numeric_range: Optional[Tuple[float, float]] = None
+    unit: Optional[str] = None
+
+
+@dataclass
+class Intent:
+    """从指令解析出的意图：动作 + 目标类型"""
+    action: str
+    target: str
+
+
+@dataclass
+class CapabilityCandidate:
+    """能力索引给出的候选设备"""
+    device_id: str
+    device_name: str
+    reason: str
+    entity_ids: List[str] = field(default_factory=list)
+
+
+def _is_light(cap: EntityCapability) -> bool:
+    return cap.domain == "light"
+
+
+def _is_media(cap: EntityCapability) -> bool:
+    return cap.domain == "media_player"
+
+
+def _is_battery(cap: EntityCapability) -> bool:
+    return cap.domain == "sensor" and cap.device_class == "battery"
+
+
+def _is_illuminance(cap: EntityCapability) -> bool:
+    return cap.domain == "sensor" and (cap.device_class == "illuminance" or "光照" in cap.friendly_name)
+
+
+def _is_motion(cap: EntityCapability) -> bool:
+    return cap.device_class in ("motion", "occupancy", "presence")
+
+
+def _is_door(cap: EntityCapability) -> bool:
+    return cap.domain == "binary_sensor" and cap.device_class in ("door", "window", "opening", "garage_door")
+
+
+def _is_temperature(cap: EntityCapability) -> bool:
+    return cap.domain == "sensor" and cap.device_class == "temperature"
+
+
+def _is_humidity(cap: EntityCapability) -> bool:
+    return cap.domain == "sensor" and cap.device_class == "humidity"
+
+
+def _is_outlet(cap: EntityCapability) -> bool:
+    return cap.domain == "switch" and (cap.device_class == "outlet" or "插座" in cap.friendly_name)
+
+
+# 目标类型 -> (指令关键词, 实体匹配函数, 显示名)
+TARGETS: Dict[str, Tuple[List[str], Callable[[EntityCapability], bool], str]] = {
+    "light": (["灯", "照明", "light"], _is_light, "灯"),
+    "media": (["音乐", "音箱", "歌", "music", "speaker", "song"], _is_media, "音箱"),
+    "battery": (["电池", "电量", "battery"], _is_battery, "电池电量传感器"),
+    "illuminance": (["光照", "照度", "光线", "illuminance", "light level"], _is_illuminance, "光照传感器"),
+    "motion": (["人体传感器", "有人", "移动", "motion", "human body sensor", "occupancy"], _is_motion, "人体/移动传感器"),
+    "door": (["门窗", "窗户", "门磁", "door", "window"], _is_door, "门窗传感器"),
+    "temperature": (["温度", "temperature"], _is_temperature, "温度传感器"),
+    "humidity": (["湿度", "humidity"], _is_humidity, "湿度传感器"),
+    "outlet": (["插座", "socket", "plug", "outlet"], _is_outlet, "插座"),
+}
+# 容易被误识别为目标的词（如「指示灯」不是灯）
+_TARGET_EXCLUDES = {"light": ["指示灯", "indicator"]}
+
+# 动作 -> (指令关键词, 需要的服务；None表示读取状态)
+ACTIONS: Dict[str, Tuple[List[str], Optional[str]]] = {
+    "turn_on": (["打开", "开启", "开灯", "turn on", "switch on"], "turn_on"),
+    "turn_off": (["关闭", "关掉", "关上", "关灯", "turn off", "switch off"], "turn_off"),
+    "toggle": (["切换", "toggle"], "toggle"),
+    "play": (["播放", "play"], "media_play"),
+    "pause": (["暂停", "pause"], "media_pause"),
+    "read": (["吗", "多少", "是否", "状态", "检查", "查看", "查询", "?", "？", "check", "how much", "status"], None),
+}
+# 指令点名了具体设备或属性（如「台灯」「亮度」「more light」）时，按目标类型给出的候选会过宽或动作不确定，交给LLM
+_SPECIFIC_MARKERS = ["台灯", "灯泡", "吸顶灯", "灯带", "落地灯", "网关", "lamp", "bulb", "gateway",
+                     "亮度", "色温", "颜色", "音量", "模式", "亮一点", "暗一点", "调亮", "调暗", "更亮", "更暗",
+                     "brightness", "color", "volume", "mode", "more", "less", "dim", "brighter", "darker"]
+# 出现这些词说明指令带条件/联动/持久化，规则索引不做判断，交给LLM
+_COMPLEX_MARKERS = ["如果", "当", "除了", "除非", "持久化", "每当", "之后", "以后", "自动", "然后", "并且", "同时",
+                    "if ", "when", "unless", "except", "then", "after", "before", "while", "automat"]
+# 指令分句：多个分句（如「播放晴天，关闭卧室灯」）可能各有动作和目标，交给LLM
+_CLAUSE_SPLIT = re.compile(r"[，,、；;]|\band\b|然后|再")
+# ACTIONS之外的动作词：去掉已识别的动作后仍出现这些词，说明指令还有规则无法执行的部分，交给LLM
+_OTHER_VERBS = ["放", "听", "唱", "调低", "调高", "调到", "调成", "调节", "设置", "设为", "设成", "设定", "增加", "减少",
+                "减小", "降低", "提高", "升高", "换", "切到", "继续", "静音", "下一首", "上一首", "重播",
+                "turn", "set", "increase", "decrease", "lower", "raise", "adjust", "change", "skip", "next",
+                "previous", "mute", "listen", "resume", "replay", "stop"]
+# 记忆中用于发现「间接控制」关系的字段（如插座连着台灯）
+_LINK_FACT_FIELDS = ("device_id_clues", "usage_habits", "others")
+
+
+class CapabilityIndex():
+    """
+    能力索引：由entities.json/domains_services.json建立 实体能力 -> 设备 的映射，
+    并提供从意图（动作 + 目标类型）到候选设备的确定性查询。
+    resolve()只在规则能确定时给出答案（单一动作、单一目标、无条件/联动描述、有候选），否则返回None交给LLM
+    """
+    def __init__(self, device_info=DEVICEINFO, fact_store=FACTSTORE):
+        self.device_info = device_info
+        self.fact_store = fact_store
+        self._lock = threading.Lock()
+        self._built = False
+        self.device_capabilities: Dict[str, List[EntityCapability]] = {}
+
+    def build(self):
+        """从DEVICEINFO建立索引"""
+        with self._lock:
+            device_capabilities = {}
+            for device_id, entity_ids in self.device_info.device_entity_mapping.items():
+                capabilities = []
+                for entity_id in entity_ids:
+                    record = self.device_info.get_entity_record(entity_id)
+                    if record is None:
+                        continue
+                    attributes = record.attributes
+                    service_record = self.device_info.get_service_record(record.domain)
+                    numeric_range = None
+                    if isinstance(attributes.get("min"), (int, float)) and isinstance(attributes.get("max"), (int, float)):
+                        numeric_range = (attributes["min"], attributes["max"])
+                    capabilities.append(EntityCapability(
+                        entity_id=entity_id,
+                        device_id=device_id,
+                        domain=record.domain,
+                        friendly_name=record.friendly_name,
+                        services=service_record.service_names if service_record else (),
+                        color_modes=tuple(attributes.get("supported_color_modes") or ()),
+                        device_class=attributes.get("device_class"),
+                        numeric_range=numeric_range,
+                        unit=attributes.get("unit_of_measurement"),
+                    ))
+                device_capabilities[device_id] = capabilities
+            self.device_capabilities = device_capabilities
+            self._built = True
+
+    def _ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def invalidate(self):
+        """注册表变化后调用，下次查询时重建索引"""
+        self._built = False
+
+    @staticmethod
+    def _match_keywords(text: str, keywords: List[str]) -> bool:
+        for keyword in keywords:
+            if keyword.isascii() and keyword.strip().isalpha():
+                if re.search(r"\b" + re.escape(keyword.strip()) + r"s?\b", text):
+                    return True
+            elif keyword in text:
+                return True
+        return False
+
+    def parse_intent(self, command: str) -> Optional[Intent]:
+        """
+        解析指令意图，只有单一分句、动作和目标都唯一、且没有其他动作词时才返回
+        :return: Intent；无法确定时返回None
+        """
+        text = command.lower().strip()
+        if self._match_keywords(text, _COMPLEX_MARKERS) or self._match_keywords(text, _SPECIFIC_MARKERS):
+            return None
+        clauses = [clause for clause in _CLAUSE_SPLIT.split(text.rstrip("。.!！?？ ")) if clause.strip()]
+        if len(clauses) > 1:
+            return None
+        targets = []
+        for target, (keywords, _, _) in TARGETS.items():
+            if any(exclude in text for exclude in _TARGET_EXCLUDES.get(target, [])):
+                continue
+            if self._match_keywords(text, keywords):
+                targets.append(target)
+        actions = [action for action, (keywords, _) in ACTIONS.items() if self._match_keywords(text, keywords)]
+        # 「打开了吗」这类疑问句按读取状态处理
+        if "read" in actions and len(actions) > 1 and re.search(r"(吗|呢|\?|？)\s*$", text):
+            actions = ["read"]
+        if len(targets) != 1 or len(actions) != 1:
+            return None
+        # 去掉识别出的动作词后，剩余部分还有其他动作词（如「播放」以外的「放」「调低」），说明还有未识别的操作
+        leftover = text
+        for keyword in sorted(ACTIONS[actions[0]][0], key=len, reverse=True):
+            leftover = leftover.replace(keyword, " ")
+        if self._match_keywords(leftover, _OTHER_VERBS):
+            return None
+        return Intent(action=actions[0], target=targets[0])
+
+    def query(self, intent: Intent, device_ids: Optional[List[str]] = None) -> List[CapabilityCandidate]:
+        """
+        按意图查询候选设备
+        :param intent: 动作 + 目标类型
+        :param device_ids: 可选，只在这些设备中查询（如房间预筛的结果）
+        """
+        self._ensure_built()
+        _, matcher, target_name = TARGETS[intent.target]
+        required_service = ACTIONS[intent.action][1]
+        candidates = []
+        for device_id, capabilities in self.device_capabilities.items():
+            if device_ids is not None and device_id not in device_ids:
+                continue
+            matched = [cap for cap in capabilities
+                       if matcher(cap) and (required_service is None or required_service in cap.services)]
+            device_record = self.device_info.get_device_record(device_id)
+            device_name = device_record.display_name if device_record else device_id
+            if matched:
+                action_desc = f"支持{required_service}" if required_service else "可读取状态"
+                candidates.append(CapabilityCandidate(
+                    device_id=device_id,
+                    device_name=device_name,
+                    reason=f"包含{target_name}实体（{matched[0].domain}），{action_desc}",
+                    entity_ids=[cap.entity_id for cap in matched],
+                ))
+            elif required_service is not None:
+                linked = self._linked_candidate(device_id, device_name, capabilities, intent, required_service)
+                if linked is not None:
+                    candidates.append(linked)
+        return candidates
+
+    def _linked_candidate(self, device_id: str, device_name: str, capabilities: List[EntityCapability],
+                          intent: Intent, required_service: str) -> Optional[CapabilityCandidate]:
+        """开关类设备的记忆中提到了目标（如插座连着台灯），可能间接控制目标，作为「可能」的候选"""
+        switches = [cap for cap in capabilities if cap.domain == "switch" and required_service in cap.services]
+        if not switches:
+            return None
+        device_fact = self.fact_store.get_device_fact(device_id) or {}
+        keywords = TARGETS[intent.target][0]
+        for field_name in _LINK_FACT_FIELDS:
+            for content in device_fact.get(field_name) or []:
+                if self._match_keywords(str(content).lower(), keywords):
+                    return CapabilityCandidate(
+                        device_id=device_id,
+                        device_name=device_name,
+                        reason=f"可能：记忆显示「{content}」，可通过开关间接控制",
+                        entity_ids=[cap.entity_id for cap in switches],
+                    )
+        return None
+
+    def resolve(self, command: str, device_ids: Optional[List[str]] = None) -> Optional[List[CapabilityCandidate]]:
+        """
+        规则能确定时直接给出候选设备，否则返回None
+        :param command: 用户指令
+        :param device_ids: 可选，只在这些设备中查询
+        """
+        intent = self.parse_intent(command)
+        if intent is None:
+            return None
+        candidates = self.query(intent, device_ids)
+        if self._names_subset(command, candidates):
+            return None
+        return candidates or None
+
+    def _names_subset(self, command: str, candidates: List[CapabilityCandidate]) -> bool:
+        """指令中提到了某些候选设备的名称（如用户自定义的「床头灯」），说明只针对其中一部分，不能按类型全选"""
+        text = command.lower()
+        named = [candidate for candidate in candidates
+                 if candidate.device_name and candidate.device_name.lower() in text]
+        return 0 < len(named) < len(candidates)
+
+
+CAPABILITYINDEX = CapabilityIndex()
+
+if __name__ == "__main__":
+    for command in ["Turn off all the lights.", "Are all the lights on?", "Turn off the music.",
+                    "Does the human body sensor need battery replacement?", "关闭所有灯", "将整个房子变暗",
+                    "调低网关指示灯亮度", "Network status", "I need more light", "Is the desk lamp on?", "打开台灯",
+                    "播放晴天，关闭卧室灯。", "Play 'Sunny Day' and turn off the bedroom light.", "Pause the music."]:
+        print(command, CAPABILITYINDEX.parse_intent(command))
+        for candidate in CAPABILITYINDEX.resolve(command) or []:
+            print("   ", candidate.device_name, candidate.reason)
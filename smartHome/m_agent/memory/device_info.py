@@ -1,51 +1,216 @@
 import json
 import os
+import threading
+
+from smartHome.m_agent.memory.records import EntityRecord, DeviceRecord, ServiceRecord
+from smartHome.m_agent.memory.registry_loader import REGISTRYLOADER, DATA_DIR
+
+# DeviceInfo常驻内存的设备注册信息字段（connections、identifiers、config_entries、创建/修改时间等agent用不到，不保留）
+RETAINED_DEVICE_FIELDS = ("id", "name", "name_by_user", "area_id", "manufacturer", "model", "model_id", "sw_version",
+                          "hw_version", "disabled_by", "entry_type", "via_device_id", "labels")
+# DeviceInfo常驻内存的实体字段：context和last_changed等时间戳只由模拟HA（HOMEASSITANT_DATA）维护
+RETAINED_ENTITY_FIELDS = ("entity_id", "state", "attributes")
+
+
+def _compact(item, fields):
+    """只保留fields中的键（值不复制，与原字典共享）"""
+    return {key: item[key] for key in fields if key in item}
 
 
 class DeviceInfo():
-    def __init__(self):
+    def __init__(self, data_dir=None):
+        # 注册表数据目录，默认为DATA_DIR
+        self.data_dir = data_dir or DATA_DIR
         self.devices=self.load_devices()
         self.entities=self.load_entitied()
-        self.device_entity_mapping=self.init_device_entity_mapping()
         self.domains_services=self.load_domains_services()
-        self.save_all_instance_vars_to_json()
+        self._build_indexes()
+        self.device_entity_mapping=self.init_device_entity_mapping()
+        self._build_records()
+        # 增量更新（注册表同步）时使用
+        self._write_lock = threading.RLock()
+
+    def _build_indexes(self):
+        """加载后一次性建立哈希索引，查询均为O(1)"""
+        # device_id -> 设备
+        self._device_index = {device["id"]: device for device in self.devices}
+        # entity_id -> 实体
+        self._entity_index = {entity["entity_id"]: entity for entity in self.entities}
+        # domain -> 服务
+        self._domain_service_index = {
+            domain_service["domain"]: domain_service for domain_service in self.domains_services
+        }
+        # entity_id -> device_id（由init_device_entity_mapping填充）
+        self._entity_device_index = {}
+        # entity_id -> 实体注册表中的area_id（由init_device_entity_mapping填充）
+        self._entity_area_index = {}
+
+    def _build_records(self):
+        """建立紧凑记录（只含常用字段，实体记录通过raw引用原始字典），供工具/提示词构建遍历"""
+        self._device_records = {
+            device_id: DeviceRecord.from_registry(device, self.device_entity_mapping.get(device_id, ()))
+            for device_id, device in self._device_index.items()
+        }
+        self._entity_records = {}
+        for entity_id, entity in self._entity_index.items():
+            device_id = self._entity_device_index.get(entity_id)
+            device_record = self._device_records.get(device_id)
+            area_id = self._entity_area_index.get(entity_id) or (device_record.area_id if device_record else None)
+            self._entity_records[entity_id] = EntityRecord.from_state(entity, device_id=device_id, area_id=area_id)
+        self._service_records = {
+            domain: ServiceRecord.from_domain_services(domain_service)
+            for domain, domain_service in self._domain_service_index.items()
+        }
+
+    # ---------------------- 增量更新（注册表同步） ----------------------
+    def _refresh_device_record(self, device_id):
+        device = self._device_index.get(device_id)
+        if device is None:
+            self._device_records.pop(device_id, None)
+            return
+        self._device_records[device_id] = DeviceRecord.from_registry(
+            device, self.device_entity_mapping.get(device_id, ())
+        )
+
+    def _refresh_entity_record(self, entity_id):
+        entity = self._entity_index.get(entity_id)
+        if entity is None:
+            self._entity_records.pop(entity_id, None)
+            return
+        device_id = self._entity_device_index.get(entity_id)
+        device_record = self._device_records.get(device_id)
+        area_id = self._entity_area_index.get(entity_id) or (device_record.area_id if device_record else None)
+        self._entity_records[entity_id] = EntityRecord.from_state(entity, device_id=device_id, area_id=area_id)
+
+    def _detach_entity(self, entity_id):
+        """把实体从其所属设备的实体列表中移除"""
+        device_id = self._entity_device_index.pop(entity_id, None)
+        if device_id is not None and entity_id in self.device_entity_mapping.get(device_id, []):
+            self.device_entity_mapping[device_id].remove(entity_id)
+            self._refresh_device_record(device_id)
+        return device_id
+
+    @staticmethod
+    def _replace_in_list(items, key, value, new_item):
+        """列表中按key替换元素（不存在则追加），new_item为None时删除"""
+        for i, item in enumerate(items):
+            if item.get(key) == value:
+                if new_item is None:
+                    del items[i]
+                else:
+                    items[i] = new_item
+                return
+        if new_item is not None:
+            items.append(new_item)
+
+    def upsert_device(self, device):
+        """
+        新增/更新设备注册信息，同步维护索引和记录
+        :param device: device_registry中的设备字典
+        """
+        device = _compact(device, RETAINED_DEVICE_FIELDS)
+        device_id = device["id"]
+        with self._write_lock:
+            self._replace_in_list(self.devices, "id", device_id, device)
+            self._device_index[device_id] = device
+            self.device_entity_mapping.setdefault(device_id, [])
+            self._refresh_device_record(device_id)
+            # 设备的area变化会影响其实体记录的area
+            for entity_id in self.device_entity_mapping[device_id]:
+                self._refresh_entity_record(entity_id)
+
+    def remove_device(self, device_id):
+        """删除设备，其实体保留但不再属于任何设备"""
+        with self._write_lock:
+            self._replace_in_list(self.devices, "id", device_id, None)
+            self._device_index.pop(device_id, None)
+            entity_ids = self.device_entity_mapping.pop(device_id, [])
+            self._device_records.pop(device_id, None)
+            for entity_id in entity_ids:
+                self._entity_device_index.pop(entity_id, None)
+                self._refresh_entity_record(entity_id)
+
+    def upsert_entity(self, entity, registry_entry=None):
+        """
+        新增/更新实体，同步维护索引和记录
+        :param entity: /api/states返回的实体字典
+        :param registry_entry: 可选，entity_registry中的条目；给出时按其device_id/area_id更新所属设备和area
+        """
+        entity = _compact(entity, RETAINED_ENTITY_FIELDS)
+        entity_id = entity["entity_id"]
+        with self._write_lock:
+            self._replace_in_list(self.entities, "entity_id", entity_id, entity)
+            self._entity_index[entity_id] = entity
+            if registry_entry is not None:
+                device_id = registry_entry.get("device_id")
+                if self._entity_device_index.get(entity_id) != device_id:
+                    self._detach_entity(entity_id)
+                    if device_id and device_id in self.device_entity_mapping:
+                        self.device_entity_mapping[device_id].append(entity_id)
+                        self._entity_device_index[entity_id] = device_id
+                        self._refresh_device_record(device_id)
+                if registry_entry.get("area_id"):
+                    self._entity_area_index[entity_id] = registry_entry["area_id"]
+                else:
+                    self._entity_area_index.pop(entity_id, None)
+            self._refresh_entity_record(entity_id)
+
+    def remove_entity(self, entity_id):
+        """删除实体，并从所属设备的实体列表中移除"""
+        with self._write_lock:
+            self._replace_in_list(self.entities, "entity_id", entity_id, None)
+            self._entity_index.pop(entity_id, None)
+            self._entity_area_index.pop(entity_id, None)
+            self._detach_entity(entity_id)
+            self._entity_records.pop(entity_id, None)
+
+    def get_device_record(self, device_id) -> DeviceRecord:
+        return self._device_records.get(device_id)
+
+    def get_entity_record(self, entity_id) -> EntityRecord:
+        return self._entity_records.get(entity_id)
+
+    def get_service_record(self, domain) -> ServiceRecord:
+        return self._service_records.get(domain)
+
+    def iter_entity_records(self, domain=None):
+        """遍历实体记录，可按domain过滤"""
+        for record in self._entity_records.values():
+            if domain is None or record.domain == domain:
+                yield record
 
     def get_device_detail(self,device_id):
-        for device in self.devices:
-            if device_id==device["id"]:
-                return device
+        return self._device_index.get(device_id)
+
     def get_entity_detail(self,entity_id):
-        for entity in self.entities:
-            if entity["entity_id"]==entity_id:
-                return entity
+        return self._entity_index.get(entity_id)
 
     def get_domain_service(self, entity_id):
         domain = entity_id.split(".")[0]
-        for domain_service in self.domains_services:
-            if domain_service["domain"]==domain:
-                return domain_service
-    def _load_from_json(self,file_name):
-        # 1. 获取当前py文件的绝对目录路径
-        # os.path.abspath(__file__)：获取当前py文件的完整绝对路径
-        # os.path.dirname()：提取路径中的目录部分（去掉文件名）
-        current_script_dir = os.path.dirname(os.path.abspath(__file__))
+        return self._domain_service_index.get(domain)
 
-        # 2. 拼接目标json文件的完整路径（跨平台兼容）
+    def get_device_id_by_entity(self, entity_id):
+        """实体所属的设备ID，不属于任何设备时返回None"""
+        return self._entity_device_index.get(entity_id)
+
+    def get_entity_area_id(self, entity_id):
+        """实体注册表中单独为实体指定的area_id（未指定时返回None，使用设备的area）"""
+        return self._entity_area_index.get(entity_id)
+    def _load_from_json(self,file_name):
+        # 1. 拼接目标json文件的完整路径（跨平台兼容）
         # os.path.join()：自动适配不同系统的路径分隔符
-        json_file_path = os.path.join(current_script_dir, "copied_data", f"{file_name}.json")
+        json_file_path = os.path.join(self.data_dir, f"{file_name}.json")
 
-        # 3. 打开文件并加载json数据
-        with open(json_file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data
+        # 2. 通过共享的注册表加载器读取（进程内只解析一次，源文件未变化时使用二进制缓存）
+        return REGISTRYLOADER.load(json_file_path)
 
     def load_devices(self):
         device_registry = self._load_from_json("device_registry")
-        devices = device_registry["data"]["devices"]
+        devices = [_compact(device, RETAINED_DEVICE_FIELDS) for device in device_registry["data"]["devices"]]
         return devices
 
     def load_entitied(self):
-        entities = self._load_from_json("entities")
+        entities = [_compact(entity, RETAINED_ENTITY_FIELDS) for entity in self._load_from_json("entities")]
         return entities
 
     def load_domains_services(self):
@@ -53,10 +218,7 @@ class DeviceInfo():
         return domains_services
 
     def has_entity(self,entity_id):
-        for entity in self.entities:
-            if entity["entity_id"] == entity_id:
-                return True
-        return False
+        return entity_id in self._entity_index
     def init_device_entity_mapping(self):
         entity_registry=self._load_from_json("entity_registry")["data"]["entities"]
         device_entity_mapping = {}
@@ -73,29 +235,63 @@ class DeviceInfo():
                 if self.has_entity(entity_id):
                     # 将实体添加到对应设备的实体列表中
                     device_entity_mapping[entity_device_id].append(entity_id)
+                    self._entity_device_index[entity_id] = entity_device_id
+                    if entity.get("area_id"):
+                        self._entity_area_index[entity_id] = entity["area_id"]
 
         return device_entity_mapping
 
-    def save_all_instance_vars_to_json(self):
-        """核心函数：将所有实例变量分别保存到JSON文件，文件名=变量名"""
+    def export(self, output_dir=None):
+        """调试用：将所有实例变量分别保存到JSON文件，文件名=变量名（默认保存到temp_output）"""
         # 1. 获取所有实例变量（self.__dict__ 存储实例的属性键值对）
 
         instance_vars = {
             var_name: var_value
             for var_name, var_value in self.__dict__.items()
+            if not var_name.startswith("_")  # 索引可由原始数据重建，不保存
         }
 
         # 2. 遍历每个实例变量，逐个保存为JSON文件
         for var_name, var_value in instance_vars.items():
             # 构建文件路径：./temp_output/变量名.json
             current_dir = os.path.dirname(os.path.abspath(__file__))
-            file_path = os.path.join(current_dir, "temp_output", f"{var_name}.json")
+            file_path = os.path.join(output_dir or os.path.join(current_dir, "temp_output"), f"{var_name}.json")
             with open(file_path, "w", encoding="utf-8") as f:
                 json.dump(var_value, f, ensure_ascii=False, indent=2)
 
-DEVICEINFO=DeviceInfo()
+class LazyDeviceInfo():
+    """
+    DeviceInfo的延迟加载代理：导入模块时不读取任何文件，第一次访问属性时才加载注册表（线程安全，只加载一次）。
+    用法与DeviceInfo实例完全相同
+    """
+    def __init__(self):
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> DeviceInfo:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = DeviceInfo()
+        return self._instance
+
+    def __getattr__(self, name):
+        # 只有代理自身没有的属性才会进入这里
+        return getattr(self._load(), name)
+
+    def is_loaded(self) -> bool:
+        return self._instance is not None
+
+    def reload(self):
+        """丢弃已加载的注册表，下次访问时重新读取"""
+        with self._lock:
+            self._instance = None
+
+
+DEVICEINFO=LazyDeviceInfo()
 
 if __name__ == "__main__":
+    DEVICEINFO.export()
     print(DEVICEINFO.get_domain_service("light"))
     for device_id in DEVICEINFO.device_entity_mapping:
         print(device_id)
@@ -0,0 +1,232 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Iterable, List, Callable, Optional, Any, TextIO
+
+# 每次从文件读取的字符数
+_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_json_array(f: TextIO, chunk_size: int = _CHUNK_SIZE) -> Iterator[Any]:
+    """
+    增量解析顶层为数组的JSON文件，逐个返回数组元素；内存占用只与单个元素大小有关，与文件大小无关
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    eof = False
+    started = False
+    # 上一个记号是元素/逗号，用于拒绝连续逗号和结尾逗号
+    after_item = False
+    after_comma = False
+
+    def fill():
+        nonlocal buf, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf += chunk
+
+    while True:
+        buf = buf.lstrip()
+        if not buf:
+            if eof:
+                if started:
+                    raise json.JSONDecodeError("JSON数组不完整", "", 0)
+                return
+            fill()
+            continue
+        if not started:
+            if buf[0] != "[":
+                raise json.JSONDecodeError("顶层不是JSON数组", buf[:20], 0)
+            buf = buf[1:]
+            started = True
+            continue
+        if buf[0] == ",":
+            # 逗号只能出现在元素之后，[1,,2]这类连续逗号视为格式错误
+            if not after_item:
+                raise json.JSONDecodeError("JSON数组中出现多余的逗号", buf[:20], 0)
+            buf = buf[1:]
+            after_item = False
+            after_comma = True
+            continue
+        if buf[0] == "]":
+            # 逗号后必须跟元素，[1,]这类结尾逗号视为格式错误
+            if after_comma:
+                raise json.JSONDecodeError("JSON数组结尾有多余的逗号", buf[:20], 0)
+            return
+        try:
+            obj, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        # 元素后面必须紧跟分隔符（,或]），否则可能是被截断的数字，再读一块确认
+        rest = buf[end:].lstrip()
+        if not rest or rest[0] not in ",]":
+            if not eof:
+                fill()
+                continue
+            raise json.JSONDecodeError("JSON数组不完整", buf, end)
+        yield obj
+        buf = buf[end:]
+        after_item = True
+        after_comma = False
+
+
+def _iter_jsonl(f: TextIO) -> Iterator[Any]:
+    """逐行解析JSONL文件，跳过空行"""
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_dialogue_records(file_path: str) -> Iterator[list]:
+    """
+    流式读取对话记录文件，逐段返回原始对话（[{"user": ...}, {"ai": ...}, ...]）
+    支持两种格式：顶层为数组的JSON（如dialogue_records.json）和每行一段对话的JSONL
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        if file_path.endswith(".jsonl"):
+            yield from _iter_jsonl(f)
+            return
+        # 根据第一个非空白字符判断格式
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if head == "[":
+            yield from _iter_json_array(f)
+        else:
+            yield from _iter_jsonl(f)
+
+
+def format_dialogue(single_dialogue: list) -> str:
+    """将一段对话转换为「用户：xx\\nAI：xx」格式的字符串"""
+    dialogue_content = ""
+    for msg_obj in single_dialogue:
+        # 提取user或ai的内容，避免KeyError
+        if "user" in msg_obj:
+            dialogue_content += f"用户：{msg_obj['user']}\n"
+        elif "ai" in msg_obj:
+            dialogue_content += f"AI：{msg_obj['ai']}\n"
+    return dialogue_content.rstrip("\n")
+
+
+def iter_dialogues(file_path: str) -> Iterator[str]:
+    """流式读取对话记录文件，逐段返回格式化后的对话字符串"""
+    for single_dialogue in iter_dialogue_records(file_path):
+        yield format_dialogue(single_dialogue)
+
+
+def iter_batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """将可迭代对象按batch_size分批"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class IngestCheckpoint():
+    """
+    导入进度检查点：记录某个数据源已连续处理完成的条数（水位线），中断后从水位线继续。
+    水位线之前的记录全部完成；之后的记录即使部分已完成，也会在恢复时重新处理
+    """
+    def __init__(self, checkpoint_path: str, source: str):
+        self.checkpoint_path = checkpoint_path
+        self.source = os.path.abspath(source)
+
+    def load(self) -> int:
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        return checkpoint.get(self.source, 0)
+
+    def save(self, watermark: int):
+        checkpoint = {}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        checkpoint[self.source] = watermark
+        checkpoint_dir = os.path.dirname(self.checkpoint_path)
+        if checkpoint_dir and not os.path.exists(checkpoint_dir):
+            os.makedirs(checkpoint_dir, exist_ok=True)
+        # 先写临时文件再替换，避免崩溃时留下损坏的检查点
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+
+def run_pipeline(items: Iterable[Any], handler: Callable[[Any], Any], max_workers: int = 2,
+                 checkpoint: Optional[IngestCheckpoint] = None, max_in_flight: Optional[int] = None) -> int:
+    """
+    以有限并发流式处理items：同时在途的任务数不超过max_in_flight，内存占用与数据总量无关
+    :param items: 待处理的记录（通常是iter_dialogues返回的生成器）
+    :param handler: 处理单条记录的函数
+    :param max_workers: 并发数
+    :param checkpoint: 可选的检查点，从其水位线继续，并在每条记录完成后推进水位线
+    :param max_in_flight: 在途任务上限，默认max_workers*2
+    :return: 处理完成后的水位线（已处理的总条数）
+    """
+    start = checkpoint.load() if checkpoint else 0
+    max_in_flight = max_in_flight or max_workers * 2
+    slots = threading.BoundedSemaphore(max_in_flight)
+    lock = threading.Lock()
+    finished = set()
+    watermark = start
+    # 已写入检查点的水位线，断点保存失败时恢复位置以它为准
+    saved = start
+    errors = []
+
+    def on_done(index: int, future):
+        nonlocal watermark, saved
+        try:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append((index, e))
+                print(f"错误：第{index + 1}条记录处理失败 -> {e}")
+            with lock:
+                if not errors:
+                    finished.add(index)
+                    # 水位线只在连续完成时推进
+                    advanced = False
+                    while watermark in finished:
+                        finished.discard(watermark)
+                        watermark += 1
+                        advanced = True
+                    if advanced and checkpoint:
+                        checkpoint.save(watermark)
+                        saved = watermark
+        except Exception as e:
+            # 断点保存失败也要停止投递，否则后续记录完成后水位线无法持久化
+            errors.append((index, e))
+            print(f"错误：第{index + 1}条记录后保存断点失败 -> {e}")
+        finally:
+            # 无论成功与否都归还槽位，否则生产者会一直阻塞在acquire上
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dialogue_ingest") as executor:
+        for index, item in enumerate(items):
+            if index < start:
+                continue
+            if errors:
+                break
+            slots.acquire()
+            future = executor.submit(handler, item)
+            future.add_done_callback(lambda fut, idx=index: on_done(idx, fut))
+
+    if errors:
+        resume = saved if checkpoint else watermark
+        print(f"导入中断，已完成{watermark}条，重新执行将从第{resume + 1}条继续")
+    return watermark
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import sys
 import uuid
@@ -13,8 +14,13 @@ from smartHome.m_agent.common.get_llm import get_llm
 from smartHome.m_agent.common.global_config import GLOBALCONFIG
 from smartHome.m_agent.common.logger import setup_dynamic_indent_logger
 from smartHome.m_agent.memory.device_info import DEVICEINFO
+from smartHome.m_agent.memory.dialogue_stream import iter_dialogues, run_pipeline, IngestCheckpoint
+from smartHome.m_agent.memory.fact_store import FACTSTORE
+from smartHome.m_agent.memory.init_journal import INITJOURNAL
+from smartHome.m_agent.memory.memory_gate import MEMORYGATE
+from smartHome.m_agent.memory.memory_update_worker import MEMORYUPDATEWORKER
 from smartHome.m_agent.memory.vector_device import VECTORDB, TextWithMeta, search_topK_device_by_clues, add, delete, \
-    update
+    update, batch_update
 from langchain.tools import tool
 
 class EntityFact(BaseModel):
@@ -267,145 +273,285 @@ class SmartHomeMemory():
         self.entities_fact_save_path="./temp_output/entities_fact.json"
         self.device_fact_save_path="./temp_output/device_fact.json"
         self.vector_db=VECTORDB
+        # 事实库（SQLite），JSON文件仅作为调试导出
+        self.fact_store=FACTSTORE
+        # 初始化进度日志，初始化中断后重新执行时从这里恢复
+        self.init_journal=INITJOURNAL
+        if self.fact_store.is_empty():
+            # 兼容旧数据：事实库为空时，从已有的JSON文件导入一次
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            self.fact_store.import_json(
+                entities_fact_path=os.path.join(current_dir, "temp_output", "entities_fact.json"),
+                device_fact_path=os.path.join(current_dir, "temp_output", "device_fact.json")
+            )
+
+    def init_memory_for_device(self, resume: bool = True):
+        """
+        依据事实库中的实体事实，提取每个设备的整体事实，并写入事实库和向量库。
+        每完成一个设备即写入进度日志，重新执行时跳过已完成的设备
+        :param resume: 是否从进度日志恢复；False则清空设备部分的日志重新提取
+        """
+        if not resume:
+            self.init_journal.reset("device")
+            self.init_journal.reset("vector")
+        # 注册表变化后进度日志作废
+        self.init_journal.begin(self._registry_signature())
+
+        # 步骤1：从进度日志恢复已完成的设备
+        done_device_facts = self.init_journal.load_device_facts()
+        device_ids = [
+            device_id for device_id in self.fact_store.list_device_ids()
+            if self.fact_store.get_entity_facts(device_id)
+        ]
+        if done_device_facts:
+            print(f"从进度日志恢复{len(done_device_facts)}个设备事实，剩余{len(set(device_ids) - set(done_device_facts))}个待提取")
 
-    def init_memory_for_device(self):
-        llm = get_llm()
+        # 步骤2：只提取缺失的设备，每完成一个即追加日志并增量写入事实库
+        for device_id in device_ids:
+            if device_id in done_device_facts:
+                continue
+            entity_fact_list = self.fact_store.get_entity_facts(device_id)
+            device_fact = self._extract_device_fact(device_id, entity_fact_list)
+            self.init_journal.record_device_fact(device_fact.model_dump())
+            self.fact_store.upsert_device_fact(device_fact.model_dump())
 
-        with open(self.entities_fact_save_path, "r", encoding="utf-8") as f:
-            # 解析JSON内容到字典
-            init_entities_fact = json.load(f)
-        # 存储最终的设备事实信息（key=device_id，value=设备级事实性信息）
+        # 步骤3：从进度日志组装最终结果
+        done_device_facts = self.init_journal.load_device_facts()
         device_fact_dict = {}
-
-        # 2. 遍历每个设备，拼接提示词并调用LLM提取设备事实
-        for device_id, entity_fact_list in init_entities_fact.items():
-            # 2.1 拼接该设备下所有实体的事实信息（转为易读的文本）
-            device_name=DEVICEINFO.get_device_detail(device_id)["name"]
-            # entity_info_text = self._format_entity_fact_list(entity_fact_list)
-            if (GLOBALCONFIG.env == "test"):
-                GLOBALCONFIG.nested_logger = GLOBALCONFIG.memory_init_logger
-                # 设计LLM提示词模板（聚焦设备级事实提取）
-                prompt = f"""
-        请基于以下智能家居设备（device_id: {device_id} ({device_name})）包含的所有实体事实性信息，提取该设备的**整体事实性信息**:
-    
-        【设备包含的实体事实信息】
-        {entity_fact_list}
-                    """.strip()
-                prompt = f"""
-                请基于以下智能家居设备（device_id: {device_id} ({device_name})）包含的所有实体事实性信息，分析该设备的**整体事实性信息**:
-                1. device_id_clues里只需包含设备名字
-                2. usage_habits应该为空，因为实体信息里不可能包含
-                3. 该实体实际可执行的功能，没有则为空，如调节亮度，调节温度等
-                4. 只提取实体包含的事实信息，不要过多分析、假设
-                最终输出严格符合JSON格式（需包含功能分析结果，字段与DeviceFact模型对齐）
-                - 字段内容与DeviceFact模型的描述和示例一致
-
-                【设备包含的实体事实信息】
-                {entity_fact_list}
-                """
-                agent = create_agent(
-                    model=get_llm(),
-                    response_format=DeviceFact,  # 多实体列表格式
-                    middleware=[log_before, log_response, log_before_agent, log_after_agent],
-                    context_schema=AgentContext
-                )
-
-                result = agent.invoke(
-                    input={"messages": [
-                        {"role": "system", "content": prompt},
-                    ]},
-                    context=AgentContext(agent_name="设备事实_记忆初始化阶段")
-                )
-
-
-                device_fact = result["structured_response"]
-            else:
-                device_fact = DeviceFact(
-                    device_id=device_id,
-                    device_name=device_name,
-                    states=["tryi"],
-                    capabilities=[],
-                    device_id_clues=[],
-                    usage_habits=[],
-                    others=[]
-                )
-            device_fact_dict[device_id]=device_fact
+        for device_id in device_ids:
+            device_fact_dict[device_id] = DeviceFact(**done_device_facts[device_id])
+            # 日志写入后、事实库写入前崩溃的设备，在这里补写
+            self.fact_store.upsert_device_fact(done_device_facts[device_id])
 
         self.device_fact = device_fact_dict
+        # JSON仅作为调试导出
         self._save_init_device_fact_to_json(device_fact_dict, self.device_fact_save_path)
         self._save_init_device_fact_to_vector_db()
-
-
-    def init_memory_for_entity(self):
+        # 设备阶段已完成：清除进度，下次初始化重新提取而不是复用本次结果
+        self.init_journal.reset("device")
+        self.init_journal.reset("vector")
+
+    def _extract_device_fact(self, device_id: str, entity_fact_list: list) -> "DeviceFact":
+        """调用LLM从设备下所有实体的事实中提取设备整体事实"""
+        # 拼接该设备下所有实体的事实信息（转为易读的文本）
+        device_name=DEVICEINFO.get_device_record(device_id).name
+        # entity_info_text = self._format_entity_fact_list(entity_fact_list)
+        if (GLOBALCONFIG.env == "test"):
+            GLOBALCONFIG.nested_logger = GLOBALCONFIG.memory_init_logger
+            # 设计LLM提示词模板（聚焦设备级事实提取）
+            prompt = f"""
+    请基于以下智能家居设备（device_id: {device_id} ({device_name})）包含的所有实体事实性信息，提取该设备的**整体事实性信息**:
+
+    【设备包含的实体事实信息】
+    {entity_fact_list}
+                """.strip()
+            prompt = f"""
+            请基于以下智能家居设备（device_id: {device_id} ({device_name})）包含的所有实体事实性信息，分析该设备的**整体事实性信息**:
+            1. device_id_clues里只需包含设备名字
+            2. usage_habits应该为空，因为实体信息里不可能包含
+            3. 该实体实际可执行的功能，没有则为空，如调节亮度，调节温度等
+            4. 只提取实体包含的事实信息，不要过多分析、假设
+            最终输出严格符合JSON格式（需包含功能分析结果，字段与DeviceFact模型对齐）
+            - 字段内容与DeviceFact模型的描述和示例一致
+
+            【设备包含的实体事实信息】
+            {entity_fact_list}
+            """
+            agent = create_agent(
+                model=get_llm(),
+                response_format=DeviceFact,  # 多实体列表格式
+                middleware=[log_before, log_response, log_before_agent, log_after_agent],
+                context_schema=AgentContext
+            )
+
+            result = agent.invoke(
+                input={"messages": [
+                    {"role": "system", "content": prompt},
+                ]},
+                context=AgentContext(agent_name="设备事实_记忆初始化阶段")
+            )
+
+
+            device_fact = result["structured_response"]
+        else:
+            device_fact = DeviceFact(
+                device_id=device_id,
+                device_name=device_name,
+                states=["tryi"],
+                capabilities=[],
+                device_id_clues=[],
+                usage_habits=[],
+                others=[]
+            )
+        return device_fact
+
+    def init_memory_for_entity(self, resume: bool = True):
         """
-        依据设备-实体包含映射表，提取出设备所包含的实体的所有事实性信息
+        依据设备-实体包含映射表，提取出设备所包含的实体的所有事实性信息。
+        每完成一个实体即写入进度日志，重新执行时跳过已完成的实体
+        :param resume: 是否从进度日志恢复；False则清空日志重新提取（实体事实变化后设备事实也需重新提取）
         :return:
         """
-        llm=get_llm()
+        if not resume:
+            self.init_journal.reset()
+        # 注册表变化后进度日志作废
+        self.init_journal.begin(self._registry_signature())
+
+        # 先同步设备/实体的注册信息到事实库
+        entity_device_map = {
+            entity_id: DEVICEINFO.get_device_id_by_entity(entity_id)
+            for entity_ids in DEVICEINFO.device_entity_mapping.values()
+            for entity_id in entity_ids
+        }
+        self.fact_store.upsert_devices(DEVICEINFO.devices)
+        self.fact_store.upsert_entities(
+            [DEVICEINFO.get_entity_detail(entity_id) for entity_id in entity_device_map],
+            entity_device_map
+        )
 
-        init_fact={}
+        # 步骤1：从进度日志恢复已完成的实体
+        done_entity_facts = self.init_journal.load_entity_facts()
+        done_count = sum(len(entity_facts) for entity_facts in done_entity_facts.values())
+        if done_count:
+            print(f"从进度日志恢复{done_count}个实体事实，剩余{len(entity_device_map) - done_count}个待提取")
+        else:
+            # 实体事实全部重新提取，之前中断的设备阶段的进度随之作废
+            self.init_journal.reset("device")
+            self.init_journal.reset("vector")
+
+        # 步骤2：只提取缺失的实体，每完成一个即追加日志并增量写入事实库
         for device_id in DEVICEINFO.device_entity_mapping:
-            device_name=DEVICEINFO.get_device_detail(device_id)["name"]
-            device_entities_fact=[]
             for entity_id in DEVICEINFO.device_entity_mapping[device_id]:
-                entity_detail=DEVICEINFO.get_entity_detail(entity_id)
-                domain_service=DEVICEINFO.get_domain_service(entity_id)
-                if(GLOBALCONFIG.env=="test"):
-                    GLOBALCONFIG.nested_logger = GLOBALCONFIG.memory_init_logger
-                    agent = create_agent(
-                        model=get_llm(),
-                        response_format=EntityFact,  # 多实体列表格式
-                        middleware=[log_before, log_response, log_before_agent, log_after_agent],
-                        context_schema=AgentContext
-                    )
-                    prompt = f"""
-                    解析下面这个homeassitant实体，分析：
-                    1. 该HA实体可采集的状态类型，如开关状态、亮度、温度等
-                    2. 该实体实际可执行的功能，没有则为空，如调节亮度，调节温度等
-                    3. 用于定位HA Entity ID的多维度线索，没有则为空。对于homeassitant实体，只需包含其friendly_name即可
-                    4. 只提取实体包含的事实信息，不要过多分析、假设
-                    最终输出严格符合JSON格式（需包含功能分析结果，字段与EntityFact模型对齐）
-                    - 字段内容与EntityFact模型的描述和示例一致
-                    - 字段内容要简练，不需要像这样额外描述，"用户口语示例：'门窗光照','门窗传感器 光照度','窗户光线 强/弱"，应该为"门窗光照"、'门窗传感器 光照度'
-                    - 字段内容不需要包含当前设备的具体状态数值，比如"当前状态：弱","更新时间:2025-12-1"，这些具体数值都不应该包含。
-
-                    【entity】
-                    {entity_detail}
-                    【service】
-                    {domain_service}
-                    """
-                    result = agent.invoke(
-                        input={"messages": [
-                            {"role": "system", "content": prompt},
-                        ]},
-                        context=AgentContext(agent_name="实体事实_记忆初始化阶段")
-                    )
-
-                    # 解析并输出提取结果（适配EntityFact字段）
-                    entity_fact = result["structured_response"]
-                else:
-                    entity_fact=EntityFact(
-                        entity_id=entity_detail["entity_id"],
-                        friendly_name=entity_detail["attributes"]["friendly_name"],
-                        states=[entity_detail["state"]],
-                        capabilities=[],
-                        entity_matching_clues=[],
-                        others=[]
-                    )
-                device_entities_fact.append(entity_fact)
-
-            init_fact[device_id]=device_entities_fact
+                if entity_id in done_entity_facts.get(device_id, {}):
+                    continue
+                entity_fact = self._extract_entity_fact(entity_id)
+                self.init_journal.record_entity_fact(device_id, entity_id, entity_fact.model_dump())
+                self.fact_store.upsert_entity_fact(device_id, entity_id, entity_fact.model_dump())
 
+        # 步骤3：从进度日志组装最终结果（保持设备-实体映射表的顺序）
+        done_entity_facts = self.init_journal.load_entity_facts()
+        init_fact={}
+        for device_id in DEVICEINFO.device_entity_mapping:
+            init_fact[device_id] = [
+                EntityFact(**done_entity_facts[device_id][entity_id])
+                for entity_id in DEVICEINFO.device_entity_mapping[device_id]
+            ]
+        # 日志写入后、事实库写入前崩溃的实体，在这里补写
+        self.fact_store.upsert_entities_fact({
+            device_id: {
+                entity_id: fact.model_dump()
+                for entity_id, fact in zip(DEVICEINFO.device_entity_mapping[device_id], facts)
+            }
+            for device_id, facts in init_fact.items()
+        })
+
+        # JSON仅作为调试导出
         self._save_init_entities_fact_to_json(
             init_fact=init_fact,
             save_path=self.entities_fact_save_path  # 目标保存路径
         )
         self.entities_fact=init_fact
+        # 实体阶段已完成：清除进度，下次初始化重新提取而不是复用本次结果
+        self.init_journal.reset("entity")
+
+    @staticmethod
+    def _registry_signature() -> str:
+        """注册表签名：设备注册信息、设备-实体映射、实体名称和属性名（不含状态值），用于判断进度日志是否仍然有效"""
+        payload = {
+            "devices": sorted(
+                ([device["id"], device.get("name"), device.get("name_by_user"), device.get("model"), device.get("area_id")]
+                 for device in DEVICEINFO.devices),
+                key=lambda item: item[0]
+            ),
+            "mapping": {device_id: list(entity_ids) for device_id, entity_ids in DEVICEINFO.device_entity_mapping.items()},
+            "entities": sorted(
+                [entity["entity_id"], entity.get("attributes", {}).get("friendly_name"), sorted(entity.get("attributes", {}))]
+                for entity in DEVICEINFO.entities
+            ),
+        }
+        return hashlib.sha1(json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _extract_entity_fact(self, entity_id: str) -> "EntityFact":
+        """调用LLM提取单个实体的事实"""
+        entity_detail=DEVICEINFO.get_entity_detail(entity_id)
+        domain_service=DEVICEINFO.get_domain_service(entity_id)
+        if(GLOBALCONFIG.env=="test"):
+            GLOBALCONFIG.nested_logger = GLOBALCONFIG.memory_init_logger
+            agent = create_agent(
+                model=get_llm(),
+                response_format=EntityFact,  # 多实体列表格式
+                middleware=[log_before, log_response, log_before_agent, log_after_agent],
+                context_schema=AgentContext
+            )
+            prompt = f"""
+            解析下面这个homeassitant实体，分析：
+            1. 该HA实体可采集的状态类型，如开关状态、亮度、温度等
+            2. 该实体实际可执行的功能，没有则为空，如调节亮度，调节温度等
+            3. 用于定位HA Entity ID的多维度线索，没有则为空。对于homeassitant实体，只需包含其friendly_name即可
+            4. 只提取实体包含的事实信息，不要过多分析、假设
+            最终输出严格符合JSON格式（需包含功能分析结果，字段与EntityFact模型对齐）
+            - 字段内容与EntityFact模型的描述和示例一致
+            - 字段内容要简练，不需要像这样额外描述，"用户口语示例：'门窗光照','门窗传感器 光照度','窗户光线 强/弱"，应该为"门窗光照"、'门窗传感器 光照度'
+            - 字段内容不需要包含当前设备的具体状态数值，比如"当前状态：弱","更新时间:2025-12-1"，这些具体数值都不应该包含。
+
+            【entity】
+            {entity_detail}
+            【service】
+            {domain_service}
+            """
+            result = agent.invoke(
+                input={"messages": [
+                    {"role": "system", "content": prompt},
+                ]},
+                context=AgentContext(agent_name="实体事实_记忆初始化阶段")
+            )
+
+            # 解析并输出提取结果（适配EntityFact字段）
+            entity_fact = result["structured_response"]
+            # entity_id以注册表为准：LLM可能漏填或改写，后续按注册表ID读取进度日志和事实库
+            entity_fact.entity_id = entity_id
+        else:
+            entity_fact=EntityFact(
+                entity_id=entity_detail["entity_id"],
+                friendly_name=entity_detail["attributes"]["friendly_name"],
+                states=[entity_detail["state"]],
+                capabilities=[],
+                entity_matching_clues=[],
+                others=[]
+            )
+        return entity_fact
 
     def _save_init_device_fact_to_vector_db(self):
         """
         修正版：将DeviceFact实例的点语法访问替代字典下标访问，解决TypeError
         """
+        # 已写入向量库的设备（进度日志中记录），重新执行时跳过
+        vector_saved = self.init_journal.load_vector_saved()
+
+        # 步骤1：遍历所有设备Fact（value是DeviceFact实例）
+        for device_id, device_fact in self.device_fact.items():
+            # 跳过无效设备ID或非DeviceFact实例
+            if not device_id or not isinstance(device_fact, DeviceFact):
+                print(f"⚠️  无效设备ID「{device_id}」或非DeviceFact实例，跳过入库")
+                continue
+            if device_id in vector_saved:
+                continue
+
+            # 步骤2：写入该设备的所有字段；先删除这些字段的旧文档，上次写到一半崩溃或重新初始化时不会留下重复/过期的文档
+            replace_fields = tuple(
+                field_name for field_name in ("states", "capabilities", "device_id_clues", "usage_habits", "others")
+                if getattr(device_fact, field_name, None)
+            )
+            self._save_device_fact_to_vector_db(device_id, device_fact, replace_fields=replace_fields)
+
+            # 步骤3：该设备全部入库后记录进度
+            self.init_journal.record_vector_saved(device_id)
+
+    def _save_device_fact_to_vector_db(self, device_id: str, device_fact: "DeviceFact", replace_fields: tuple = ()):
+        """
+        将单个设备的事实写入向量库
+        :param replace_fields: 写入前先删除这些字段的旧文档（初始化时替换该设备写入的字段；注册表同步时替换由注册信息提取的字段）
+        """
         # 步骤1：定义「字段名」与「对应布尔标识」的映射表（保持不变）
         field_boolean_mapping = [
             ("states", {"states": True}),
@@ -414,39 +560,86 @@ class SmartHomeMemory():
             ("usage_habits", {"usage_habits": True}),
             ("others", {"others": True})
         ]
-
-        # 步骤2：遍历所有设备Fact（value是DeviceFact实例）
-        for device_id, device_fact in self.device_fact.items():
-            # 跳过无效设备ID或非DeviceFact实例
-            if not device_id or not isinstance(device_fact, DeviceFact):
-                print(f"⚠️  无效设备ID「{device_id}」或非DeviceFact实例，跳过入库")
+        # 步骤2：获取/创建设备专属集合（点语法访问DeviceFact属性）
+        device_name = device_fact.device_name or "N/A"  # 替代 device_fact["device_name"]
+        collection = self.vector_db.get_or_create_collection(device_id, device_name)
+        for field_name in replace_fields:
+            collection.delete(where={field_name: True})
+
+        # 步骤3：遍历映射表，统一处理所有字段（点语法访问列表属性）
+        for field_name, boolean_kwargs in field_boolean_mapping:
+            # 用getattr获取DeviceFact的列表属性（替代 device_fact[field_name]）
+            content_list = getattr(device_fact, field_name, [])
+            if not isinstance(content_list, list) or not content_list:
                 continue
 
-            # 步骤3：获取/创建设备专属集合（点语法访问DeviceFact属性）
-            device_name = device_fact.device_name or "N/A"  # 替代 device_fact["device_name"]
-            collection = self.vector_db.get_or_create_collection(device_id, device_name)
-
-            # 步骤4：遍历映射表，统一处理所有字段（点语法访问列表属性）
-            for field_name, boolean_kwargs in field_boolean_mapping:
-                # 用getattr获取DeviceFact的列表属性（替代 device_fact[field_name]）
-                content_list = getattr(device_fact, field_name, [])
-                if not isinstance(content_list, list) or not content_list:
-                    continue
+            # 步骤4：遍历内容列表，创建TextWithMeta并入库（保持不变）
+            for content in content_list:
+                # 由设备、字段、内容确定text_id：设备写入中途崩溃后重新执行，已写入的文档不会重复
+                text_id = uuid.uuid5(uuid.NAMESPACE_URL, f"{device_id}/{field_name}/{content}").hex
 
-                # 步骤5：遍历内容列表，创建TextWithMeta并入库（保持不变）
-                for content in content_list:
-                    # 生成唯一text_id
-                    text_id = uuid.uuid4().hex
+                # 实例化TextWithMeta（强转content为字符串，避免报错）
+                text_with_meta = TextWithMeta(
+                    text_id=text_id,
+                    content=str(content),
+                    **boolean_kwargs
+                )
 
-                    # 实例化TextWithMeta（强转content为字符串，避免报错）
-                    text_with_meta = TextWithMeta(
-                        text_id=text_id,
-                        content=str(content),
-                        **boolean_kwargs
-                    )
+                # 入库
+                self.vector_db.add_text_to_vector_db(text_with_meta, collection)
 
-                    # 入库
-                    self.vector_db.add_text_to_vector_db(text_with_meta, collection)
+    def refresh_registry_facts(self, changed_entity_ids: list = (), removed_entity_ids: list = (),
+                               changed_device_ids: list = (), removed_device_ids: list = ()) -> list:
+        """
+        注册表增量同步后，只对变化的实体/设备重新提取事实（代价与变化数量成正比，而不是全量重新初始化）
+        :param changed_entity_ids: 新增或静态属性变化的实体
+        :param removed_entity_ids: 已删除的实体
+        :param changed_device_ids: 新增、注册信息变化或实体增减的设备
+        :param removed_device_ids: 已删除的设备
+        :return: 重新提取了设备事实的设备ID列表
+        """
+        # 步骤1：删除已不存在的设备和实体
+        for device_id in removed_device_ids:
+            self.fact_store.delete_device(device_id)
+            self.device_fact.pop(device_id, None)
+            try:
+                self.vector_db.client.delete_collection(device_id)
+            except Exception:
+                # 设备从未写入向量库
+                pass
+        for entity_id in removed_entity_ids:
+            self.fact_store.delete_entity(entity_id)
+
+        # 步骤2：同步注册信息，并重新提取变化实体的事实
+        refresh_device_ids = [device_id for device_id in changed_device_ids if DEVICEINFO.get_device_detail(device_id)]
+        if refresh_device_ids:
+            self.fact_store.upsert_devices([DEVICEINFO.get_device_detail(device_id) for device_id in refresh_device_ids])
+        for entity_id in changed_entity_ids:
+            entity_detail = DEVICEINFO.get_entity_detail(entity_id)
+            if entity_detail is None:
+                continue
+            device_id = DEVICEINFO.get_device_id_by_entity(entity_id)
+            self.fact_store.upsert_entities([entity_detail], {entity_id: device_id})
+            if device_id is None:
+                # 不属于任何设备的实体不参与设备事实
+                continue
+            entity_fact = self._extract_entity_fact(entity_id)
+            self.init_journal.record_entity_fact(device_id, entity_id, entity_fact.model_dump())
+            self.fact_store.upsert_entity_fact(device_id, entity_id, entity_fact.model_dump())
+            if device_id not in refresh_device_ids:
+                refresh_device_ids.append(device_id)
+
+        # 步骤3：重新提取受影响设备的整体事实，并替换向量库中由注册信息提取的字段（用户记忆保留）
+        for device_id in refresh_device_ids:
+            entity_fact_list = self.fact_store.get_entity_facts(device_id)
+            if not entity_fact_list:
+                continue
+            device_fact = self._extract_device_fact(device_id, entity_fact_list)
+            self.init_journal.record_device_fact(device_fact.model_dump())
+            self.fact_store.upsert_device_fact(device_fact.model_dump())
+            self.device_fact[device_id] = device_fact
+            self._save_device_fact_to_vector_db(device_id, device_fact, replace_fields=("states", "capabilities"))
+        return refresh_device_ids
 
     def _save_init_device_fact_to_json(self, init_fact: dict, save_path: str):
         try:
@@ -534,14 +727,21 @@ class SmartHomeMemory():
         prompt=f"""     
         根据当前对话和近期的历史对话，分析是否有新增/过时/修改的事实信息，如果有：
         1. 对话里没有提供设备ID时，调用工具获取到该设备ID
-        2. 选择并调用add/delete/update工具对记忆库中的信息进行更新
+        2. 选择并调用add/delete/update工具对记忆库中的信息进行更新；有多条修改/删除时，优先用batch_update一次完成
         3. 更新成功后简单说明本次更新了哪些内容。
         【对话】
         {dialogue_record}
         """
         GLOBALCONFIG.nested_logger=GLOBALCONFIG.memory_update_logger
+        # 预筛：对话不含新增/过时/修改的事实时，直接跳过带工具的记忆更新agent
+        decision = MEMORYGATE.check(dialogue_record)
+        if not decision.should_extract:
+            GLOBALCONFIG.print_nested_log(
+                f"记忆更新预筛：跳过（{decision.reason}），当前跳过率{MEMORYGATE.skip_rate():.1%}"
+            )
+            return f"无需更新记忆：{decision.reason}"
         agent = create_agent(model=get_llm(),
-                             tools=[search_topK_device_by_clues, add, delete,update],
+                             tools=[search_topK_device_by_clues, add, delete,update,batch_update],
                              middleware=[log_before, log_response, log_before_agent, log_after_agent],
                              context_schema=AgentContext
                              )
@@ -555,6 +755,43 @@ class SmartHomeMemory():
         # device_fact_list_result = result["structured_response"]
         return result["messages"][-1].content
 
+    def extract_and_update_async(self, dialogue_record: str, device_id: str = None) -> int:
+        """
+        将对话记录放入后台记忆更新队列后立即返回，记忆维护不计入用户指令的响应时间
+        :param dialogue_record: 对话记录
+        :param device_id: 可选，已知涉及的设备ID，同一设备的更新会串行执行
+        :return: 任务ID，可通过MEMORYUPDATEWORKER.get_job查询结果，测试时用MEMORYUPDATEWORKER.flush()等待完成
+        """
+        return MEMORYUPDATEWORKER.submit(dialogue_record=dialogue_record, device_id=device_id)
+
+
+    def ingest_dialogue_file(self, file_path: str, max_workers: int = 2, checkpoint_path: str = None) -> int:
+        """
+        流式导入对话记录文件（JSON数组或JSONL），逐段提取事实并更新记忆：
+        边解析边处理，同时在途的对话数有上限，内存占用与文件大小无关；
+        每段对话完成后推进检查点，中断后重新执行从检查点继续
+        :param file_path: 对话记录文件
+        :param max_workers: 并发执行extract_and_update的数量
+        :param checkpoint_path: 检查点文件，默认temp_output/dialogue_ingest_checkpoint.json
+        :return: 已处理的对话数
+        """
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        checkpoint = IngestCheckpoint(
+            checkpoint_path=checkpoint_path or os.path.join(current_dir, "temp_output", "dialogue_ingest_checkpoint.json"),
+            source=file_path
+        )
+
+        def handler(dialogue_str: str):
+            # 工作线程使用独立的日志器，避免并发对话的日志互相覆盖
+            GLOBALCONFIG.isolate_thread_logger(GLOBALCONFIG.memory_update_logger)
+            return self.extract_and_update(dialogue_record=dialogue_str)
+
+        return run_pipeline(
+            items=iter_dialogues(file_path),
+            handler=handler,
+            max_workers=max_workers,
+            checkpoint=checkpoint
+        )
 
 
 SMARTHOMEMEMORY=SmartHomeMemory()
@@ -570,13 +807,9 @@ def get_device_all_entities_states(device_id: str):
     #     name=device_id,
     #     embedding_function=VECTORDB.embedding_func
     # )
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(current_dir, "temp_output","entities_fact.json")
-    with open(file_path, 'r', encoding='utf-8') as f:
-        # json.load() 将文件对象解析为Python字典/列表
-        data = json.load(f)
+    # 只从事实库读取该设备的实体事实，无需解析整个JSON文件
     ans_str_list = []
-    for entities in data[device_id]:
+    for entities in FACTSTORE.get_entity_facts(device_id):
         e_str=f"{entities['entity_id']}({entities['friendly_name']}):{'、'.join(entities['states'])}"
         ans_str_list.append(e_str)
     return "\n".join(ans_str_list)
@@ -588,59 +821,28 @@ def get_device_all_entities_capabilities(device_id: str):
     :param device_id: 设备ID
     :return:
     """
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(current_dir, "temp_output", "entities_fact.json")
-    with open(file_path, 'r', encoding='utf-8') as f:
-        # json.load() 将文件对象解析为Python字典/列表
-        data = json.load(f)
+    # 只从事实库读取该设备的实体事实，无需解析整个JSON文件
     ans_str_list = []
-    for entities in data[device_id]:
+    for entities in FACTSTORE.get_entity_facts(device_id):
         e_str = f"{entities['entity_id']}({entities['friendly_name']}):{'、'.join(entities['capabilities'])}"
         ans_str_list.append(e_str)
     return "\n".join(ans_str_list)
 
-def load_json_and_convert_dialogues():
+def load_json_and_convert_dialogues(json_file_path: str = "./dialogue_records.json"):
     """
-        加载JSON文件，将每段对话转换为一段格式化字符串
-        :param json_file_path: JSON文件的路径（相对路径或绝对路径）
-        :return: 包含每段对话字符串的列表，若执行失败返回空列表
+        流式加载对话记录文件（JSON数组或JSONL），逐段返回格式化后的对话字符串
+        :param json_file_path: 文件的路径（相对路径或绝对路径）
+        :return: 对话字符串的生成器；文件不存在或格式无效时打印错误并结束（格式错误之前已解析的对话照常返回）
         """
-    json_file_path="./dialogue_records.json"
-    # 初始化返回结果列表
-    dialogue_str_list = []
-
-    try:
-        # 1. 打开并加载JSON文件（with语句自动关闭文件，更安全）
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            dialogue_json = json.load(f)
-
-        # 2. 遍历JSON中的每一段对话（外层数组的每个子数组）
-        for single_dialogue in dialogue_json:
-            # 初始化单段对话的拼接字符串
-            dialogue_content = ""
-
-            # 3. 遍历单段对话中的每个角色消息（user/ai）
-            for msg_obj in single_dialogue:
-                # 提取user或ai的内容，避免KeyError
-                if "user" in msg_obj:
-                    dialogue_content += f"用户：{msg_obj['user']}\n"
-                elif "ai" in msg_obj:
-                    dialogue_content += f"AI：{msg_obj['ai']}\n"
-
-            # 4. 去除末尾多余的换行符，添加到结果列表（可选，提升整洁度）
-            dialogue_str_list.append(dialogue_content.rstrip('\n'))
-
-        return dialogue_str_list
-
-    except FileNotFoundError:
+    if not os.path.exists(json_file_path):
         print(f"错误：未找到指定的JSON文件 -> {json_file_path}")
-        return []
+        return
+    try:
+        yield from iter_dialogues(json_file_path)
     except json.JSONDecodeError:
         print("错误：JSON文件格式无效，无法解析")
-        return []
     except Exception as e:
         print(f"错误：执行过程中出现未知异常 -> {str(e)}")
-        return []
 
 if __name__ == "__main__":
     # SMARTHOMEMEMORY.init_memory_for_entity()
@@ -650,5 +852,6 @@ if __name__ == "__main__":
     for idx, dialogue_str in enumerate(dialogue_str_list, start=1):
         if idx < 7:
             continue
-        SMARTHOMEMEMORY.extract_and_update(dialogue_record=dialogue_str)
+        SMARTHOMEMEMORY.extract_and_update_async(dialogue_record=dialogue_str)
+    MEMORYUPDATEWORKER.flush()
     pass
\ No newline at end of file
@@ -0,0 +1,404 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Iterable, Any
+
+# 设备级事实的字段（与DeviceFact模型对齐）
+DEVICE_FACT_FIELDS = ["states", "capabilities", "device_id_clues", "usage_habits", "others"]
+# 实体级事实的字段（与EntityFact模型对齐）
+ENTITY_FACT_FIELDS = ["states", "capabilities", "entity_matching_clues", "others"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    device_id   TEXT PRIMARY KEY,
+    device_name TEXT,
+    area_id     TEXT,
+    raw_json    TEXT,
+    update_time TEXT
+);
+CREATE TABLE IF NOT EXISTS entities (
+    entity_id     TEXT PRIMARY KEY,
+    device_id     TEXT,
+    friendly_name TEXT,
+    domain        TEXT,
+    raw_json      TEXT,
+    update_time   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_entities_device_id ON entities(device_id);
+CREATE TABLE IF NOT EXISTS facts (
+    fact_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id   TEXT NOT NULL,
+    entity_id   TEXT,
+    field       TEXT NOT NULL,
+    content     TEXT NOT NULL,
+    update_time TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_facts_device_id ON facts(device_id);
+CREATE INDEX IF NOT EXISTS idx_facts_entity_id ON facts(entity_id);
+CREATE TABLE IF NOT EXISTS tags (
+    fact_id INTEGER NOT NULL REFERENCES facts(fact_id) ON DELETE CASCADE,
+    tag     TEXT NOT NULL,
+    PRIMARY KEY (fact_id, tag)
+);
+CREATE INDEX IF NOT EXISTS idx_tags_tag ON tags(tag);
+"""
+
+
+class FactStore():
+    """
+    基于SQLite的设备/实体事实库，替代整文件重写的JSON：
+    1. devices/entities 保存注册表中的基础信息
+    2. facts 每行保存一条事实（设备级事实的entity_id为NULL）
+    3. tags 为事实打标签（默认标签即字段名，如states、capabilities）
+    写入按「单个设备/实体」增量进行，读取只查询需要的行；JSON仅作为调试导出
+    """
+    def __init__(self, db_path: Optional[str] = None):
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        self.db_path = db_path or os.path.join(current_dir, "temp_output", "fact_store.sqlite3")
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        # 每个线程独立一个连接（sqlite3连接不可跨线程共享）
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL模式：写事务进行中，读者看到的仍是上一次提交的完整数据
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.executescript(_SCHEMA)
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---------------------- 注册表信息 ----------------------
+    def upsert_devices(self, devices: Iterable[Dict[str, Any]]):
+        """
+        批量写入/更新设备注册信息
+        :param devices: device_registry.json中的设备字典列表
+        """
+        now = datetime.now().isoformat()
+        rows = [
+            (device["id"], device.get("name_by_user") or device.get("name"), device.get("area_id"),
+             json.dumps(device, ensure_ascii=False), now)
+            for device in devices
+        ]
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                """INSERT INTO devices(device_id, device_name, area_id, raw_json, update_time)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(device_id) DO UPDATE SET
+                       device_name=excluded.device_name, area_id=excluded.area_id,
+                       raw_json=excluded.raw_json, update_time=excluded.update_time""",
+                rows
+            )
+
+    def upsert_entities(self, entities: Iterable[Dict[str, Any]], entity_device_map: Dict[str, str]):
+        """
+        批量写入/更新实体信息
+        :param entities: entities.json中的实体字典列表
+        :param entity_device_map: entity_id → device_id 的映射
+        """
+        now = datetime.now().isoformat()
+        rows = [
+            (entity["entity_id"], entity_device_map.get(entity["entity_id"]),
+             entity.get("attributes", {}).get("friendly_name"), entity["entity_id"].split(".")[0],
+             json.dumps(entity, ensure_ascii=False), now)
+            for entity in entities
+        ]
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                """INSERT INTO entities(entity_id, device_id, friendly_name, domain, raw_json, update_time)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(entity_id) DO UPDATE SET
+                       device_id=excluded.device_id, friendly_name=excluded.friendly_name,
+                       domain=excluded.domain, raw_json=excluded.raw_json, update_time=excluded.update_time""",
+                rows
+            )
+
+    # ---------------------- 事实写入 ----------------------
+    def _replace_owner_facts(self, conn: sqlite3.Connection, device_id: str, entity_id: Optional[str],
+                             field_contents: Dict[str, List[str]]):
+        """
+        增量替换某个设备（entity_id为None）或实体的事实：
+        只删除已不存在的行、只插入新增的行，未变化的行保持不动
+        """
+        now = datetime.now().isoformat()
+        if entity_id is None:
+            existing = conn.execute(
+                "SELECT fact_id, field, content FROM facts WHERE device_id=? AND entity_id IS NULL",
+                (device_id,)
+            ).fetchall()
+        else:
+            existing = conn.execute(
+                "SELECT fact_id, field, content FROM facts WHERE entity_id=?",
+                (entity_id,)
+            ).fetchall()
+        existing_map = {(row["field"], row["content"]): row["fact_id"] for row in existing}
+
+        wanted = []
+        for field, contents in field_contents.items():
+            for content in contents or []:
+                key = (field, str(content))
+                if key not in wanted:
+                    wanted.append(key)
+        wanted_set = set(wanted)
+
+        # 删除过时的事实（tags通过外键级联删除）
+        stale_ids = [(fact_id,) for key, fact_id in existing_map.items() if key not in wanted_set]
+        if stale_ids:
+            conn.executemany("DELETE FROM facts WHERE fact_id=?", stale_ids)
+
+        # 插入新增的事实，并以字段名作为默认标签
+        for field, content in wanted:
+            if (field, content) in existing_map:
+                continue
+            cursor = conn.execute(
+                "INSERT INTO facts(device_id, entity_id, field, content, update_time) VALUES (?, ?, ?, ?, ?)",
+                (device_id, entity_id, field, content, now)
+            )
+            conn.execute("INSERT OR IGNORE INTO tags(fact_id, tag) VALUES (?, ?)", (cursor.lastrowid, field))
+
+    def upsert_device_fact(self, device_fact: Dict[str, Any]):
+        """
+        写入/更新单个设备的设备级事实
+        :param device_fact: DeviceFact.model_dump()得到的字典
+        """
+        device_id = device_fact["device_id"]
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """INSERT INTO devices(device_id, device_name, update_time) VALUES (?, ?, ?)
+                   ON CONFLICT(device_id) DO UPDATE SET
+                       device_name=COALESCE(excluded.device_name, devices.device_name),
+                       update_time=excluded.update_time""",
+                (device_id, device_fact.get("device_name"), datetime.now().isoformat())
+            )
+            self._replace_owner_facts(
+                conn, device_id, None,
+                {field: device_fact.get(field, []) for field in DEVICE_FACT_FIELDS}
+            )
+
+    def upsert_entity_fact(self, device_id: str, entity_id: str, entity_fact: Dict[str, Any]):
+        """
+        写入/更新单个实体的事实
+        :param device_id: 实体所属设备ID
+        :param entity_id: 注册表中的实体ID（主键不取自LLM输出，LLM可能漏填或改写entity_id）
+        :param entity_fact: EntityFact.model_dump()得到的字典
+        """
+        conn = self._connect()
+        with conn:
+            self._upsert_entity_fact(conn, device_id, entity_id, entity_fact)
+
+    def _upsert_entity_fact(self, conn: sqlite3.Connection, device_id: str, entity_id: str,
+                            entity_fact: Dict[str, Any]):
+        conn.execute(
+            """INSERT INTO entities(entity_id, device_id, friendly_name, domain, update_time) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(entity_id) DO UPDATE SET
+                   device_id=excluded.device_id,
+                   friendly_name=COALESCE(excluded.friendly_name, entities.friendly_name),
+                   update_time=excluded.update_time""",
+            (entity_id, device_id, entity_fact.get("friendly_name"), entity_id.split(".")[0],
+             datetime.now().isoformat())
+        )
+        self._replace_owner_facts(
+            conn, device_id, entity_id,
+            {field: entity_fact.get(field, []) for field in ENTITY_FACT_FIELDS}
+        )
+
+    def upsert_entities_fact(self, init_fact: Dict[str, Dict[str, Dict[str, Any]]]):
+        """
+        在一个事务中批量写入实体事实
+        :param init_fact: {device_id: {注册表中的entity_id: EntityFact字典}}
+        """
+        conn = self._connect()
+        with conn:
+            for device_id, entity_facts in init_fact.items():
+                for entity_id, entity_fact in entity_facts.items():
+                    self._upsert_entity_fact(conn, device_id, entity_id, entity_fact)
+
+    def add_tag(self, fact_id: int, tag: str):
+        """为事实追加标签"""
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO tags(fact_id, tag) VALUES (?, ?)", (fact_id, tag))
+
+    def delete_device(self, device_id: str):
+        """删除设备及其所有实体、事实"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM facts WHERE device_id=?", (device_id,))
+            conn.execute("DELETE FROM entities WHERE device_id=?", (device_id,))
+            conn.execute("DELETE FROM devices WHERE device_id=?", (device_id,))
+
+    def delete_entity(self, entity_id: str):
+        """删除实体及其事实"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM facts WHERE entity_id=?", (entity_id,))
+            conn.execute("DELETE FROM entities WHERE entity_id=?", (entity_id,))
+
+    # ---------------------- 事实读取 ----------------------
+    def query_facts(self, device_id: Optional[str] = None, entity_id: Optional[str] = None,
+                    tag: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按设备ID/实体ID/标签查询事实行（条件之间为AND关系，均走索引）
+        :return: [{"fact_id","device_id","entity_id","field","content","update_time"}]
+        """
+        sql = "SELECT f.fact_id, f.device_id, f.entity_id, f.field, f.content, f.update_time FROM facts f"
+        conditions, params = [], []
+        if tag is not None:
+            sql += " JOIN tags t ON t.fact_id = f.fact_id"
+            conditions.append("t.tag=?")
+            params.append(tag)
+        if device_id is not None:
+            conditions.append("f.device_id=?")
+            params.append(device_id)
+        if entity_id is not None:
+            conditions.append("f.entity_id=?")
+            params.append(entity_id)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY f.fact_id"
+        rows = self._connect().execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_device_fact(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取单个设备的设备级事实，结构与DeviceFact.model_dump()一致；不存在返回None
+        """
+        conn = self._connect()
+        device_row = conn.execute("SELECT device_name FROM devices WHERE device_id=?", (device_id,)).fetchone()
+        rows = conn.execute(
+            "SELECT field, content FROM facts WHERE device_id=? AND entity_id IS NULL ORDER BY fact_id",
+            (device_id,)
+        ).fetchall()
+        if device_row is None and not rows:
+            return None
+        device_fact = {"device_id": device_id, "device_name": device_row["device_name"] if device_row else None}
+        for field in DEVICE_FACT_FIELDS:
+            device_fact[field] = []
+        for row in rows:
+            device_fact.setdefault(row["field"], []).append(row["content"])
+        return device_fact
+
+    def get_entity_facts(self, device_id: str) -> List[Dict[str, Any]]:
+        """
+        读取设备下所有实体的事实，结构与entities_fact.json中单个设备的列表一致
+        """
+        conn = self._connect()
+        entity_rows = conn.execute(
+            "SELECT entity_id, friendly_name FROM entities WHERE device_id=? ORDER BY rowid",
+            (device_id,)
+        ).fetchall()
+        fact_rows = conn.execute(
+            "SELECT entity_id, field, content FROM facts WHERE device_id=? AND entity_id IS NOT NULL ORDER BY fact_id",
+            (device_id,)
+        ).fetchall()
+        entity_facts = {}
+        for row in entity_rows:
+            entity_fact = {"entity_id": row["entity_id"], "friendly_name": row["friendly_name"]}
+            for field in ENTITY_FACT_FIELDS:
+                entity_fact[field] = []
+            entity_facts[row["entity_id"]] = entity_fact
+        for row in fact_rows:
+            entity_fact = entity_facts.get(row["entity_id"])
+            if entity_fact is not None:
+                entity_fact.setdefault(row["field"], []).append(row["content"])
+        return list(entity_facts.values())
+
+    def list_device_ids(self) -> List[str]:
+        """返回所有有事实记录的设备ID"""
+        rows = self._connect().execute("SELECT DISTINCT device_id FROM facts ORDER BY device_id").fetchall()
+        return [row["device_id"] for row in rows]
+
+    def is_empty(self) -> bool:
+        """事实表中是否还没有任何记录"""
+        return self._connect().execute("SELECT 1 FROM facts LIMIT 1").fetchone() is None
+
+    # ---------------------- 快照 ----------------------
+    def backup_to(self, target_path: str):
+        """用SQLite在线备份接口将事实库完整复制到target_path（写入期间也能得到一致的副本）"""
+        target = sqlite3.connect(target_path)
+        try:
+            self._connect().backup(target)
+        finally:
+            target.close()
+
+    def restore_from(self, source_path: str):
+        """用SQLite在线备份接口将source_path的内容整体覆盖到事实库；已打开的连接无需重连即可看到新数据"""
+        source = sqlite3.connect(source_path)
+        try:
+            source.backup(self._connect())
+        finally:
+            source.close()
+
+    # ---------------------- JSON 导入/导出（调试用） ----------------------
+    def import_json(self, entities_fact_path: Optional[str] = None, device_fact_path: Optional[str] = None):
+        """从旧的entities_fact.json/device_fact.json导入事实（用于迁移已有数据）"""
+        if entities_fact_path and os.path.exists(entities_fact_path):
+            with open(entities_fact_path, "r", encoding="utf-8") as f:
+                # 旧JSON只能按事实中的entity_id归属，缺失entity_id的条目无法导入
+                self.upsert_entities_fact({
+                    device_id: {fact["entity_id"]: fact for fact in entity_fact_list if fact.get("entity_id")}
+                    for device_id, entity_fact_list in json.load(f).items()
+                })
+        if device_fact_path and os.path.exists(device_fact_path):
+            with open(device_fact_path, "r", encoding="utf-8") as f:
+                for device_fact in json.load(f).values():
+                    self.upsert_device_fact(device_fact)
+
+    def export_json(self, entities_fact_path: str, device_fact_path: str):
+        """将事实库导出为与原先格式一致的两个JSON文件，便于调试查看"""
+        try:
+            device_ids = self.list_device_ids()
+            entities_fact = {}
+            device_fact = {}
+            for device_id in device_ids:
+                entity_facts = self.get_entity_facts(device_id)
+                if entity_facts:
+                    entities_fact[device_id] = entity_facts
+                fact = self.get_device_fact(device_id)
+                if fact is not None:
+                    device_fact[device_id] = fact
+            for save_path, data in ((entities_fact_path, entities_fact), (device_fact_path, device_fact)):
+                save_dir = os.path.dirname(save_path)
+                if save_dir and not os.path.exists(save_dir):
+                    os.makedirs(save_dir, exist_ok=True)
+                with open(save_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                print(f"事实库已导出到：{os.path.abspath(save_path)}")
+        except Exception as e:
+            print(f"导出事实库到JSON失败：{e}", file=sys.stderr)
+            raise
+
+
+FACTSTORE = FactStore()
+
+if __name__ == "__main__":
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    FACTSTORE.import_json(
+        entities_fact_path=os.path.join(current_dir, "temp_output", "entities_fact.json"),
+        device_fact_path=os.path.join(current_dir, "temp_output", "device_fact.json")
+    )
+    print(FACTSTORE.get_device_fact("cf03cb835279ea4876ab6ee202aa9832"))
+    print(FACTSTORE.query_facts(tag="capabilities")[:5])
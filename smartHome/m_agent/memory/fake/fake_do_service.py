@@ -1,11 +1,14 @@
-import datetime
+import contextvars
 import json
 import re
 import traceback
+from contextlib import contextmanager
 from functools import wraps
 from typing import Union, Dict, List
-from smartHome.m_agent.memory.fake.fake_request import fake_get_states_by_entity_id
-
+from smartHome.m_agent.common.global_config import GLOBALCONFIG
+from smartHome.m_agent.memory.fake.fake_request import fake_get_states_by_entity_id, HOMEASSITANT_DATA
+from smartHome.m_agent.memory.fake.sim_clock import SIM_CLOCK
+from smartHome.m_agent.memory.fake.state_event_bus import STATEEVENTBUS
 
 
 """
@@ -14,16 +17,18 @@ from smartHome.m_agent.memory.fake.fake_request import fake_get_states_by_entity
 最终，函数会被多层装饰器 “包装”，每层装饰器的逻辑都会生效。
 """
 
-domain_register={}
-# 定义带参数的装饰器 @domain(name="xx")
-def domain(name):
+# (domain, service) -> 服务处理函数（参数为字典body），模块加载时由@service一次性建立
+service_register={}
+def service(domain_name, service_name):
     def decorator(func):
-        # 将函数注册到字典中：键为name，值为函数对象
-        domain_register[name] = func
-        # 返回原函数（不修改函数功能）
+        service_register[(domain_name, service_name)] = func
         return func
     return decorator
 
+def _parse_body(body: Union[str, Dict]) -> Dict:
+    """只在公开入口解析一次字符串body，内部调用直接传字典"""
+    return json.loads(body) if isinstance(body, str) else body
+
 # todo 执行domain中的service时，如果body里的entity_id；其他参数错误会返回什么response?!
 def exception_return(response):
     """装饰器：当函数执行出现异常时，返回指定的response"""
@@ -35,15 +40,38 @@ def exception_return(response):
             except  Exception as e:  # 关键：as e 绑定具体异常实例到变量e
                 # 打印捕获到的具体异常实例（包含错误描述）
                 print("发生异常：", e)
-                traceback.print_exc()
+                if GLOBALCONFIG.fake_ha_debug:
+                    traceback.print_exc()
                 return response
         return wrapper
     return decorator
 
 
+# 批量执行时所有修改共用的时间戳；None表示使用当前时间
+_SERVICE_TIME: contextvars.ContextVar = contextvars.ContextVar("service_time", default=None)
+
+
+def service_now() -> str:
+    """服务执行时间（ISO格式，来自SIM_CLOCK）：批量执行期间返回同一个时间戳"""
+    return _SERVICE_TIME.get() or SIM_CLOCK.isoformat()
+
+
+@contextmanager
+def shared_service_time():
+    """在此范围内执行的服务使用同一个时间戳（嵌套时沿用外层的时间戳）"""
+    if _SERVICE_TIME.get() is not None:
+        yield
+        return
+    token = _SERVICE_TIME.set(SIM_CLOCK.isoformat())
+    try:
+        yield
+    finally:
+        _SERVICE_TIME.reset(token)
+
+
 def update_service_time(func):
     """
-    装饰器：更新函数返回的entity字典中三个时间字段为当前时间的ISO格式
+    装饰器：更新函数返回的entity字典中三个时间字段为当前时间（SIM_CLOCK）的ISO格式
     """
 
     @wraps(func)  # 保留原函数的元信息（如名称、文档字符串等）
@@ -53,8 +81,8 @@ def update_service_time(func):
 
         # 检查返回值是否为字典（确保可以更新字段）
         if isinstance(entity, dict):
-            # 获取当前时间的ISO格式字符串
-            current_time = datetime.datetime.now().isoformat()
+            # 获取当前时间的ISO格式字符串（批量执行时为同一个时间戳）
+            current_time = service_now()
 
             # 更新三个时间字段
             entity["last_changed"] = current_time
@@ -67,34 +95,127 @@ def update_service_time(func):
 
 bad_request="400: Bad Request"
 
+# 米家智能台灯Lite的实体：<domain>.philips_cn_<设备号>_lite_<功能>，同一台灯的实体共用设备号（合成家庭沿用同样的命名）
+_DESK_LAMP_PATTERN = re.compile(r"^(?P<domain>\w+)\.(?P<lamp>philips_cn_\w+?_lite)_(?P<function>\w+)$")
+
+def _desk_lamp_function(entity_id: str) -> Union[str, None]:
+    """台灯实体的功能部分（如toggle_a_2_1）；不是台灯实体时返回None"""
+    match = _DESK_LAMP_PATTERN.match(entity_id)
+    return match.group("function") if match else None
+
+def desk_lamp_light_id(entity_id: str) -> Union[str, None]:
+    """台灯任一实体所属台灯的light实体ID"""
+    match = _DESK_LAMP_PATTERN.match(entity_id)
+    return f"light.{match.group('lamp')}_s_2" if match else None
+
+def _linked_entities(entity_id: str) -> List[str]:
+    """服务执行时会联动修改的其他实体（台灯按钮联动台灯的light实体）"""
+    if entity_id.startswith("button.") and _desk_lamp_function(entity_id) is not None:
+        return [desk_lamp_light_id(entity_id)]
+    return []
+
+def _service_footprint(operations: List[Dict]) -> List[str]:
+    """一组服务调用可能修改的所有实体（包括联动的实体），执行前对它们统一加锁"""
+    footprint = []
+    for operation in operations:
+        body = _parse_body(operation.get("body") or {})
+        entity_ids = _split_entity_ids(body.get("entity_id"))
+        if entity_ids is None:
+            entity_ids = [body["entity_id"]] if isinstance(body.get("entity_id"), str) else []
+        for entity_id in entity_ids:
+            footprint.append(entity_id)
+            footprint.extend(_linked_entities(entity_id))
+    return footprint
+
+def _split_entity_ids(entity_id) -> Union[List[str], None]:
+    """与HA一致：entity_id可以是列表或逗号分隔的字符串；单个实体时返回None"""
+    if isinstance(entity_id, list):
+        return entity_id
+    if isinstance(entity_id, str) and "," in entity_id:
+        return [item.strip() for item in entity_id.split(",") if item.strip()]
+    return None
+
 @exception_return(response=bad_request)
 def fake_execute_domain_service_by_entity_id(domain, service, body, ) -> Union[Dict, List]:
     """
     Calls a service within a specific domain. Will return when the service has been executed.
+    body可以是JSON字符串（工具调用）或字典（模拟器内部联动调用，不经过JSON编解码）。
+    body中的entity_id可以是列表（或逗号分隔的字符串），此时对每个实体执行服务，返回变化后的实体列表，
+    无效的实体会被跳过（与HA一致），全部无效时返回400。
+    执行结束后，状态或属性发生变化的实体会在STATEEVENTBUS上发布state_changed事件。
+    执行期间持有涉及实体（包括联动实体）的锁，并发调用同一实体时依次执行
     """
+    handler = service_register.get((domain, service))
+    if handler is None:
+        raise KeyError((domain, service))
+    body_dict = _parse_body(body)
+    entity_ids = _split_entity_ids(body_dict.get("entity_id"))
+    footprint = _service_footprint([{"body": body_dict}])
+    with HOMEASSITANT_DATA.lock_entities(footprint), STATEEVENTBUS.capture(), shared_service_time():
+        if entity_ids is None:
+            return handler(body_dict)
+        # 单个实体失败不影响其他实体
+        safe_handler = exception_return(response=bad_request)(handler)
+        results = [safe_handler({**body_dict, "entity_id": entity_id}) for entity_id in entity_ids]
+    changed = [result for result in results if result != bad_request]
+    return changed if changed else bad_request
+
+def fake_set_state(entity_id: str, state, attributes: Dict = None) -> Dict:
+    """
+    模拟设备自身上报的状态变化（如门磁被打开、温度变化），与HA的POST /api/states/<entity_id>类似：
+    设置state并合并attributes，更新时间字段，并发布state_changed事件
+    """
+    with HOMEASSITANT_DATA.lock_entities([entity_id]), STATEEVENTBUS.capture():
+        entity = fake_get_states_by_entity_id(entity_id)
+        if entity is None:
+            raise KeyError(entity_id)
+        current_time = service_now()
+        # 与HA一致：last_changed只在state变化时更新
+        if entity["state"] != state:
+            entity["last_changed"] = current_time
+        entity["state"] = state
+        if attributes:
+            entity["attributes"].update(attributes)
+        entity["last_reported"] = current_time
+        entity["last_updated"] = current_time
+        return entity
 
-    domain_func = domain_register[domain]
-    result=domain_func(service,body)
-    return result
-
-@exception_return(response=bad_request)
-@domain(name="switch")
-def domain_switch(service:str,body:dict):
+def fake_execute_batch(operations: List[Dict]) -> Dict[str, List]:
     """
-        Switch域的服务入口，根据服务名称分发到对应处理函数
-        :param service: 服务名称（turn_on/turn_off/toggle）
-        :param body: 服务调用参数（包含目标实体等信息）
-        :return: 处理结果
-        """
-    service_map = {
-        "turn_on": service_switch_turn_on,
-        "turn_off": service_switch_turn_off,
-        "toggle": service_switch_toggle
-    }
-    body=json.loads(body)
-    # 调用对应服务函数
-    return service_map[service](body)
+    一次执行多个服务调用（所有修改使用同一个时间戳，state_changed事件在全部执行完后统一发布）
+    :param operations: [{"domain": ..., "service": ..., "body": dict或JSON字符串}, ...]
+    :return: {"results": 每个调用各自的结果（失败为"400: Bad Request"）,
+              "changed_states": 所有变化后的实体（按entity_id去重，保持首次出现的顺序）}
+    """
+    results = []
+    changed_states = {}
+    # 先逐个解析body：格式错误的调用记为400，不影响其他调用，也不参与加锁范围的计算
+    bodies = []
+    for operation in operations:
+        try:
+            body = _parse_body(operation.get("body") or {})
+        except ValueError:
+            body = None
+        bodies.append(body if isinstance(body, dict) else None)
+    valid_operations = [{"body": body} for body in bodies if body is not None]
+    # 整批加锁：其他线程不会看到批量执行了一半的状态
+    with HOMEASSITANT_DATA.lock_entities(_service_footprint(valid_operations)), \
+            STATEEVENTBUS.capture(), shared_service_time():
+        for operation, body in zip(operations, bodies):
+            if body is None:
+                results.append(bad_request)
+                continue
+            result = fake_execute_domain_service_by_entity_id(
+                operation.get("domain"), operation.get("service"), body
+            )
+            results.append(result)
+            for entity in (result if isinstance(result, list) else [result]):
+                if isinstance(entity, dict) and "entity_id" in entity:
+                    changed_states[entity["entity_id"]] = entity
+    return {"results": results, "changed_states": list(changed_states.values())}
+
 
+@service(domain_name="switch", service_name="turn_on")
 @update_service_time
 def service_switch_turn_on(body: dict):
     """处理开关开启服务"""
@@ -103,6 +224,7 @@ def service_switch_turn_on(body: dict):
     entity['state']="on"
     friendly_name = entity["attributes"]["friendly_name"]
     return entity
+@service(domain_name="switch", service_name="turn_off")
 @update_service_time
 def service_switch_turn_off(body: dict):
     """处理开关关闭服务"""
@@ -111,6 +233,7 @@ def service_switch_turn_off(body: dict):
     entity['state'] = "off"
     return entity
 
+@service(domain_name="switch", service_name="toggle")
 @update_service_time
 def service_switch_toggle(body: dict):
     """处理开关切换服务（反转当前状态）"""
@@ -125,18 +248,6 @@ def service_switch_toggle(body: dict):
 # todo 灯泡实体属性中的"hs_color"，"rgb_color"，"xy_color"会变化吗？如何变化。 目前未处理
 # todo 台灯设置渐灭是会如何处理，entity如何改变
 # Light域服务实现（针对Yeelink灯泡特性）
-@exception_return(response=bad_request)
-@domain(name="light")
-def domain_light(service: str, body: str) -> Union[Dict, str]:
-    """light域服务入口，处理Yeelink灯泡的开关、亮度和色温调节"""
-    service_map = {
-        "turn_on": service_light_turn_on,
-        "turn_off": service_light_turn_off,
-        "toggle": service_light_toggle
-    }
-    body_dict = json.loads(body)
-    return service_map[service](body_dict)
-
 # 亮度调节工具函数（处理多种亮度参数）
 def _adjust_brightness(entity: Dict, body: Dict):
     current_brightness = entity["attributes"]["brightness"]
@@ -184,6 +295,7 @@ def _set_effect_philips(entity: Dict, body: Dict):
     entity["attributes"]["effect"] = effect
 
 # 灯服务处理函数
+@service(domain_name="light", service_name="turn_on")
 @update_service_time
 def service_light_turn_on(body: Dict) -> Dict:
     """开启灯泡，支持同时调节亮度和色温"""
@@ -199,12 +311,14 @@ def service_light_turn_on(body: Dict) -> Dict:
         # 切换特效（若指定）
         _set_effect_philips(entity, body)
     return entity
+@service(domain_name="light", service_name="turn_off")
 @update_service_time
 def service_light_turn_off(body: Dict) -> Dict:
     """关闭灯泡"""
     entity = fake_get_states_by_entity_id(body["entity_id"])
     entity["state"] = "off"
     return entity
+@service(domain_name="light", service_name="toggle")
 @update_service_time
 def service_light_toggle(body: Dict) -> Dict:
     """切换灯泡状态，切换为开启时可调节参数"""
@@ -216,16 +330,6 @@ def service_light_toggle(body: Dict) -> Dict:
     return entity
 
 
-@exception_return(response=bad_request)
-@domain(name="text")
-def domain_text(service: str, body: str) -> Union[Dict, str]:
-    """text域服务入口，处理文本值的更新"""
-    service_map = {
-        "set_value": service_text_set_value  # 核心服务：设置文本值
-    }
-    body_dict = json.loads(body)
-    return service_map[service](body_dict)
-
 def _text_gateway(body: Dict):
     """
         更新text实体的文本值（生效时间段）
@@ -295,6 +399,7 @@ def _text_speaker(body: Dict):
     entity["state"] = new_value
     return entity
 
+@service(domain_name="text", service_name="set_value")
 @update_service_time
 def service_text_set_value(body: Dict) -> Dict:
     entity_id = body["entity_id"]
@@ -306,15 +411,6 @@ def service_text_set_value(body: Dict) -> Dict:
         result=_text_speaker(body)
     return result
 
-@exception_return(response=bad_request)
-@domain(name="number")
-def domain_number(service: str, body: str) -> Union[Dict, str]:
-    """number域服务入口，处理数值型实体的更新"""
-    service_map = {
-        "set_value": service_number_set_value  # 仅支持set_value服务
-    }
-    body_dict = json.loads(body)
-    return service_map[service](body_dict)
 
 def _number_gateway(body: Dict) -> Dict:
     """
@@ -350,7 +446,7 @@ def _number_desk_lamp(body: Dict) -> Dict:
         """
     entity_id = body["entity_id"]
     # 验证实体ID是否匹配延时关灯时间配置实体
-    if entity_id != "number.philips_cn_1061200910_lite_dvalue_p_3_1":
+    if not entity_id.startswith("number.") or _desk_lamp_function(entity_id) != "dvalue_p_3_1":
         raise ValueError(f"无效实体ID: {entity_id}，预期为延时关灯时间配置实体")
 
     entity = fake_get_states_by_entity_id(entity_id)
@@ -371,6 +467,7 @@ def _number_desk_lamp(body: Dict) -> Dict:
     entity["state"] = value
     return entity
 
+@service(domain_name="number", service_name="set_value")
 @update_service_time
 def service_number_set_value(body: Dict) -> Dict:
     entity_id = body["entity_id"]
@@ -382,20 +479,8 @@ def service_number_set_value(body: Dict) -> Dict:
         result=_number_desk_lamp(body)
     return result
 
-@exception_return(response=bad_request)
-@domain(name="select")
-def domain_select(service: str, body: str) -> Union[Dict, str]:
-    """select域服务入口，处理小米智能多模网关2的勿扰模式状态切换"""
-    service_map = {
-        "select_first": service_select_first,
-        "select_last": service_select_last,
-        "select_next": service_select_next,
-        "select_option": service_select_option,
-        "select_previous": service_select_previous
-    }
-    body_dict = json.loads(body)
-    return service_map[service](body_dict)
 
+@service(domain_name="select", service_name="select_first")
 @update_service_time
 def service_select_first(body: Dict) -> Dict:
     """选择选项列表中的第一个值(Close)"""
@@ -404,6 +489,7 @@ def service_select_first(body: Dict) -> Dict:
     # 设置为选项列表中的第一个值
     entity["state"] = entity["attributes"]["options"][0]
     return entity
+@service(domain_name="select", service_name="select_last")
 @update_service_time
 def service_select_last(body: Dict) -> Dict:
     """选择选项列表中的最后一个值(Open)"""
@@ -412,6 +498,7 @@ def service_select_last(body: Dict) -> Dict:
     # 设置为选项列表中的最后一个值
     entity["state"] = entity["attributes"]["options"][-1]
     return entity
+@service(domain_name="select", service_name="select_next")
 @update_service_time
 def service_select_next(body: Dict) -> Dict:
     """切换到下一个选项，支持循环"""
@@ -430,6 +517,7 @@ def service_select_next(body: Dict) -> Dict:
         entity["state"] = options[0]
 
     return entity
+@service(domain_name="select", service_name="select_option")
 @update_service_time
 def service_select_option(body: Dict) -> Dict:
     """直接指定选择某个选项"""
@@ -443,6 +531,7 @@ def service_select_option(body: Dict) -> Dict:
 
     entity["state"] = option
     return entity
+@service(domain_name="select", service_name="select_previous")
 @update_service_time
 def service_select_previous(body: Dict) -> Dict:
     """切换到上一个选项，支持循环"""
@@ -463,37 +552,27 @@ def service_select_previous(body: Dict) -> Dict:
     return entity
 
 
-@exception_return(response=bad_request)
-@domain(name="button")
-def domain_button(service: str, body: str) -> Union[Dict, str]:
-    """button域服务入口，处理米家智能台灯Lite控制按钮的服务调用"""
-    # 仅支持press服务
-    service_map = {
-        "press": service_button_press
-    }
-    body_dict = json.loads(body)
-    return service_map[service](body_dict)
-
 def _button_desk_lamp(body: Dict):
     entity_id = body["entity_id"]
     button_entity = fake_get_states_by_entity_id(entity_id)
     # 关联的台灯light实体ID
-    light_entity_id = "light.philips_cn_1061200910_lite_s_2"
+    light_entity_id = desk_lamp_light_id(entity_id)
     light_entity = fake_get_states_by_entity_id(light_entity_id)
 
     # 更新按钮最后触发时间（状态即为触发时间）
-    button_entity["state"] = datetime.datetime.now().isoformat()
+    button_entity["state"] = service_now()
 
     # 根据按钮类型执行不同操作
-    if entity_id == "button.philips_cn_1061200910_lite_toggle_a_2_1":
+    function = _desk_lamp_function(entity_id)
+    if function == "toggle_a_2_1":
         # 开关状态切换按钮：调用light的toggle服务
         fake_execute_domain_service_by_entity_id(
             domain="light",
             service="toggle",
-            body=json.dumps({"entity_id": light_entity_id})
+            body={"entity_id": light_entity_id}
         )
 
-    elif entity_id == "button.philips_cn_1061200910_lite_brightness_down_a_3_1":
+    elif function == "brightness_down_a_3_1":
         # 亮度降低按钮：每次递减25（最低0）
         if light_entity["state"] == "on":
             current_brightness = light_entity["attributes"].get("brightness", 0)
@@ -502,20 +581,20 @@ def _button_desk_lamp(body: Dict):
             fake_execute_domain_service_by_entity_id(
                 domain="light",
                 service="turn_on",
-                body=json.dumps({
+                body={
                     "entity_id": light_entity_id,
                     "brightness": new_brightness
-                })
+                }
             )
             # 若亮度降至0，同步关闭灯光
             if new_brightness == 0:
                 fake_execute_domain_service_by_entity_id(
                     domain="light",
                     service="turn_off",
-                    body=json.dumps({"entity_id": light_entity_id})
+                    body={"entity_id": light_entity_id}
                 )
 
-    elif entity_id == "button.philips_cn_1061200910_lite_brightness_up_a_3_2":
+    elif function == "brightness_up_a_3_2":
         # 亮度增加按钮：每次递增25（最高255）
         current_brightness = light_entity["attributes"].get("brightness", 0)
         new_brightness = min(255, current_brightness + 25)
@@ -524,16 +603,16 @@ def _button_desk_lamp(body: Dict):
             fake_execute_domain_service_by_entity_id(
                 domain="light",
                 service="turn_on",
-                body=json.dumps({"entity_id": light_entity_id})
+                body={"entity_id": light_entity_id}
             )
         # 调节亮度
         fake_execute_domain_service_by_entity_id(
             domain="light",
             service="turn_on",
-            body=json.dumps({
+            body={
                 "entity_id": light_entity_id,
                 "brightness": new_brightness
-            })
+            }
         )
 
     return button_entity
@@ -541,11 +620,12 @@ def _button_desk_lamp(body: Dict):
 def _button_speaker(body: Dict):
     entity_id = body["entity_id"]
     entity = fake_get_states_by_entity_id(entity_id)
-    entity["state"]=datetime.datetime.now().isoformat()
+    entity["state"]=service_now()
     friendly_name = entity["attributes"]["friendly_name"]
     if("播放音乐" in friendly_name):
         service_media_play(body)
     return entity
+@service(domain_name="button", service_name="press")
 @update_service_time
 def service_button_press(body: Dict) -> Dict:
     """处理按钮按压服务，根据不同按钮实体联动控制light实体"""
@@ -561,30 +641,9 @@ def service_button_press(body: Dict) -> Dict:
 
 
 # 媒体播放器领域服务实现
-@exception_return(response=bad_request)
-@domain(name="media_player")
-def domain_media_player(service: str, body: str) -> Union[Dict, str]:
-    """media_player域服务入口，处理小米AI音箱的媒体控制"""
-    service_map = {
-        # 音量控制类
-        "volume_set": service_volume_set,
-        "volume_up": service_volume_up,
-        "volume_down": service_volume_down,
-        "volume_mute": service_volume_mute,
-        # 播放控制类
-        "media_play": service_media_play,
-        "media_pause": service_media_pause,
-        "media_play_pause": service_media_play_pause,
-        "media_stop": service_media_stop,
-        # 曲目与列表类
-        "media_previous_track": service_media_previous,
-        "media_next_track": service_media_next,
-        # "clear_playlist": service_clear_playlist
-    }
-    body_dict = json.loads(body)
-    return service_map[service](body_dict)
 
 # 音量控制服务实现
+@service(domain_name="media_player", service_name="volume_set")
 @update_service_time
 def service_volume_set(body: Dict) -> Dict:
     """设置音量（0.0~1.0）"""
@@ -594,6 +653,7 @@ def service_volume_set(body: Dict) -> Dict:
         raise ValueError("音量必须在0.0-1.0之间")
     entity["attributes"]["volume_level"] = volume
     return entity
+@service(domain_name="media_player", service_name="volume_up")
 @update_service_time
 def service_volume_up(body: Dict) -> Dict:
     """音量步进增加（+0.1）"""
@@ -601,6 +661,7 @@ def service_volume_up(body: Dict) -> Dict:
     current = entity["attributes"]["volume_level"]
     entity["attributes"]["volume_level"] = min(1.0, current + 0.1)
     return entity
+@service(domain_name="media_player", service_name="volume_down")
 @update_service_time
 def service_volume_down(body: Dict) -> Dict:
     """音量步进减少（-0.1）"""
@@ -608,6 +669,7 @@ def service_volume_down(body: Dict) -> Dict:
     current = entity["attributes"]["volume_level"]
     entity["attributes"]["volume_level"] = max(0.0, current - 0.1)
     return entity
+@service(domain_name="media_player", service_name="volume_mute")
 @update_service_time
 def service_volume_mute(body: Dict) -> Dict:
     """静音切换"""
@@ -616,6 +678,7 @@ def service_volume_mute(body: Dict) -> Dict:
     return entity
 
 # 播放控制服务实现
+@service(domain_name="media_player", service_name="media_play")
 @update_service_time
 def service_media_play(body: Dict) -> Dict:
     """开始播放"""
@@ -623,6 +686,7 @@ def service_media_play(body: Dict) -> Dict:
     if entity["state"] != "playing":
         entity["state"] = "playing"
     return entity
+@service(domain_name="media_player", service_name="media_pause")
 @update_service_time
 def service_media_pause(body: Dict) -> Dict:
     """暂停播放"""
@@ -630,6 +694,7 @@ def service_media_pause(body: Dict) -> Dict:
     if entity["state"] == "playing":
         entity["state"] = "paused"
     return entity
+@service(domain_name="media_player", service_name="media_play_pause")
 @update_service_time
 def service_media_play_pause(body: Dict) -> Dict:
     """切换播放/暂停状态"""
@@ -639,6 +704,7 @@ def service_media_play_pause(body: Dict) -> Dict:
     elif entity["state"] in ["paused", "idle"]:
         entity["state"] = "playing"
     return entity
+@service(domain_name="media_player", service_name="media_stop")
 @update_service_time
 def service_media_stop(body: Dict) -> Dict:
     """停止播放"""
@@ -647,11 +713,13 @@ def service_media_stop(body: Dict) -> Dict:
     return entity
 
 # 曲目与列表服务实现
+@service(domain_name="media_player", service_name="media_previous_track")
 @update_service_time
 def service_media_previous(body: Dict) -> Dict:
     """上一曲"""
     entity = fake_get_states_by_entity_id(body["entity_id"])
     return entity
+@service(domain_name="media_player", service_name="media_next_track")
 @update_service_time
 def service_media_next(body: Dict) -> Dict:
     """下一曲"""
@@ -659,15 +727,7 @@ def service_media_next(body: Dict) -> Dict:
     return entity
 
 
-@exception_return(response=bad_request)
-@domain(name="notify")
-def domain_notify(service: str, body: str) -> Union[Dict, str]:
-    """notify域服务入口，处理小米AI音箱的智能交互型通知"""
-    service_map = {
-        "send_message": service_notify_send_message  # 仅支持send_message服务
-    }
-    body_dict = json.loads(body)
-    return service_map[service](body_dict)
+@service(domain_name="notify", service_name="send_message")
 @update_service_time
 def service_notify_send_message(body: Dict) -> Dict:
     """
@@ -678,7 +738,7 @@ def service_notify_send_message(body: Dict) -> Dict:
     friendly_name = entity["attributes"]["friendly_name"]
 
     # 更新最后触发时间（状态字段）
-    entity["state"] = datetime.datetime.now().isoformat()
+    entity["state"] = service_now()
 
     return entity
 
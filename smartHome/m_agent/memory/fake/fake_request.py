@@ -1,25 +1,306 @@
+import contextvars
 import json
 import os
-from typing import Union, Dict, List
+import pickle
+import threading
+from contextlib import contextmanager
+from typing import Any, Union, Dict, List, Iterable, Optional
 
+from smartHome.m_agent.memory.fake.state_event_bus import note_access
+from smartHome.m_agent.memory.records import EntityRecord
+from smartHome.m_agent.memory.registry_loader import REGISTRYLOADER, DATA_DIR
 
 
-# 获取当前 Python 文件所在目录的绝对路径
-current_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(current_dir)
-
 # 拼接 entities.json 和 services.json 的绝对路径
-entities_path = os.path.join(parent_dir, "copied_data","entities.json")
-services_path = os.path.join(parent_dir, "copied_data","domains_services.json")
+entities_path = os.path.join(DATA_DIR, "entities.json")
+services_path = os.path.join(DATA_DIR, "domains_services.json")
 
 class homeassitant_data():
-    def __init__(self):
-        # 读取 JSON 文件
-        self.entities = json.load(open(entities_path, "r", encoding="utf-8"))
-        self.services = json.load(open(services_path, "r", encoding="utf-8"))
+    def __init__(self, name: str = "default", data_dir: Optional[str] = None):
+        """
+        :param name: 家庭名，多个模拟家庭并行时用于区分（也会带在state_changed事件中）
+        :param data_dir: 实体和服务数据所在目录，默认为DATA_DIR（可指向合成家庭生成的目录）
+        """
+        self.name = name
+        # entity_id -> 实体锁；多实体联动的服务按entity_id排序依次加锁，避免死锁
+        self._entity_locks: Dict[str, threading.RLock] = {}
+        self._entity_locks_guard = threading.Lock()
+        # 读取 JSON 文件（与DEVICEINFO共用注册表加载器，每次得到独立副本）
+        self.data_dir = data_dir or DATA_DIR
+        self.entities = REGISTRYLOADER.load(os.path.join(data_dir, "entities.json") if data_dir else entities_path)
+        self.services = REGISTRYLOADER.load(os.path.join(data_dir, "domains_services.json") if data_dir else services_path)
+        self._records = None
+        self._records_source = None
+        # 初始状态只解析一次，之后重置时只恢复被修改过的实体
+        self._capture_pristine()
+
+    @property
+    def entities(self) -> List[Dict]:
+        return self._entities
+
+    @entities.setter
+    def entities(self, entities: List[Dict]):
+        """整体替换实体列表（init_entities、恢复快照等）时重建entity_id索引"""
+        self._entities = entities
+        self._rebuild_entity_index()
+        # 列表被整体替换，重置时需要按初始状态重建整个列表
+        self._structure_dirty = True
+
+    @property
+    def services(self) -> List[Dict]:
+        return self._services
+
+    @services.setter
+    def services(self, services: List[Dict]):
+        self._services = services
+        # domain -> 服务
+        self._domain_index = {service["domain"]: service for service in services}
+
+    def _rebuild_entity_index(self):
+        # entity_id -> 实体字典（与列表中的是同一个对象，服务调用原地修改实体后索引仍然有效）
+        self._entity_index = {entity.get("entity_id"): entity for entity in self._entities}
+
     def init_entities(self):
-        self.entities = json.load(open(entities_path, "r", encoding="utf-8"))
-HOMEASSITANT_DATA=homeassitant_data()
+        """恢复到entities.json的初始状态（不再重新解析文件）"""
+        self.reset()
+
+    # ---------------------- 状态重置与检查点 ----------------------
+    def _capture_pristine(self):
+        """记录初始状态：entity_id -> 实体的pickle字节"""
+        self._pristine = {
+            entity["entity_id"]: pickle.dumps(entity, protocol=pickle.HIGHEST_PROTOCOL) for entity in self._entities
+        }
+        # 自上次重置以来可能被修改的实体
+        self._dirty = set()
+        self._all_dirty = False
+        self._structure_dirty = False
+        # 检查点名 -> {"overlay": {entity_id: 字节}} 或 {"entities": 整个列表的字节}
+        self._checkpoints = {}
+
+    def mark_dirty(self, entity_id: str):
+        self._dirty.add(entity_id)
+
+    def mark_all_dirty(self):
+        """实体列表整体交给了调用方（如fake_get_all_entities），无法跟踪具体修改了哪些实体"""
+        self._all_dirty = True
+
+    def _restore_entity(self, entity_id: str, payload: bytes):
+        """原地恢复实体（保持字典对象不变，索引和紧凑记录中的引用仍然有效）"""
+        entity = self._entity_index.get(entity_id)
+        if entity is None:
+            return
+        entity.clear()
+        entity.update(pickle.loads(payload))
+
+    def reset(self, checkpoint_name: str = None):
+        """
+        重置实体状态：只把自上次重置以来被修改的实体恢复为初始状态，代价与修改的实体数成正比
+        :param checkpoint_name: 可选，恢复初始状态后再应用该检查点
+        """
+        if self._structure_dirty:
+            # 实体被增删或整个列表被替换，按初始状态重建
+            self._entities = [pickle.loads(payload) for payload in self._pristine.values()]
+            self._rebuild_entity_index()
+        else:
+            dirty = self._pristine.keys() if self._all_dirty else self._dirty
+            for entity_id in dirty:
+                self._restore_entity(entity_id, self._pristine[entity_id])
+        self._dirty = set()
+        self._all_dirty = False
+        self._structure_dirty = False
+
+        if checkpoint_name is None:
+            return
+        checkpoint = self._checkpoints[checkpoint_name]
+        if "entities" in checkpoint:
+            self.entities = pickle.loads(checkpoint["entities"])
+            return
+        for entity_id, payload in checkpoint["overlay"].items():
+            self._restore_entity(entity_id, payload)
+            self._dirty.add(entity_id)
+
+    def _overlay(self) -> Union[Dict[str, bytes], None]:
+        """与初始状态不同的实体：entity_id -> 实体的pickle字节；实体被增删过时返回None"""
+        if self._structure_dirty:
+            return None
+        dirty = self._pristine.keys() if self._all_dirty else self._dirty
+        overlay = {}
+        for entity_id in dirty:
+            payload = pickle.dumps(self._entity_index[entity_id], protocol=pickle.HIGHEST_PROTOCOL)
+            if payload != self._pristine[entity_id]:
+                overlay[entity_id] = payload
+        return overlay
+
+    def checkpoint(self, name: str):
+        """
+        保存当前状态为命名检查点，之后reset(name)可从该状态开始；
+        只保存与初始状态不同的实体，实体被增删过时保存整个列表
+        """
+        overlay = self._overlay()
+        if overlay is None:
+            self._checkpoints[name] = {
+                "entities": pickle.dumps(self._entities, protocol=pickle.HIGHEST_PROTOCOL)
+            }
+            return
+        self._checkpoints[name] = {"overlay": overlay}
+
+    def export_state(self) -> Dict[str, Any]:
+        """
+        导出当前状态（可JSON序列化，如保存到记忆快照）：
+        {"overlay": {entity_id: 实体}}只含与初始状态不同的实体；实体被增删过时为{"entities": 整个列表}
+        """
+        overlay = self._overlay()
+        if overlay is None:
+            return {"entities": self._entities}
+        return {"overlay": {entity_id: pickle.loads(payload) for entity_id, payload in overlay.items()}}
+
+    def import_state(self, state: Dict[str, Any]):
+        """
+        恢复export_state()导出的状态：先增量重置，再原地覆盖有差异的实体，
+        不整体替换实体列表，之后的reset()仍然只恢复被修改过的实体
+        """
+        self.reset()
+        if "entities" in state:
+            self.entities = state["entities"]
+            return
+        for entity_id, entity in state["overlay"].items():
+            target = self._entity_index.get(entity_id)
+            if target is None:
+                continue
+            # 原地覆盖（保持字典对象不变，索引和紧凑记录中的引用仍然有效）
+            target.clear()
+            target.update(entity)
+            self._dirty.add(entity_id)
+
+    def delete_checkpoint(self, name: str):
+        self._checkpoints.pop(name, None)
+
+    def list_checkpoints(self) -> List[str]:
+        return list(self._checkpoints)
+
+    def get_entity(self, entity_id: str) -> Union[Dict, None]:
+        """按entity_id查找实体，O(1)"""
+        entity = self._entity_index.get(entity_id)
+        if entity is None and len(self._entity_index) != len(self._entities):
+            # 有调用方直接往entities列表里追加/删除了实体，重建索引后再查
+            self._rebuild_entity_index()
+            entity = self._entity_index.get(entity_id)
+        if entity is not None:
+            # 返回的是可修改的原始字典，保守地视为已修改
+            self._dirty.add(entity_id)
+            # 服务执行期间记录修改前的状态，用于发布state_changed事件
+            note_access(entity_id, entity, self.name)
+        return entity
+
+    def get_service(self, domain: str) -> Union[Dict, None]:
+        """按domain查找服务，O(1)"""
+        return self._domain_index.get(domain)
+
+    def add_entity(self, entity: Dict):
+        """新增实体（已存在同名实体时替换）"""
+        existing = self.get_entity(entity["entity_id"])
+        if existing is not None:
+            self._entities[self._entities.index(existing)] = entity
+        else:
+            self._entities.append(entity)
+        self._entity_index[entity["entity_id"]] = entity
+        self._structure_dirty = True
+
+    def remove_entity(self, entity_id: str):
+        """删除实体"""
+        entity = self._entity_index.pop(entity_id, None)
+        if entity is not None:
+            self._entities.remove(entity)
+            self._structure_dirty = True
+
+    # ---------------------- 并发控制 ----------------------
+    def _entity_lock(self, entity_id: str) -> threading.RLock:
+        lock = self._entity_locks.get(entity_id)
+        if lock is None:
+            with self._entity_locks_guard:
+                lock = self._entity_locks.setdefault(entity_id, threading.RLock())
+        return lock
+
+    @contextmanager
+    def lock_entities(self, entity_ids: Iterable[str]):
+        """
+        按entity_id排序依次获取实体锁（可重入），在此范围内对这些实体的读改写是原子的。
+        所有调用方都按同一顺序加锁，多实体联动（如按钮联动台灯）之间不会死锁
+        """
+        locks = [self._entity_lock(entity_id) for entity_id in sorted(set(entity_ids))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def snapshot(self, entity_ids: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        一致性读取：持有相关实体的锁复制实体状态，返回的副本不会被并发的服务调用修改
+        :param entity_ids: 要读取的实体，默认全部实体
+        """
+        if entity_ids is None:
+            entity_ids = list(self._entity_index)
+        entity_ids = [entity_id for entity_id in entity_ids if entity_id in self._entity_index]
+        with self.lock_entities(entity_ids):
+            return pickle.loads(pickle.dumps(
+                [self._entity_index[entity_id] for entity_id in entity_ids], protocol=pickle.HIGHEST_PROTOCOL
+            ))
+
+    def entity_records(self) -> List[EntityRecord]:
+        """
+        实体的紧凑记录列表（entity_id/domain/friendly_name + 原始字典引用）；
+        state等字段从原始字典实时读取，服务调用修改后无需重建。entities整体被替换时自动重建
+        """
+        if self._records is None or self._records_source is not self.entities \
+                or len(self._records) != len(self.entities):
+            self._records = [EntityRecord.from_state(entity) for entity in self.entities]
+            self._records_source = self.entities
+        return self._records
+
+
+# 当前上下文使用的模拟家庭；None表示使用默认家庭
+_CURRENT_HOME: contextvars.ContextVar = contextvars.ContextVar("current_home", default=None)
+DEFAULT_HOME = homeassitant_data()
+
+
+def current_home() -> homeassitant_data:
+    return _CURRENT_HOME.get() or DEFAULT_HOME
+
+
+@contextmanager
+def use_home(home: homeassitant_data):
+    """
+    在此范围内（当前线程/协程）所有模拟HA的读写都作用于home，多个模拟家庭可在同一进程中并行运行。
+    注意：线程池中的任务不会继承调用方的上下文，需要在任务内部使用use_home
+    """
+    token = _CURRENT_HOME.set(home)
+    try:
+        yield home
+    finally:
+        _CURRENT_HOME.reset(token)
+
+
+def new_home(name: str, data_dir: Optional[str] = None) -> homeassitant_data:
+    """创建一个状态独立的模拟家庭（初始状态与data_dir下的entities.json一致）"""
+    return homeassitant_data(name, data_dir)
+
+
+class CurrentHomeProxy():
+    """
+    HOMEASSITANT_DATA的代理：属性读写都转发给当前上下文的家庭（默认家庭或use_home指定的家庭），
+    原有直接使用HOMEASSITANT_DATA的代码无需修改即可在多家庭下工作
+    """
+    def __getattr__(self, name):
+        return getattr(current_home(), name)
+
+    def __setattr__(self, name, value):
+        setattr(current_home(), name, value)
+
+
+HOMEASSITANT_DATA = CurrentHomeProxy()
 
 def fake_get_services_by_domain(domain:str):
     """
@@ -27,18 +308,34 @@ def fake_get_services_by_domain(domain:str):
     :param domain:
     :return:
     """
-    for service in HOMEASSITANT_DATA.services:
-        if domain == service["domain"]:
-            return service
-    return None
+    return HOMEASSITANT_DATA.get_service(domain)
 
 def fake_get_all_entities():
     """
     获取所有实体
     :return:
     """
+    HOMEASSITANT_DATA.mark_all_dirty()
     return HOMEASSITANT_DATA.entities
 
+def fake_get_all_entities_snapshot():
+    """
+    获取所有实体的一致性副本（只读场景使用：并发时不会读到修改了一半的实体，也不会把实体标记为已修改）
+    :return:
+    """
+    return HOMEASSITANT_DATA.snapshot()
+
+def fake_get_state_snapshot(entity_id):
+    """
+    获取实体当前状态的副本（只读场景使用）
+    :param entity_id:
+    :return:
+    """
+    if isinstance(entity_id, dict):
+        entity_id = entity_id["entity_id"]
+    states = HOMEASSITANT_DATA.snapshot([entity_id])
+    return states[0] if states else None
+
 def fake_get_states_by_entity_id(entity_id):
     """
     获取实体当前的json数据
@@ -48,8 +345,5 @@ def fake_get_states_by_entity_id(entity_id):
     # 判断entity_id是否为字典
     if isinstance(entity_id, dict):
         entity_id = entity_id["entity_id"]
-    for entity in HOMEASSITANT_DATA.entities:
-        if entity.get("entity_id") == entity_id:  # 使用get避免KeyError
-            return entity
-    return None
+    return HOMEASSITANT_DATA.get_entity(entity_id)
 
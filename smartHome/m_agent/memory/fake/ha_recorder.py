@@ -0,0 +1,151 @@
+import inspect
+import json
+import threading
+import time
+from collections import deque
+from functools import wraps
+from typing import Any, Callable, Deque, Dict, Optional
+
+from smartHome.m_agent.common.global_config import GLOBALCONFIG
+
+
+class ReplayMiss(LookupError):
+    """回放日志中没有对应请求的记录"""
+
+
+def request_key(tool_name: str, args: Dict[str, Any]) -> str:
+    """请求的回放键：工具名 + 参数（JSON字符串参数先解析，键排序，与空白和键顺序无关）"""
+    normalized = {}
+    for name, value in args.items():
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        normalized[name] = value
+    return tool_name + " " + json.dumps(normalized, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class HARecorder():
+    """
+    Home Assistant交互的录制与回放。
+    - 录制：每次工具调用的请求/响应和耗时追加写入JSONL，每行一条：
+      {"tool": 工具名, "key": 回放键, "args": 参数, "response": 响应, "elapsed": 秒}
+    - 回放：按回放键返回录制的响应，同一请求多次出现时按录制顺序依次返回（最后一条重复使用），
+      并按原始耗时 × latency_scale 等待，使agent在完全相同的设备行为下比较性能
+    由GLOBALCONFIG.ha_record_path / ha_replay_path / ha_replay_latency_scale控制，也可直接调用start_*方法
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._record_file = None
+        self.record_path: Optional[str] = None
+        self.replay_path: Optional[str] = None
+        self.latency_scale = 1.0
+        self._replay_entries: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._configured = False
+
+    def _ensure_configured(self):
+        """第一次调用时按GLOBALCONFIG的开关启动录制/回放"""
+        if self._configured:
+            return
+        self._configured = True
+        if GLOBALCONFIG.ha_replay_path:
+            self.start_replay(GLOBALCONFIG.ha_replay_path, GLOBALCONFIG.ha_replay_latency_scale)
+        elif GLOBALCONFIG.ha_record_path:
+            self.start_recording(GLOBALCONFIG.ha_record_path)
+
+    # ---------------------- 录制 ----------------------
+    def start_recording(self, path: str):
+        """开始录制（追加写入path）"""
+        with self._lock:
+            self._configured = True
+            self._close_record_file()
+            self.record_path = path
+            self._record_file = open(path, "a", encoding="utf-8")
+        print(f"开始录制HA交互：{path}")
+
+    def stop_recording(self):
+        with self._lock:
+            self._close_record_file()
+            self.record_path = None
+
+    def _close_record_file(self):
+        if self._record_file is not None:
+            self._record_file.close()
+            self._record_file = None
+
+    def record(self, tool_name: str, args: Dict[str, Any], response: Any, elapsed: float):
+        line = json.dumps({
+            "tool": tool_name,
+            "key": request_key(tool_name, args),
+            "args": args,
+            "response": response,
+            "elapsed": round(elapsed, 6),
+        }, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._record_file is not None:
+                self._record_file.write(line + "\n")
+                self._record_file.flush()
+
+    # ---------------------- 回放 ----------------------
+    def start_replay(self, path: str, latency_scale: float = 1.0):
+        """
+        从录制日志回放
+        :param latency_scale: 回放耗时 = 录制耗时 × latency_scale；0表示不等待
+        """
+        entries: Dict[str, Deque[Dict[str, Any]]] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries.setdefault(entry["key"], deque()).append(entry)
+        with self._lock:
+            self._configured = True
+            self.replay_path = path
+            self.latency_scale = latency_scale
+            self._replay_entries = entries
+        print(f"回放HA交互：{path}（{sum(len(v) for v in entries.values())}条，耗时×{latency_scale}）")
+
+    def stop_replay(self):
+        with self._lock:
+            self.replay_path = None
+            self._replay_entries = {}
+
+    def replay(self, tool_name: str, args: Dict[str, Any]) -> Any:
+        key = request_key(tool_name, args)
+        with self._lock:
+            entries = self._replay_entries.get(key)
+            if not entries:
+                raise ReplayMiss(key)
+            entry = entries.popleft() if len(entries) > 1 else entries[0]
+        if self.latency_scale > 0:
+            time.sleep(entry["elapsed"] * self.latency_scale)
+        return entry["response"]
+
+    # ---------------------- 调用入口 ----------------------
+    def call(self, tool_name: str, args: Dict[str, Any], func: Callable[[], Any]) -> Any:
+        """回放模式下返回录制的响应；否则执行func，录制模式下记录请求/响应和耗时"""
+        self._ensure_configured()
+        if self.replay_path is not None:
+            return self.replay(tool_name, args)
+        start = time.perf_counter()
+        response = func()
+        if self.record_path is not None:
+            self.record(tool_name, args, response, time.perf_counter() - start)
+        return response
+
+
+HARECORDER = HARecorder()
+
+
+def recorded(func):
+    """装饰器：工具函数的调用经过HARECORDER录制/回放（放在@tool之下，保留原函数签名和文档）"""
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return HARECORDER.call(func.__name__, dict(bound.arguments), lambda: func(*args, **kwargs))
+
+    return wrapper
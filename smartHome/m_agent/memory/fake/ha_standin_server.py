@@ -0,0 +1,388 @@
+import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import os
+import struct
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from smartHome.m_agent.memory.fake.fake_do_service import fake_execute_domain_service_by_entity_id, bad_request
+from smartHome.m_agent.memory.fake.fake_request import DEFAULT_HOME, homeassitant_data, use_home
+from smartHome.m_agent.memory.fake.state_event_bus import STATEEVENTBUS, StateChangedEvent
+from smartHome.m_agent.memory.registry_loader import REGISTRYLOADER
+
+
+# websocket握手用的固定GUID（RFC 6455）
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_HA_VERSION = "2025.10.0"
+_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+            405: "Method Not Allowed", 500: "Internal Server Error"}
+# 响应体超过该大小且客户端支持时使用gzip
+_GZIP_MIN_SIZE = 1024
+
+
+class HAStandinServer():
+    """
+    本地的Home Assistant替身服务器（asyncio实现，仅依赖标准库），数据来自一个模拟家庭（默认为DEFAULT_HOME）：
+    - REST：GET /api/、/api/states、/api/states/<entity_id>、/api/services，
+      POST /api/services/<domain>/<service>（调用fake_execute_domain_service_by_entity_id），
+      GET /api/config/device_registry/list、/api/config/entity_registry/list（供注册表同步使用）
+    - WebSocket：/api/websocket，支持HA的认证流程、subscribe_events、get_states、call_service、ping
+    - HTTP/1.1 keep-alive；可配置每个请求的额外延迟和同时处理的请求数上限，用于离线压测真实API路径
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 8123, token: Optional[str] = None,
+                 latency: float = 0.0, max_concurrency: Optional[int] = None,
+                 home: Optional[homeassitant_data] = None):
+        """
+        :param token: 需要校验的访问令牌；None表示接受任意令牌
+        :param latency: 每个请求额外等待的秒数（模拟网络和HA处理耗时）
+        :param max_concurrency: 同时处理的请求数上限；None表示不限制
+        :param home: 服务器对外提供的模拟家庭；多个服务器可以各自服务不同的家庭
+        """
+        self.host = host
+        self.port = port
+        self.token = token
+        self.latency = latency
+        self.max_concurrency = max_concurrency
+        self.home = home or DEFAULT_HOME
+        # 注册表可由测试直接修改，模拟设备/实体的增删
+        self.devices: List[Dict[str, Any]] = REGISTRYLOADER.load(
+            os.path.join(self.home.data_dir, "device_registry.json"))["data"]["devices"]
+        self.entity_registry: List[Dict[str, Any]] = REGISTRYLOADER.load(
+            os.path.join(self.home.data_dir, "entity_registry.json"))["data"]["entities"]
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._thread: Optional[threading.Thread] = None
+        # 订阅了事件的websocket连接：writer -> {订阅id: event_type（None表示全部事件）}
+        self._subscribers: Dict[asyncio.StreamWriter, Dict[int, Optional[str]]] = {}
+        self._writers = set()
+        self._bus_subscription: Optional[int] = None
+        self.request_count = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # ---------------------- 启动/停止 ----------------------
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # port=0时使用系统分配的端口
+        self.port = self._server.sockets[0].getsockname()[1]
+        # 模拟HA中的任何状态变化（包括不经过本服务器的服务调用）都推送给websocket订阅者
+        self._bus_subscription = STATEEVENTBUS.subscribe(self._on_state_changed)
+        print(f"HA替身服务器已启动：{self.base_url}")
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self) -> "HAStandinServer":
+        """在后台线程中运行服务器，监听就绪后返回（用于测试/压测脚本）"""
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+            loop.run_until_complete(self._shutdown())
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name="ha_standin_server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    async def _shutdown(self):
+        STATEEVENTBUS.unsubscribe(self._bus_subscription)
+        self._server.close()
+        # 关闭仍然打开的连接（keep-alive连接会一直等待下一个请求），连接处理协程读到EOF后自行退出
+        for writer in list(self._writers):
+            writer.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def stop(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._loop = None
+
+    # ---------------------- HTTP ----------------------
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            # keep-alive：同一连接上循环处理请求，直到客户端关闭或要求close
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+                method, target, version = request_line.split(" ", 2)
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = b""
+                if int(headers.get("content-length", 0)):
+                    body = await reader.readexactly(int(headers["content-length"]))
+
+                path = unquote(urlsplit(target).path)
+                if path == "/api/websocket" and headers.get("upgrade", "").lower() == "websocket":
+                    await self._handle_websocket(reader, writer, headers)
+                    return
+
+                status, payload = await self._dispatch_with_limits(method, path, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                await self._write_response(writer, status, payload, headers, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _dispatch_with_limits(self, method: str, path: str, headers: Dict[str, str],
+                                    body: bytes) -> Tuple[int, Any]:
+        if self._semaphore is not None:
+            async with self._semaphore:
+                return await self._dispatch(method, path, headers, body)
+        return await self._dispatch(method, path, headers, body)
+
+    def _authorized(self, token: Optional[str]) -> bool:
+        return self.token is None or token == self.token
+
+    async def _dispatch(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Any]:
+        self.request_count += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        authorization = headers.get("authorization", "")
+        if not self._authorized(authorization[len("Bearer "):] if authorization.startswith("Bearer ") else None):
+            return 401, {"message": "401: Unauthorized"}
+
+        if method == "GET":
+            if path == "/api/":
+                return 200, {"message": "API running."}
+            if path == "/api/states":
+                return 200, await asyncio.to_thread(self.home.snapshot)
+            if path.startswith("/api/states/"):
+                states = await asyncio.to_thread(self.home.snapshot, [path[len("/api/states/"):]])
+                if not states:
+                    return 404, {"message": "Entity not found."}
+                return 200, states[0]
+            if path == "/api/services":
+                return 200, self.home.services
+            if path == "/api/config/device_registry/list":
+                return 200, self.devices
+            if path == "/api/config/entity_registry/list":
+                return 200, self.entity_registry
+            return 404, {"message": "Not Found"}
+
+        if method == "POST" and path.startswith("/api/services/"):
+            parts = path[len("/api/services/"):].split("/")
+            if len(parts) != 2:
+                return 404, {"message": "Not Found"}
+            changed = await asyncio.to_thread(self.call_service, parts[0], parts[1], body.decode("utf-8") or "{}")
+            if changed is None:
+                return 400, {"message": bad_request}
+            return 200, changed
+        return 405, {"message": "Method Not Allowed"}
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: int, payload: Any,
+                              request_headers: Dict[str, str], keep_alive: bool):
+        content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        response_headers = ["Content-Type: application/json; charset=utf-8"]
+        if len(content) >= _GZIP_MIN_SIZE and "gzip" in request_headers.get("accept-encoding", ""):
+            content = gzip.compress(content, compresslevel=5)
+            response_headers.append("Content-Encoding: gzip")
+        response_headers.append(f"Content-Length: {len(content)}")
+        response_headers.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n" + "\r\n".join(response_headers) + "\r\n\r\n"
+        writer.write(head.encode("latin-1") + content)
+        await writer.drain()
+
+    # ---------------------- 服务调用 ----------------------
+    def call_service(self, domain: str, service: str, body: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        调用模拟HA的服务（state_changed事件由STATEEVENTBUS发布后转发给订阅者）。
+        服务执行（以及snapshot读取）会等待实体锁，请求处理中通过asyncio.to_thread在线程池中调用，不阻塞事件循环
+        :return: 状态发生变化的实体列表（与HA一致）；服务调用失败返回None
+        """
+        with use_home(self.home):
+            result = fake_execute_domain_service_by_entity_id(domain, service, body)
+        if result == bad_request or result is None:
+            return None
+        return result if isinstance(result, list) else [result]
+
+    def _on_state_changed(self, event: StateChangedEvent):
+        if event.home_name != self.home.name:
+            return
+        self._publish_event("state_changed", event.to_ha_event())
+
+    # ---------------------- WebSocket ----------------------
+    async def _handle_websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                                headers: Dict[str, str]):
+        accept = base64.b64encode(
+            hashlib.sha1((headers.get("sec-websocket-key", "") + _WS_GUID).encode("ascii")).digest()
+        ).decode("ascii")
+        writer.write((
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode("latin-1"))
+        await self._ws_send(writer, {"type": "auth_required", "ha_version": _HA_VERSION})
+
+        authenticated = False
+        try:
+            while True:
+                message = await self._ws_receive(reader, writer)
+                if message is None:
+                    return
+                if not authenticated:
+                    if message.get("type") == "auth" and self._authorized(message.get("access_token")):
+                        authenticated = True
+                        await self._ws_send(writer, {"type": "auth_ok", "ha_version": _HA_VERSION})
+                    else:
+                        await self._ws_send(writer, {"type": "auth_invalid", "message": "Invalid access token"})
+                        return
+                    continue
+                await self._handle_ws_command(writer, message)
+        finally:
+            self._subscribers.pop(writer, None)
+
+    async def _handle_ws_command(self, writer: asyncio.StreamWriter, message: Dict[str, Any]):
+        message_id = message.get("id")
+        command = message.get("type")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if command == "ping":
+            await self._ws_send(writer, {"id": message_id, "type": "pong"})
+            return
+        if command == "subscribe_events":
+            self._subscribers.setdefault(writer, {})[message_id] = message.get("event_type")
+            await self._ws_result(writer, message_id, None)
+            return
+        if command == "unsubscribe_events":
+            found = self._subscribers.get(writer, {}).pop(message.get("subscription"), "missing") != "missing"
+            await self._ws_result(writer, message_id, None, success=found)
+            return
+        if command == "get_states":
+            await self._ws_result(writer, message_id, await asyncio.to_thread(self.home.snapshot))
+            return
+        if command == "get_services":
+            services = {service["domain"]: service["services"] for service in self.home.services}
+            await self._ws_result(writer, message_id, services)
+            return
+        if command == "config/device_registry/list":
+            await self._ws_result(writer, message_id, self.devices)
+            return
+        if command == "config/entity_registry/list":
+            await self._ws_result(writer, message_id, self.entity_registry)
+            return
+        if command == "call_service":
+            body = dict(message.get("service_data") or {})
+            target = message.get("target") or {}
+            if "entity_id" in target:
+                body["entity_id"] = target["entity_id"]
+            changed = await asyncio.to_thread(self.call_service, message.get("domain"), message.get("service"),
+                                              json.dumps(body))
+            await self._ws_result(writer, message_id, {"context": {}, "response": None} if changed else None,
+                                  success=changed is not None)
+            return
+        await self._ws_result(writer, message_id, None, success=False)
+
+    async def _ws_result(self, writer: asyncio.StreamWriter, message_id: int, result: Any, success: bool = True):
+        message = {"id": message_id, "type": "result", "success": success, "result": result}
+        if not success:
+            message["error"] = {"code": "unknown_error", "message": "Command failed"}
+        await self._ws_send(writer, message)
+
+    def _publish_event(self, event_type: str, data: Dict[str, Any]):
+        """向订阅了该事件的websocket连接推送事件（可在任意线程调用）"""
+        if self._loop is None:
+            return
+        for writer, subscriptions in list(self._subscribers.items()):
+            for subscription_id, subscribed_type in list(subscriptions.items()):
+                if subscribed_type is None or subscribed_type == event_type:
+                    asyncio.run_coroutine_threadsafe(self._ws_send(writer, {
+                        "id": subscription_id, "type": "event",
+                        "event": {"event_type": event_type, "data": data, "origin": "LOCAL"}
+                    }), self._loop)
+
+    @staticmethod
+    async def _ws_send(writer: asyncio.StreamWriter, message: Dict[str, Any]):
+        payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x81, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x81, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x81, 127, length)
+        writer.write(header + payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    @staticmethod
+    async def _ws_receive(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[Dict[str, Any]]:
+        """读取一条完整的文本消息；连接关闭时返回None"""
+        fragments = []
+        while True:
+            try:
+                first, second = await reader.readexactly(2)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return None
+            fin, opcode = first & 0x80, first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", await reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", await reader.readexactly(8))[0]
+            mask = await reader.readexactly(4) if second & 0x80 else b""
+            data = await reader.readexactly(length)
+            if mask:
+                data = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+            if opcode == 0x8:
+                writer.write(struct.pack("!BB", 0x88, 0))
+                return None
+            if opcode == 0x9:
+                writer.write(struct.pack("!BB", 0x8A, len(data)) + data)
+                continue
+            if opcode in (0x0, 0x1):
+                fragments.append(data)
+                if fin:
+                    return json.loads(b"".join(fragments).decode("utf-8"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地HA替身服务器：以模拟HA的数据提供REST/WebSocket接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--token", default=None, help="需要校验的访问令牌，默认接受任意令牌")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求额外等待的秒数")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="同时处理的请求数上限")
+    args = parser.parse_args(argv)
+    server = HAStandinServer(host=args.host, port=args.port, token=args.token, latency=args.latency,
+                             max_concurrency=args.max_concurrency)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import datetime
+import heapq
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Union
+
+
+@dataclass(order=True)
+class ScheduledEvent:
+    """在模拟时间when触发的事件（同一时间按加入顺序触发）"""
+    when: datetime.datetime
+    sequence: int
+    callback: Callable[[], Any] = field(compare=False)
+    name: str = field(default="", compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+class SimClock():
+    """
+    模拟器的时钟：所有模拟HA的时间戳（服务执行时间、按钮触发时间、state_changed事件时间）都从这里获取。
+    - 默认跟随系统时间（与原来的datetime.now()一致）
+    - freeze()后进入虚拟时间，只有advance()才会前进；advance()会按时间顺序触发期间到期的计划事件，
+      触发时时钟恰好停在事件的时间，因此几小时的场景时间可以在几毫秒内跑完（用于持久化监控类用例）
+    """
+    def __init__(self, start: Optional[datetime.datetime] = None):
+        self._lock = threading.RLock()
+        self._now: Optional[datetime.datetime] = start
+        self._sequence = itertools.count()
+        self._queue: List[ScheduledEvent] = []
+
+    @property
+    def is_virtual(self) -> bool:
+        return self._now is not None
+
+    def now(self) -> datetime.datetime:
+        now = self._now
+        return now if now is not None else datetime.datetime.now()
+
+    def isoformat(self) -> str:
+        return self.now().isoformat()
+
+    def freeze(self, start: Optional[datetime.datetime] = None):
+        """进入虚拟时间，从start（默认当前系统时间）开始"""
+        with self._lock:
+            self._now = start or datetime.datetime.now()
+
+    def use_real_time(self):
+        """恢复跟随系统时间，并丢弃尚未触发的计划事件"""
+        with self._lock:
+            self._now = None
+            self._queue.clear()
+
+    # ---------------------- 计划事件 ----------------------
+    def schedule_at(self, when: datetime.datetime, callback: Callable[[], Any], name: str = "") -> ScheduledEvent:
+        """在模拟时间when触发callback（需要先freeze进入虚拟时间）"""
+        with self._lock:
+            if self._now is None:
+                raise RuntimeError("计划事件需要虚拟时间，请先调用freeze()")
+            event = ScheduledEvent(when=when, sequence=next(self._sequence), callback=callback, name=name)
+            heapq.heappush(self._queue, event)
+            return event
+
+    def schedule(self, delay: float, callback: Callable[[], Any], name: str = "") -> ScheduledEvent:
+        """在delay秒（模拟时间）后触发callback"""
+        return self.schedule_at(self.now() + datetime.timedelta(seconds=delay), callback, name)
+
+    def cancel(self, event: ScheduledEvent):
+        event.cancelled = True
+
+    def pending(self) -> List[ScheduledEvent]:
+        """尚未触发的计划事件（按触发时间排序）"""
+        with self._lock:
+            return sorted(event for event in self._queue if not event.cancelled)
+
+    def schedule_state_change(self, delay: float, entity_id: str, state: Any,
+                              attributes: Optional[Dict[str, Any]] = None, home=None) -> ScheduledEvent:
+        """
+        计划一次模拟的传感器状态变化，如 schedule_state_change(600, 门磁entity_id, "on") 表示10分钟后门被打开。
+        变化作用于home（默认为计划时的当前家庭），并在STATEEVENTBUS上发布state_changed事件
+        """
+        # 延迟导入：fake_do_service依赖本模块的SIM_CLOCK
+        from smartHome.m_agent.memory.fake.fake_do_service import fake_set_state
+        from smartHome.m_agent.memory.fake.fake_request import current_home, use_home
+        home = home or current_home()
+
+        def apply():
+            with use_home(home):
+                fake_set_state(entity_id, state, attributes)
+
+        return self.schedule(delay, apply, name=f"{entity_id} -> {state}")
+
+    # ---------------------- 推进时间 ----------------------
+    def advance(self, seconds: Union[int, float, datetime.timedelta]) -> List[ScheduledEvent]:
+        """
+        把虚拟时间前进seconds秒，按顺序触发期间到期的计划事件（事件回调中新计划的到期事件同样会被触发）
+        :return: 本次触发的事件
+        """
+        if isinstance(seconds, datetime.timedelta):
+            seconds = seconds.total_seconds()
+        if seconds < 0:
+            raise ValueError("时间不能倒退")
+        with self._lock:
+            if self._now is None:
+                raise RuntimeError("advance()需要虚拟时间，请先调用freeze()")
+            target = self._now + datetime.timedelta(seconds=seconds)
+            fired = []
+            while self._queue and self._queue[0].when <= target:
+                event = heapq.heappop(self._queue)
+                if event.cancelled:
+                    continue
+                self._now = max(self._now, event.when)
+                try:
+                    event.callback()
+                except Exception as e:
+                    print(f"⚠️  计划事件{event.name}执行失败：{e}")
+                fired.append(event)
+            self._now = target
+            return fired
+
+    def advance_to(self, when: datetime.datetime) -> List[ScheduledEvent]:
+        """前进到模拟时间when"""
+        return self.advance((when - self.now()).total_seconds())
+
+
+SIM_CLOCK = SimClock()
@@ -0,0 +1,187 @@
+import asyncio
+import contextvars
+import itertools
+import pickle
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from smartHome.m_agent.memory.fake.sim_clock import SIM_CLOCK
+
+# 当前服务调用中被访问过的实体：(家庭名, entity_id) -> (访问前的副本, 实体字典)；None表示没有在捕获
+_CAPTURE: contextvars.ContextVar[Optional[Dict[Tuple[str, str], Tuple[Dict[str, Any], Dict[str, Any]]]]] = \
+    contextvars.ContextVar("state_event_capture", default=None)
+
+
+def note_access(entity_id: str, entity: Dict[str, Any], home_name: str = "default"):
+    """模拟HA查找实体时调用：捕获期间第一次访问某实体时保存其副本，作为事件的old_state"""
+    touched = _CAPTURE.get()
+    if touched is not None and (home_name, entity_id) not in touched:
+        touched[(home_name, entity_id)] = (pickle.loads(pickle.dumps(entity, protocol=pickle.HIGHEST_PROTOCOL)), entity)
+
+
+@dataclass
+class StateChangedEvent:
+    """一个实体的state_changed事件"""
+    entity_id: str
+    old_state: Dict[str, Any]
+    new_state: Dict[str, Any]
+    # 变化的属性：属性名 -> (旧值, 新值)
+    changed_attributes: Dict[str, Tuple[Any, Any]] = field(default_factory=dict)
+    time_fired: str = field(default_factory=SIM_CLOCK.isoformat)
+    # 产生事件的模拟家庭
+    home_name: str = "default"
+
+    @property
+    def domain(self) -> str:
+        return self.entity_id.split(".", 1)[0]
+
+    @property
+    def state_changed(self) -> bool:
+        """state本身是否变化（False表示只有属性变化）"""
+        return self.old_state.get("state") != self.new_state.get("state")
+
+    def to_ha_event(self) -> Dict[str, Any]:
+        """转换为HA websocket中state_changed事件的data格式"""
+        return {"entity_id": self.entity_id, "old_state": self.old_state, "new_state": self.new_state}
+
+
+@dataclass
+class _Subscription:
+    callback: Callable
+    loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class StateEventBus():
+    """
+    模拟HA的进程内事件总线：每次服务执行后，对状态或属性发生变化的实体发布state_changed事件。
+    订阅者可按entity_id或domain过滤，回调可以是普通函数（在执行服务的线程中同步调用），
+    也可以是协程函数（投递到订阅时的事件循环中执行）
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscriptions: Dict[int, _Subscription] = {}
+        # 过滤条件 -> 订阅id列表：按entity_id / domain / 全部
+        self._by_entity: Dict[str, List[int]] = {}
+        self._by_domain: Dict[str, List[int]] = {}
+        self._wildcard: List[int] = []
+        self._filters: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+
+    def subscribe(self, callback: Callable[[StateChangedEvent], Any], entity_id: Optional[str] = None,
+                  domain: Optional[str] = None, loop: Optional[asyncio.AbstractEventLoop] = None) -> int:
+        """
+        订阅state_changed事件
+        :param callback: 回调函数或协程函数，参数为StateChangedEvent
+        :param entity_id: 只接收该实体的事件
+        :param domain: 只接收该domain的事件（与entity_id同时给出时以entity_id为准）
+        :param loop: 协程回调运行的事件循环；不指定时使用当前正在运行的事件循环
+        :return: 订阅id，用于取消订阅
+        """
+        if asyncio.iscoroutinefunction(callback) and loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                raise ValueError("协程回调需要在事件循环中订阅，或指定loop参数")
+        with self._lock:
+            subscription_id = next(self._ids)
+            self._subscriptions[subscription_id] = _Subscription(callback=callback, loop=loop)
+            self._filters[subscription_id] = (entity_id, domain)
+            if entity_id is not None:
+                self._by_entity.setdefault(entity_id, []).append(subscription_id)
+            elif domain is not None:
+                self._by_domain.setdefault(domain, []).append(subscription_id)
+            else:
+                self._wildcard.append(subscription_id)
+        return subscription_id
+
+    def unsubscribe(self, subscription_id: int):
+        with self._lock:
+            if self._subscriptions.pop(subscription_id, None) is None:
+                return
+            entity_id, domain = self._filters.pop(subscription_id)
+            if entity_id is not None:
+                self._by_entity[entity_id].remove(subscription_id)
+            elif domain is not None:
+                self._by_domain[domain].remove(subscription_id)
+            else:
+                self._wildcard.remove(subscription_id)
+
+    def publish(self, event: StateChangedEvent):
+        """把事件投递给匹配的订阅者；某个订阅者出错不影响其他订阅者和服务执行"""
+        with self._lock:
+            subscription_ids = self._by_entity.get(event.entity_id, []) + \
+                self._by_domain.get(event.domain, []) + self._wildcard
+            subscriptions = [self._subscriptions[subscription_id] for subscription_id in subscription_ids]
+        for subscription in subscriptions:
+            try:
+                if subscription.loop is not None:
+                    asyncio.run_coroutine_threadsafe(subscription.callback(event), subscription.loop)
+                else:
+                    subscription.callback(event)
+            except Exception as e:
+                print(f"⚠️  state_changed订阅者处理失败：{e}")
+
+    @staticmethod
+    def diff(entity_id: str, old_state: Dict[str, Any], new_state: Dict[str, Any],
+             home_name: str = "default") -> Optional[StateChangedEvent]:
+        """比较实体的前后状态；state和属性都没有变化（只更新了时间）时返回None"""
+        old_attributes = old_state.get("attributes", {})
+        new_attributes = new_state.get("attributes", {})
+        changed_attributes = {
+            key: (old_attributes.get(key), new_attributes.get(key))
+            for key in old_attributes.keys() | new_attributes.keys()
+            if old_attributes.get(key) != new_attributes.get(key)
+        }
+        if old_state.get("state") == new_state.get("state") and not changed_attributes:
+            return None
+        return StateChangedEvent(
+            entity_id=entity_id,
+            old_state=old_state,
+            new_state=pickle.loads(pickle.dumps(new_state, protocol=pickle.HIGHEST_PROTOCOL)),
+            changed_attributes=changed_attributes,
+            home_name=home_name,
+        )
+
+    @contextmanager
+    def capture(self):
+        """
+        捕获一次服务执行：记录期间访问过的实体，结束后对发生变化的实体发布事件。
+        嵌套调用（如按钮联动台灯）只在最外层发布，联动修改的实体同样会产生事件
+        """
+        if _CAPTURE.get() is not None:
+            yield
+            return
+        touched = {}
+        token = _CAPTURE.set(touched)
+        try:
+            yield
+        finally:
+            _CAPTURE.reset(token)
+            for (home_name, entity_id), (old_state, entity) in touched.items():
+                event = self.diff(entity_id, old_state, entity, home_name)
+                if event is not None:
+                    self.publish(event)
+
+    async def wait_for(self, entity_id: str, predicate: Optional[Callable[[StateChangedEvent], bool]] = None,
+                       timeout: Optional[float] = None) -> StateChangedEvent:
+        """
+        等待某实体的下一个（满足predicate的）state_changed事件，用于动作执行后的校验，无需轮询
+        :raise asyncio.TimeoutError: 超时
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        async def on_event(event: StateChangedEvent):
+            if not future.done() and (predicate is None or predicate(event)):
+                future.set_result(event)
+
+        subscription_id = self.subscribe(on_event, entity_id=entity_id, loop=loop)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.unsubscribe(subscription_id)
+
+
+STATEEVENTBUS = StateEventBus()
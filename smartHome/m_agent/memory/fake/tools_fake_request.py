@@ -1,16 +1,18 @@
 import json
 from typing import Union, Dict, List
 
-import requests
 from langchain.tools import tool
 
 from smartHome.m_agent.common.global_config import GLOBALCONFIG
-from smartHome.m_agent.memory.fake.fake_do_service import fake_execute_domain_service_by_entity_id
-from smartHome.m_agent.memory.fake.fake_request import fake_get_services_by_domain, fake_get_all_entities, \
-    fake_get_states_by_entity_id
+from smartHome.m_agent.common.ha_client import get_ha_client
+from smartHome.m_agent.memory.fake.fake_do_service import fake_execute_domain_service_by_entity_id, fake_execute_batch
+from smartHome.m_agent.memory.fake.ha_recorder import recorded
+from smartHome.m_agent.memory.fake.fake_request import fake_get_services_by_domain, fake_get_all_entities_snapshot, \
+    fake_get_state_snapshot
 
 
 @tool
+@recorded
 def tool_get_services_by_domain(domain:str):
     """
     获取domain下的所有服务
@@ -18,19 +20,8 @@ def tool_get_services_by_domain(domain:str):
     :return:
     """
     if GLOBALCONFIG.homeassitant_api_isopen:
-        headers = {
-            "Authorization": f"Bearer {GLOBALCONFIG.homeassitant_token}",
-            "Content-Type": "application/json"
-        }
-
-        url = f"http://{GLOBALCONFIG.homeassitant_server}/api/services"
-
-        # 发送GET请求
-        response = requests.get(url, headers=headers)
-        # 检查请求是否成功
-        response.raise_for_status()
-        # 返回JSON响应内容
-        all_domain_and_services = response.json()
+        # 发送GET请求（共享连接池，失败时抛出HTTPError）
+        all_domain_and_services = get_ha_client().get_services()
         for domain_entry in all_domain_and_services:
             # 匹配目标 domain
             if domain_entry.get("domain") == domain:
@@ -40,28 +31,18 @@ def tool_get_services_by_domain(domain:str):
         return {}
     return fake_get_services_by_domain(domain)
 @tool
+@recorded
 def tool_get_all_entities():
     """
     获取所有实体
     :return:
     """
     if GLOBALCONFIG.homeassitant_api_isopen:
-        headers = {
-            "Authorization": f"Bearer {GLOBALCONFIG.homeassitant_token}",
-            "Content-Type": "application/json"
-        }
-
-        url = f"http://{GLOBALCONFIG.homeassitant_server}/api/states"
-
-        # 发送GET请求
-        response = requests.get(url, headers=headers)
-        # 检查请求是否成功
-        response.raise_for_status()
-        # 返回JSON响应内容
-        result = response.json()
-        return result
-    return fake_get_all_entities()
+        return get_ha_client().get_states()
+    # 返回副本：并发运行时不会读到其他线程修改了一半的状态
+    return fake_get_all_entities_snapshot()
 @tool
+@recorded
 def tool_get_states_by_entity_id(entity_id:str):
     """
     获取实体当前的json数据
@@ -69,23 +50,11 @@ def tool_get_states_by_entity_id(entity_id:str):
     :return:
     """
     if GLOBALCONFIG.homeassitant_api_isopen:
-        headers = {
-            "Authorization": f"Bearer {GLOBALCONFIG.homeassitant_token}",
-            "Content-Type": "application/json"
-        }
-
-        url = f"http://{GLOBALCONFIG.homeassitant_server}/api/states/{entity_id}"
-
-        # 发送GET请求
-        response = requests.get(url, headers=headers)
-        # 检查请求是否成功
-        response.raise_for_status()
-        # 返回JSON响应内容
-        result = response.json()
-        return result
-    return fake_get_states_by_entity_id(entity_id)
+        return get_ha_client().get_state(entity_id)
+    return fake_get_state_snapshot(entity_id)
 
 @tool
+@recorded
 def tool_execute_action_by_entity_id(domain:str, service:str, body:str ) -> Union[Dict, List]:
     """
     执行操作：
@@ -96,31 +65,38 @@ def tool_execute_action_by_entity_id(domain:str, service:str, body:str ) -> Unio
     Returns a list of states that have changed while the service was being executed, and optionally response data, if supported by the service.
     :param domain: entity_id的前缀即为对应的domain，比如某一entity_id为switch.cuco_cn_269067598_cp1_on_p_2_1，其domain即为switch
     :param service: 通过调用工具@get_services_by_domain获取对应domain下的所有的services，从中选择需要执行的服务
-    :param body:'Content-Type': 'application/json'。请求体至少包含'entity_id'(body中有且仅能出现一个entity_id)，如果service还需要其他的参数，请补足。通过调用工具@get_all_entity_id可以获取所有的entity_id，从中选择所需的entity_id进行操作。
+    :param body:'Content-Type': 'application/json'。请求体至少包含'entity_id'(可以是单个entity_id，也可以是同一domain下多个entity_id的列表，对列表中每个实体执行相同操作)，如果service还需要其他的参数，请补足。通过调用工具@get_all_entity_id可以获取所有的entity_id，从中选择所需的entity_id进行操作。
     :return:
     """
     if GLOBALCONFIG.homeassitant_api_isopen:
-        headers = {
-            "Authorization": f"Bearer {GLOBALCONFIG.homeassitant_token}",
-            "Content-Type": "application/json"
-        }
-
-        url = f"http://{GLOBALCONFIG.homeassitant_server}/api/services/{domain}/{service}"
-        # 设置请求体数据
-        # payload = {
-        #     "entity_id": entity_id
-        # }
-        payload = json.loads(body)
-
         # 发送POST请求
-        response = requests.post(
-            url=url,
-            json=payload,  # 自动将字典转换为JSON并设置正确的Content-Type
-            headers=headers
-        )
-        # 检查请求是否成功
-        response.raise_for_status()
-        # 返回JSON响应
-        result = response.json()
-        return result
-    return fake_execute_domain_service_by_entity_id(domain, service, body)
\ No newline at end of file
+        return get_ha_client().call_service(domain, service, json.loads(body))
+    return fake_execute_domain_service_by_entity_id(domain, service, body)
+
+@tool
+@recorded
+def tool_execute_actions_batch(actions: str) -> Union[Dict, List]:
+    """
+    批量执行操作：一次调用执行多个服务，适合「关闭所有灯」这类需要操作多个实体的任务，避免逐个调用。
+    actions为JSON数组字符串，每个元素包含domain、service、body，for example:
+        [{"domain": "light", "service": "turn_off", "body": {"entity_id": ["light.a", "light.b"]}},
+         {"domain": "switch", "service": "turn_on", "body": {"entity_id": "switch.c"}}]
+    Returns {"results": 每个操作各自的结果, "changed_states": 所有状态发生变化的实体}
+    :param actions: 操作列表的JSON字符串，body的要求与tool_execute_action_by_entity_id相同
+    :return:
+    """
+    operations = json.loads(actions)
+    if GLOBALCONFIG.homeassitant_api_isopen:
+        # HA没有批量接口，逐个调用（复用同一连接；每个调用内的entity_id列表由HA原生支持）
+        client = get_ha_client()
+        results = []
+        changed_states = {}
+        for operation in operations:
+            body = operation.get("body") or {}
+            result = client.call_service(operation["domain"], operation["service"],
+                                         json.loads(body) if isinstance(body, str) else body)
+            results.append(result)
+            for entity in result:
+                changed_states[entity["entity_id"]] = entity
+        return {"results": results, "changed_states": list(changed_states.values())}
+    return fake_execute_batch(operations)
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterator
+
+
+class InitJournal():
+    """
+    记忆初始化进度日志（JSONL，追加写入）：
+    1. 每完成一个实体/设备的事实提取，立即追加一行记录并fsync，进程崩溃也不会丢失已完成的LLM调用
+    2. 重新执行初始化时，从日志恢复已完成的部分，只处理缺失的实体/设备
+    3. 最终的JSON/事实库/向量库均从日志组装
+    4. 日志以注册表签名开头（kind为run），签名不同说明注册表已变化，日志作废；每个阶段成功完成后清除该阶段的记录，
+       因此只有被中断的初始化才会恢复，完整执行过一次后再初始化会重新提取
+    记录格式：{"kind": "run"/"entity"/"device"/"vector", "signature": ..., "device_id": ..., "entity_id": ..., "fact": {...}, "time": ...}
+    同一key多次记录时以最后一条为准
+    """
+    def __init__(self, journal_path: Optional[str] = None):
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        self.journal_path = journal_path or os.path.join(current_dir, "temp_output", "init_journal.jsonl")
+        self._lock = threading.Lock()
+
+    def _iter_records(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时写了一半的最后一行，忽略即可（对应的工作会被重新执行）
+                    continue
+
+    def _append(self, record: Dict[str, Any]):
+        record["time"] = datetime.now().isoformat()
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            journal_dir = os.path.dirname(self.journal_path)
+            if journal_dir and not os.path.exists(journal_dir):
+                os.makedirs(journal_dir, exist_ok=True)
+            if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > 0:
+                with open(self.journal_path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    # 上次崩溃留下了写了一半的行，先换行，避免与新记录粘在一起
+                    if f.read(1) != b"\n":
+                        line = "\n" + line
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    # ---------------------- 写入 ----------------------
+    def begin(self, signature: str) -> bool:
+        """
+        开始（或继续）一次初始化：日志属于同一注册表签名时保留以便恢复，否则清空日志并记录新签名
+        :param signature: 当前注册表的签名
+        :return: 是否保留了原有日志
+        """
+        recorded = None
+        for record in self._iter_records():
+            if record.get("kind") == "run":
+                recorded = record.get("signature")
+        if recorded == signature:
+            return True
+        self.reset()
+        self._append({"kind": "run", "signature": signature})
+        return False
+
+    def record_entity_fact(self, device_id: str, entity_id: str, entity_fact: dict):
+        """记录一个已完成的实体事实（按注册表中的entity_id记录，不取自LLM输出）"""
+        self._append({"kind": "entity", "device_id": device_id, "entity_id": entity_id, "fact": entity_fact})
+
+    def record_device_fact(self, device_fact: dict):
+        """记录一个已完成的设备事实"""
+        self._append({"kind": "device", "device_id": device_fact["device_id"], "fact": device_fact})
+
+    def record_vector_saved(self, device_id: str):
+        """记录一个设备的事实已写入向量库"""
+        self._append({"kind": "vector", "device_id": device_id})
+
+    # ---------------------- 读取 ----------------------
+    def load_entity_facts(self) -> Dict[str, Dict[str, dict]]:
+        """
+        已完成的实体事实
+        :return: {device_id: {entity_id: entity_fact}}
+        """
+        entity_facts = {}
+        for record in self._iter_records():
+            if record.get("kind") == "entity":
+                entity_facts.setdefault(record["device_id"], {})[record["entity_id"]] = record["fact"]
+        return entity_facts
+
+    def load_device_facts(self) -> Dict[str, dict]:
+        """
+        已完成的设备事实
+        :return: {device_id: device_fact}
+        """
+        device_facts = {}
+        for record in self._iter_records():
+            if record.get("kind") == "device":
+                device_facts[record["device_id"]] = record["fact"]
+        return device_facts
+
+    def load_vector_saved(self) -> set:
+        """已写入向量库的设备ID"""
+        return {record["device_id"] for record in self._iter_records() if record.get("kind") == "vector"}
+
+    def reset(self, kind: Optional[str] = None):
+        """
+        清空日志，重新执行初始化
+        :param kind: 只清除某一类记录（entity/device/vector，保留注册表签名）；为空则清空全部
+        """
+        with self._lock:
+            if not os.path.exists(self.journal_path):
+                return
+            if kind is None:
+                os.remove(self.journal_path)
+                return
+            kept = [record for record in self._iter_records() if record.get("kind") != kind]
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in kept:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+
+
+INITJOURNAL = InitJournal()
@@ -0,0 +1,167 @@
+import re
+import threading
+from dataclasses import dataclass
+from typing import List, Dict
+
+# 可能携带「新增/过时/修改的事实」的表述：设备称呼与位置、连接关系、使用习惯、偏好、纠正
+_FACT_PATTERNS_ZH = [
+    # 编号/字母标签指代设备（如「1是卧室灯」「c是门」），只在分句开头匹配，避免「温度25是多少」这类读数
+    r"(^|[，,。、；;\s])[0-9a-zA-Z]{1,2}\s*号?\s*是", r"是.{0,6}(灯|插座|传感器|音箱|网关|台灯|灯泡)",
+    r"叫做", r"叫它", r"名字叫", r"就叫", r"称为", r"称呼", r"开头的",
+    r"按在", r"装在", r"放在", r"挂在", r"贴在", r"位于", r"连着", r"接着", r"连接", r"对应",
+    r"一般", r"通常", r"平时", r"习惯", r"喜欢", r"偏好", r"默认", r"总是", r"每天", r"每次", r"经常",
+    r"以后", r"下次", r"从现在", r"不再", r"不用", r"不要", r"别再", r"除非", r"否则",
+    r"换成", r"改成", r"改为", r"搬到", r"移到", r"其实", r"记住", r"我的.{0,8}(是|叫)",
+    r"太(高|低|亮|暗|冷|热|大|小)了", r"时[，,]", r"的时候[，,]",
+]
+_FACT_PATTERNS_EN = [
+    r"\bis (called|named|in|on|at|near|next to|connected to)\b", r"\bcall (it|them)\b", r"\blocated\b",
+    r"\busually\b", r"\balways\b", r"\bnormally\b", r"\bevery (day|night|morning|time)\b", r"\bprefer",
+    r"\bfavou?rite\b", r"\bfrom now on\b", r"\bno longer\b", r"\binstead\b", r"\bmoved\b", r"\bremember\b",
+    r"\bdon'?t\b", r"\bunless\b", r"\bmy .{0,20}\b(is|are)\b", r"\btoo (high|low|bright|dark|hot|cold|loud)\b",
+]
+# 不携带事实的客套/确认
+_TRIVIAL_PATTERNS = [
+    r"^(谢谢|多谢|感谢|好的|好|嗯|行|可以|没事|没问题|知道了|收到|ok|okay|thanks|thank you|thx|great|cool|yes|no)[!！。.~～\s]*$",
+]
+# AI向用户澄清提问后，用户的回答大概率是设备事实
+_CLARIFY_PATTERNS = [r"请告诉我", r"哪一", r"哪个", r"请确认", r"which one", r"please tell me"]
+# 单条指令中的长期偏好：时间段（如「晚上10点到早上7点勿扰」）、对设备的感受（如「有点恐怖」）
+_PREFERENCE_PATTERNS = [
+    r"\d{1,2}\s*[点:：].{0,4}(到|至|-|~|～).{0,6}\d{1,2}\s*[点:：]",
+    r"(早上|晚上|夜里|夜间|白天|凌晨|中午|下午|睡前).{0,6}(到|至).{0,4}(早上|晚上|夜里|凌晨|中午|下午|白天)",
+    r"勿扰", r"有点(恐怖|吓人|吵|刺眼|亮|暗|冷|热|大声)", r"不喜欢", r"讨厌", r"受不了",
+    r"\bbetween\b.{1,20}\band\b", r"\d{1,2}\s*(am|pm)?\s*(to|until|-)\s*\d{1,2}\s*(am|pm)\b",
+    r"\bdo not disturb\b", r"\bquiet hours\b", r"\b(hate|dislike)\b",
+]
+
+_FACT_RE = re.compile("|".join(_FACT_PATTERNS_ZH + _FACT_PATTERNS_EN), re.IGNORECASE)
+_TRIVIAL_RE = re.compile("|".join(_TRIVIAL_PATTERNS), re.IGNORECASE)
+_CLARIFY_RE = re.compile("|".join(_CLARIFY_PATTERNS), re.IGNORECASE)
+_PREFERENCE_RE = re.compile("|".join(_PREFERENCE_PATTERNS), re.IGNORECASE)
+
+
+@dataclass
+class GateDecision:
+    should_extract: bool
+    reason: str
+
+
+class MemoryGate():
+    """
+    记忆更新预筛：在调用带工具的记忆更新agent之前，判断对话是否可能包含新增/过时/修改的事实。
+    1. 规则：关键词匹配常见的事实表述（设备称呼、位置、连接关系、使用习惯、偏好、纠正）
+    2. 规则无法判断（多轮对话但未命中关键词）时，可选调用一次不带工具的小模型（配置项small_model）判断；未开启则保守地执行更新
+    同时统计跳过率
+    """
+    def __init__(self, use_llm: bool = False):
+        self.use_llm = use_llm
+        self._lock = threading.Lock()
+        self.total = 0
+        self.skipped = 0
+        self.reason_counts: Dict[str, int] = {}
+
+    @staticmethod
+    def _split_turns(dialogue_record: str) -> List[tuple]:
+        """将「用户：xx\\nAI：xx」格式的对话拆为(角色, 内容)列表；无法识别时整体视为用户发言"""
+        turns = []
+        for line in dialogue_record.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            match = re.match(r"^(用户|AI|user|ai)\s*[：:]\s*(.*)$", line)
+            if match:
+                role = "user" if match.group(1) in ("用户", "user") else "ai"
+                turns.append((role, match.group(2)))
+            elif turns:
+                # 多行内容归入上一轮
+                turns[-1] = (turns[-1][0], turns[-1][1] + "\n" + line)
+            else:
+                turns.append(("user", line))
+        return turns
+
+    def _rule_decide(self, dialogue_record: str) -> GateDecision:
+        turns = self._split_turns(dialogue_record)
+        user_texts = [text for role, text in turns if role == "user"]
+        if not user_texts or all(_TRIVIAL_RE.match(text.strip()) for text in user_texts):
+            return GateDecision(False, "客套/确认，无事实")
+        for text in user_texts:
+            if _FACT_RE.search(text):
+                return GateDecision(True, "命中事实表述")
+        # AI澄清提问后用户作答
+        for idx, (role, text) in enumerate(turns[:-1]):
+            if role == "ai" and _CLARIFY_RE.search(text) and turns[idx + 1][0] == "user":
+                return GateDecision(True, "回答了澄清提问")
+        if len(user_texts) == 1:
+            # 单条指令也可能带有长期偏好，如「把网关灯设成晚上10点到早上7点勿扰」
+            if _PREFERENCE_RE.search(user_texts[0]):
+                return GateDecision(True, "单条指令，含时间段/偏好")
+            return GateDecision(False, "单条指令，无事实")
+        return GateDecision(True, "规则无法判断")
+
+    def _llm_decide(self, dialogue_record: str) -> GateDecision:
+        """规则无法判断时交给小模型（配置项small_model，未配置时沿用主模型）"""
+        from smartHome.m_agent.common.get_llm import get_llm
+        from smartHome.m_agent.common.global_config import GLOBALCONFIG
+        prompt = f"""
+        判断下面的对话中，用户是否提供了关于智能家居设备的新增/过时/修改的事实信息（如设备称呼、位置、连接关系、使用习惯、偏好）。
+        只回答"是"或"否"。
+        【对话】
+        {dialogue_record}
+        """
+        result = get_llm(GLOBALCONFIG.small_model).invoke([{"role": "system", "content": prompt}])
+        answer = str(result.content).strip().lower()
+        if answer.startswith("否") or answer.startswith("no"):
+            return GateDecision(False, "小模型判断无事实")
+        return GateDecision(True, "小模型判断有事实")
+
+    def check(self, dialogue_record: str) -> GateDecision:
+        """
+        判断是否需要执行记忆更新，并计入统计
+        :param dialogue_record: 对话记录
+        :return: GateDecision(should_extract, reason)
+        """
+        decision = self._rule_decide(dialogue_record)
+        if decision.reason == "规则无法判断" and self.use_llm:
+            decision = self._llm_decide(dialogue_record)
+        with self._lock:
+            self.total += 1
+            if not decision.should_extract:
+                self.skipped += 1
+            self.reason_counts[decision.reason] = self.reason_counts.get(decision.reason, 0) + 1
+        return decision
+
+    def skip_rate(self) -> float:
+        """跳过率（跳过数/总数）"""
+        with self._lock:
+            return self.skipped / self.total if self.total else 0.0
+
+    def stats(self) -> Dict:
+        """统计信息：总数、跳过数、跳过率、各原因计数"""
+        with self._lock:
+            return {
+                "total": self.total,
+                "skipped": self.skipped,
+                "skip_rate": self.skipped / self.total if self.total else 0.0,
+                "reasons": dict(self.reason_counts),
+            }
+
+
+MEMORYGATE = MemoryGate()
+
+if __name__ == "__main__":
+    import json
+    import os
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(current_dir, "dialogue_records.json"), "r", encoding="utf-8") as f:
+        dialogue_json = json.load(f)
+    gate = MemoryGate()
+    for single_dialogue in dialogue_json:
+        dialogue_str = "\n".join(
+            f"用户：{msg['user']}" if "user" in msg else f"AI：{msg['ai']}" for msg in single_dialogue
+        )
+        decision = gate.check(dialogue_str)
+        print(f"{'更新' if decision.should_extract else '跳过'}（{decision.reason}）：{dialogue_str.splitlines()[0]}")
+    # dialogue_records.json（17条）：跳过4条，跳过率约23.5%；其余均含事实/偏好或需要LLM判断
+    print(gate.stats())
@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional, List
+
+from smartHome.m_agent.common.global_config import GLOBALCONFIG
+from smartHome.m_agent.memory.fact_store import FACTSTORE
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 快照中需要一并保存的调试JSON（temp_output下）
+_FACT_JSON_FILES = ["entities_fact.json", "device_fact.json"]
+
+
+def _copy_tree(src: str, dst: str):
+    """
+    复制目录：优先用cp --reflink=auto（btrfs/xfs等支持写时复制的文件系统上只复制元数据，近似O(1)），
+    不支持时退化为普通复制
+    """
+    if sys.platform.startswith("linux"):
+        result = subprocess.run(["cp", "-a", "--reflink=auto", src, dst], capture_output=True)
+        if result.returncode == 0:
+            return
+        if os.path.exists(dst):
+            shutil.rmtree(dst)
+    shutil.copytree(src, dst, copy_function=shutil.copy2)
+
+
+def _copy_file(src: str, dst: str):
+    if sys.platform.startswith("linux"):
+        result = subprocess.run(["cp", "--reflink=auto", src, dst], capture_output=True)
+        if result.returncode == 0:
+            return
+    shutil.copy2(src, dst)
+
+
+class MemorySnapshot():
+    """
+    记忆快照：保存/恢复测试所需的全部可变状态，使每个测试用例从固定的记忆状态开始
+    1. 向量库（chroma目录）：写时复制保存；恢复时把预先准备好的副本原子重命名到位，随后重新打开chroma客户端。
+       副本在上一次恢复之后由后台线程复制（用例执行期间完成），因此恢复本身与向量库大小无关；
+       第一次恢复、或用例间隔短于复制耗时时仍需等待一次完整复制
+    2. 事实库（SQLite）：SQLite在线备份接口保存/恢复，已打开的连接无需重连
+    3. 调试用的事实JSON（temp_output）
+    4. 模拟HA的实体状态（HOMEASSITANT_DATA.export_state()：只保存与初始状态不同的实体，恢复时原地覆盖，不破坏增量重置）
+    快照保存在memory/snapshots/<name>/下，快照本身不会被修改，可反复恢复
+    """
+    def __init__(self, snapshot_root: Optional[str] = None):
+        self.snapshot_root = snapshot_root or os.path.join(current_dir, "snapshots")
+        self.chroma_dir = os.path.join(current_dir, f"{GLOBALCONFIG.provider}_{GLOBALCONFIG.model}_chroma_text_db")
+        self.temp_output_dir = os.path.join(current_dir, "temp_output")
+        # 快照名 -> 正在准备向量库副本的后台线程
+        self._preparing: Dict[str, threading.Thread] = {}
+
+    def _prepared_dir(self, name: str) -> str:
+        """快照name的向量库副本，与chroma目录在同一文件系统下，恢复时可直接重命名"""
+        return f"{self.chroma_dir}.prepared_{name}"
+
+    def _prepare(self, name: str, discard: Optional[str] = None):
+        """
+        后台准备快照name的向量库副本（先复制到临时目录，完整后再重命名，避免恢复时用到残缺的副本）
+        :param discard: 顺带在后台删除的目录（恢复时被替换下来的旧向量库）
+        """
+        snapshot_chroma = os.path.join(self._snapshot_dir(name), "chroma")
+        prepared_dir = self._prepared_dir(name)
+
+        def run():
+            if discard and os.path.exists(discard):
+                shutil.rmtree(discard, ignore_errors=True)
+            if not os.path.exists(snapshot_chroma) or os.path.exists(prepared_dir):
+                return
+            tmp_dir = prepared_dir + ".tmp"
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir)
+            _copy_tree(snapshot_chroma, tmp_dir)
+            os.rename(tmp_dir, prepared_dir)
+
+        thread = threading.Thread(target=run, name=f"snapshot-prepare-{name}")
+        self._preparing[name] = thread
+        thread.start()
+
+    def _wait_prepared(self, name: str):
+        thread = self._preparing.pop(name, None)
+        if thread is not None:
+            thread.join()
+
+    def _discard_prepared(self, name: str):
+        self._wait_prepared(name)
+        prepared_dir = self._prepared_dir(name)
+        if os.path.exists(prepared_dir):
+            shutil.rmtree(prepared_dir)
+
+    def _snapshot_dir(self, name: str) -> str:
+        return os.path.join(self.snapshot_root, name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self._snapshot_dir(name), "meta.json"))
+
+    def list(self) -> List[dict]:
+        """列出所有快照的元信息"""
+        if not os.path.exists(self.snapshot_root):
+            return []
+        snapshots = []
+        for name in sorted(os.listdir(self.snapshot_root)):
+            meta_path = os.path.join(self._snapshot_dir(name), "meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+        return snapshots
+
+    def save(self, name: str, overwrite: bool = False) -> str:
+        """
+        保存当前的记忆状态为快照
+        :param name: 快照名
+        :param overwrite: 同名快照已存在时是否覆盖
+        :return: 快照目录
+        """
+        start = time.perf_counter()
+        snapshot_dir = self._snapshot_dir(name)
+        if os.path.exists(snapshot_dir):
+            if not overwrite:
+                raise FileExistsError(f"快照「{name}」已存在")
+            self._discard_prepared(name)
+            shutil.rmtree(snapshot_dir)
+        # 先写到临时目录，完整写完后再重命名，避免留下残缺的快照
+        tmp_dir = snapshot_dir + ".tmp"
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+
+        # 步骤1：向量库
+        if os.path.exists(self.chroma_dir):
+            _copy_tree(self.chroma_dir, os.path.join(tmp_dir, "chroma"))
+        # 步骤2：事实库
+        FACTSTORE.backup_to(os.path.join(tmp_dir, "fact_store.sqlite3"))
+        # 步骤3：调试用的事实JSON
+        for file_name in _FACT_JSON_FILES:
+            src = os.path.join(self.temp_output_dir, file_name)
+            if os.path.exists(src):
+                _copy_file(src, os.path.join(tmp_dir, file_name))
+        # 步骤4：模拟HA的实体状态
+        from smartHome.m_agent.memory.fake.fake_request import HOMEASSITANT_DATA
+        with open(os.path.join(tmp_dir, "ha_state.json"), "w", encoding="utf-8") as f:
+            json.dump(HOMEASSITANT_DATA.export_state(), f, ensure_ascii=False)
+
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"name": name, "create_time": datetime.now().isoformat(),
+                       "chroma_db": os.path.basename(self.chroma_dir)}, f, ensure_ascii=False)
+        os.rename(tmp_dir, snapshot_dir)
+        print(f"快照「{name}」已保存（{(time.perf_counter() - start) * 1000:.1f}ms）：{snapshot_dir}")
+        return snapshot_dir
+
+    def restore(self, name: str):
+        """
+        将记忆状态恢复为快照name
+        :param name: 快照名
+        """
+        start = time.perf_counter()
+        if not self.exists(name):
+            raise FileNotFoundError(f"快照「{name}」不存在")
+        snapshot_dir = self._snapshot_dir(name)
+
+        # 步骤1：向量库——把准备好的副本重命名到位（没有副本时当场复制），再让chroma重新打开
+        snapshot_chroma = os.path.join(snapshot_dir, "chroma")
+        if os.path.exists(snapshot_chroma):
+            prepared_dir = self._prepared_dir(name)
+            self._wait_prepared(name)
+            if not os.path.exists(prepared_dir):
+                _copy_tree(snapshot_chroma, prepared_dir)
+            old_dir = f"{self.chroma_dir}.old_{time.time_ns()}"
+            if os.path.exists(self.chroma_dir):
+                os.rename(self.chroma_dir, old_dir)
+            os.rename(prepared_dir, self.chroma_dir)
+            # 只有已经加载了向量库时才需要重新打开（避免为此加载嵌入模型）
+            vector_device = sys.modules.get("smartHome.m_agent.memory.vector_device")
+            if vector_device is not None:
+                vector_device.VECTORDB.reopen()
+            # 后台删除旧向量库，并为下一次恢复准备新的副本
+            self._prepare(name, discard=old_dir)
+
+        # 步骤2：事实库
+        FACTSTORE.restore_from(os.path.join(snapshot_dir, "fact_store.sqlite3"))
+
+        # 步骤3：调试用的事实JSON
+        for file_name in _FACT_JSON_FILES:
+            src = os.path.join(snapshot_dir, file_name)
+            if os.path.exists(src):
+                _copy_file(src, os.path.join(self.temp_output_dir, file_name))
+
+        # 步骤4：模拟HA的实体状态（原地恢复，之后的reset()仍然只恢复被修改过的实体）
+        from smartHome.m_agent.memory.fake.fake_request import HOMEASSITANT_DATA
+        state_path = os.path.join(snapshot_dir, "ha_state.json")
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                HOMEASSITANT_DATA.import_state(json.load(f))
+        else:
+            # 旧版快照保存的是整个实体列表
+            with open(os.path.join(snapshot_dir, "ha_entities.json"), "r", encoding="utf-8") as f:
+                HOMEASSITANT_DATA.import_state({"entities": json.load(f)})
+        print(f"已恢复快照「{name}」（{(time.perf_counter() - start) * 1000:.1f}ms）")
+
+    def delete(self, name: str):
+        """删除快照（连同准备好的向量库副本）"""
+        self._discard_prepared(name)
+        snapshot_dir = self._snapshot_dir(name)
+        if os.path.exists(snapshot_dir):
+            shutil.rmtree(snapshot_dir)
+
+    @contextmanager
+    def pinned(self, name: Optional[str] = None):
+        """
+        在固定的记忆状态下执行一段代码，结束后恢复，期间的写入不会泄漏到后续用例
+        :param name: 快照名：进入时先恢复该快照；为空则以当前状态临时保存一个快照
+        """
+        temp_name = None
+        if name is None:
+            temp_name = f"_pinned_{os.getpid()}_{int(time.time() * 1000)}"
+            self.save(temp_name)
+        else:
+            self.restore(name)
+        try:
+            yield self
+        finally:
+            self.restore(name or temp_name)
+            if temp_name is not None:
+                self.delete(temp_name)
+
+
+MEMORYSNAPSHOT = MemorySnapshot()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="记忆快照：保存/恢复向量库、事实库和模拟HA状态")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    save_parser = subparsers.add_parser("save", help="保存当前记忆状态")
+    save_parser.add_argument("name")
+    save_parser.add_argument("--overwrite", action="store_true", help="覆盖同名快照")
+    restore_parser = subparsers.add_parser("restore", help="恢复快照")
+    restore_parser.add_argument("name")
+    delete_parser = subparsers.add_parser("delete", help="删除快照")
+    delete_parser.add_argument("name")
+    subparsers.add_parser("list", help="列出所有快照")
+    args = parser.parse_args(argv)
+
+    if args.command == "save":
+        MEMORYSNAPSHOT.save(args.name, overwrite=args.overwrite)
+    elif args.command == "restore":
+        MEMORYSNAPSHOT.restore(args.name)
+    elif args.command == "delete":
+        MEMORYSNAPSHOT.delete(args.name)
+    elif args.command == "list":
+        for meta in MEMORYSNAPSHOT.list():
+            print(f"{meta['name']}\t{meta['create_time']}\t{meta['chroma_db']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Optional, Dict, Any
+
+from smartHome.m_agent.common.global_config import GLOBALCONFIG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memory_update_jobs (
+    job_id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    dialogue_record TEXT NOT NULL,
+    device_id       TEXT,
+    status          TEXT NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    result          TEXT,
+    error           TEXT,
+    create_time     TEXT,
+    update_time     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_memory_update_jobs_status ON memory_update_jobs(status, job_id);
+"""
+
+
+def _default_handler(dialogue_record: str) -> str:
+    """默认任务处理：调用SmartHomeMemory.extract_and_update（延迟导入，避免循环依赖）"""
+    from smartHome.m_agent.memory.fact_memory import SMARTHOMEMEMORY
+    return SMARTHOMEMEMORY.extract_and_update(dialogue_record=dialogue_record)
+
+
+class MemoryUpdateWorker():
+    """
+    后台记忆更新工作器：
+    1. 对话记录先写入本地SQLite持久化队列，进程崩溃后未完成的任务会在下次启动时继续处理
+    2. 调度线程从队列取任务，交给线程池执行，并发数受max_workers限制
+    3. 指定了device_id的任务，同一设备的任务按入队顺序串行执行
+    4. flush()等待队列清空，便于测试
+    """
+    def __init__(self, queue_path: Optional[str] = None, max_workers: int = 2, max_attempts: int = 3,
+                 handler: Optional[Callable[[str], Any]] = None):
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        self.queue_path = queue_path or os.path.join(current_dir, "temp_output", "memory_update_queue.sqlite3")
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.handler = handler or _default_handler
+
+        self._conn = None
+        self._db_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._busy_devices = set()
+        self._in_flight = 0
+        self._executor = None
+        self._dispatcher = None
+        self._stopping = False
+
+    # ---------------------- 持久化队列 ----------------------
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            queue_dir = os.path.dirname(self.queue_path)
+            if queue_dir and not os.path.exists(queue_dir):
+                os.makedirs(queue_dir, exist_ok=True)
+            conn = sqlite3.connect(self.queue_path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, params=()):
+        with self._db_lock:
+            conn = self._db()
+            with conn:
+                return conn.execute(sql, params)
+
+    def _query(self, sql: str, params=()):
+        with self._db_lock:
+            return self._db().execute(sql, params).fetchall()
+
+    # ---------------------- 对外接口 ----------------------
+    def submit(self, dialogue_record: str, device_id: Optional[str] = None) -> int:
+        """
+        提交一条对话记录，立即返回任务ID，记忆更新在后台完成
+        :param dialogue_record: 对话记录
+        :param device_id: 可选，已知涉及的设备ID；同一设备的任务会串行执行
+        :return: 任务ID
+        """
+        now = datetime.now().isoformat()
+        cursor = self._execute(
+            "INSERT INTO memory_update_jobs(dialogue_record, device_id, status, create_time, update_time) "
+            "VALUES (?, ?, 'pending', ?, ?)",
+            (dialogue_record, device_id, now, now)
+        )
+        job_id = cursor.lastrowid
+        self.start()
+        with self._cond:
+            self._cond.notify_all()
+        return job_id
+
+    def start(self):
+        """启动调度线程（重复调用无副作用）"""
+        with self._cond:
+            if self._dispatcher is not None and self._dispatcher.is_alive():
+                return
+            self._stopping = False
+            # 上次进程退出时仍在执行的任务，重新放回队列
+            self._execute("UPDATE memory_update_jobs SET status='pending' WHERE status='running'")
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="memory_update")
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="memory_update_dispatcher",
+                                                daemon=True)
+            self._dispatcher.start()
+
+    def stop(self, wait: bool = True):
+        """停止调度线程；未开始的任务保留在队列中，下次启动继续处理"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._dispatcher is not None and wait:
+            self._dispatcher.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+        self._dispatcher = None
+        self._executor = None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        阻塞等待队列中所有任务处理完成
+        :param timeout: 最长等待秒数，None表示一直等待
+        :return: 队列是否已清空
+        """
+        self.start()
+        with self._cond:
+            return self._cond.wait_for(lambda: self.pending_count() == 0, timeout=timeout)
+
+    def pending_count(self) -> int:
+        """尚未完成（pending/running）的任务数"""
+        rows = self._query("SELECT COUNT(*) AS n FROM memory_update_jobs WHERE status IN ('pending', 'running')")
+        return rows[0]["n"]
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """查询任务状态与结果"""
+        rows = self._query("SELECT * FROM memory_update_jobs WHERE job_id=?", (job_id,))
+        return dict(rows[0]) if rows else None
+
+    # ---------------------- 调度与执行 ----------------------
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                job = self._next_runnable_job() if self._in_flight < self.max_workers else None
+                if job is None:
+                    self._cond.wait(timeout=1.0)
+                    continue
+                self._in_flight += 1
+                if job["device_id"]:
+                    self._busy_devices.add(job["device_id"])
+            self._execute(
+                "UPDATE memory_update_jobs SET status='running', attempts=attempts+1, update_time=? WHERE job_id=?",
+                (datetime.now().isoformat(), job["job_id"])
+            )
+            self._executor.submit(self._run_job, job)
+
+    def _next_runnable_job(self) -> Optional[Dict[str, Any]]:
+        """按入队顺序取第一个可执行的任务（其设备当前没有任务在执行）"""
+        rows = self._query(
+            "SELECT job_id, dialogue_record, device_id FROM memory_update_jobs "
+            "WHERE status='pending' ORDER BY job_id LIMIT ?",
+            (self.max_workers * 8,)
+        )
+        blocked = set(self._busy_devices)
+        for row in rows:
+            device_id = row["device_id"]
+            if device_id and device_id in blocked:
+                continue
+            return dict(row)
+        return None
+
+    def _run_job(self, job: Dict[str, Any]):
+        # 后台线程使用独立的日志器，避免把前台agent的日志写进记忆更新日志
+        GLOBALCONFIG.isolate_thread_logger(GLOBALCONFIG.memory_update_logger)
+        status, result, error = "done", None, None
+        try:
+            result = self.handler(job["dialogue_record"])
+        except Exception:
+            error = traceback.format_exc()
+            attempts = self.get_job(job["job_id"])["attempts"]
+            status = "pending" if attempts < self.max_attempts else "failed"
+            GLOBALCONFIG.print_nested_log(f"记忆更新任务{job['job_id']}执行失败（第{attempts}次）：\n{error}")
+        self._execute(
+            "UPDATE memory_update_jobs SET status=?, result=?, error=?, update_time=? WHERE job_id=?",
+            (status, None if result is None else str(result), error, datetime.now().isoformat(), job["job_id"])
+        )
+        with self._cond:
+            self._in_flight -= 1
+            if job["device_id"]:
+                self._busy_devices.discard(job["device_id"])
+            self._cond.notify_all()
+
+
+MEMORYUPDATEWORKER = MemoryUpdateWorker()
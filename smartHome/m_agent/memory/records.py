@@ -0,0 +1,92 @@
+from dataclasses import dataclass, field
+from typing import Optional, Tuple, Dict, Any
+
+
+@dataclass(slots=True)
+class EntityRecord():
+    """
+    紧凑的实体记录：只保存agent常用的静态字段，原始HA字典通过raw引用（不复制）。
+    state/attributes等会被服务调用修改的字段不做缓存，每次从raw读取。
+    raw是DeviceInfo中精简后的实体字典（只含entity_id/state/attributes，见RETAINED_ENTITY_FIELDS），
+    记录本身约150字节，节省的内存来自精简字典（不再常驻context、时间戳等）
+    """
+    entity_id: str
+    domain: str
+    friendly_name: str
+    device_id: Optional[str] = None
+    area_id: Optional[str] = None
+    raw: Dict[str, Any] = field(default=None, repr=False)
+
+    @classmethod
+    def from_state(cls, entity: Dict[str, Any], device_id: Optional[str] = None,
+                   area_id: Optional[str] = None) -> "EntityRecord":
+        """由/api/states返回的实体字典创建记录"""
+        entity_id = entity["entity_id"]
+        return cls(
+            entity_id=entity_id,
+            domain=entity_id.split(".", 1)[0],
+            friendly_name=entity.get("attributes", {}).get("friendly_name", entity_id),
+            device_id=device_id,
+            area_id=area_id,
+            raw=entity,
+        )
+
+    @property
+    def state(self) -> Any:
+        return self.raw.get("state")
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        return self.raw.get("attributes", {})
+
+    @property
+    def unit(self) -> Optional[str]:
+        return self.attributes.get("unit_of_measurement")
+
+    @property
+    def last_changed(self) -> Optional[str]:
+        return self.raw.get("last_changed")
+
+
+@dataclass(slots=True)
+class DeviceRecord():
+    """紧凑的设备记录：只保存agent常用的字段（设备注册信息不会被服务修改，无需引用原始字典）"""
+    device_id: str
+    name: str
+    name_by_user: Optional[str] = None
+    area_id: Optional[str] = None
+    manufacturer: Optional[str] = None
+    model: Optional[str] = None
+    entity_ids: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_registry(cls, device: Dict[str, Any], entity_ids: Tuple[str, ...] = ()) -> "DeviceRecord":
+        """由device_registry中的设备字典创建记录"""
+        return cls(
+            device_id=device["id"],
+            name=device.get("name") or device["id"],
+            name_by_user=device.get("name_by_user"),
+            area_id=device.get("area_id"),
+            manufacturer=device.get("manufacturer"),
+            model=device.get("model"),
+            entity_ids=tuple(entity_ids),
+        )
+
+    @property
+    def display_name(self) -> str:
+        """展示用名称：优先使用用户自定义名称"""
+        return self.name_by_user or self.name
+
+
+@dataclass(slots=True)
+class ServiceRecord():
+    """紧凑的domain服务记录：只保存服务名元组；服务的字段定义需要时通过DeviceInfo.get_domain_service获取"""
+    domain: str
+    service_names: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_domain_services(cls, domain_service: Dict[str, Any]) -> "ServiceRecord":
+        return cls(
+            domain=domain_service["domain"],
+            service_names=tuple(domain_service.get("services", {})),
+        )
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+# 注册表数据目录（device_registry/entity_registry/entities/domains_services四个JSON）：默认为copied_data，
+# 设置环境变量SMARTHOME_DATA_DIR可换成合成家庭（synthetic_home.py）生成的目录
+DATA_DIR = os.environ.get("SMARTHOME_DATA_DIR") or os.path.join(current_dir, "copied_data")
+
+
+class RegistryLoader():
+    """
+    注册表JSON加载器（DEVICEINFO与HOMEASSITANT_DATA共用）：
+    1. 进程内缓存：每个文件在进程内只解析一次，之后直接从pickle字节反序列化
+    2. 磁盘缓存：解析结果以pickle保存在temp_output/registry_cache，按「源文件路径+mtime+大小」校验，
+       源文件未变化时跳过JSON解析
+    每次load都返回独立的副本，调用方（如模拟HA修改实体状态）可以随意修改而不影响其他使用者
+    """
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or os.path.join(current_dir, "temp_output", "registry_cache")
+        self._lock = threading.Lock()
+        # 源文件绝对路径 -> ((mtime_ns, size), pickle字节)
+        self._memory_cache: Dict[str, Tuple[Tuple[int, int], bytes]] = {}
+
+    def _cache_path(self, source_path: str) -> str:
+        digest = hashlib.md5(source_path.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{os.path.basename(source_path)}.{digest}.pickle")
+
+    def _read_disk_cache(self, source_path: str, signature: Tuple[int, int]) -> Optional[bytes]:
+        cache_path = self._cache_path(source_path)
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path, "rb") as f:
+                header = pickle.load(f)
+                if header != {"source": source_path, "signature": signature}:
+                    return None
+                return f.read()
+        except Exception:
+            # 缓存损坏时当作不存在，重新解析JSON
+            return None
+
+    def _write_disk_cache(self, source_path: str, signature: Tuple[int, int], payload: bytes):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            cache_path = self._cache_path(source_path)
+            # 先写临时文件再替换，避免并发进程读到写了一半的缓存
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"source": source_path, "signature": signature}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.write(payload)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"⚠️  写入注册表缓存失败（不影响使用）：{e}")
+
+    def _load_payload(self, source_path: str) -> bytes:
+        stat = os.stat(source_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._memory_cache.get(source_path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            payload = self._read_disk_cache(source_path, signature)
+            if payload is None:
+                with open(source_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+                self._write_disk_cache(source_path, signature, payload)
+            self._memory_cache[source_path] = (signature, payload)
+            return payload
+
+    def load(self, source_path: str) -> Any:
+        """
+        加载JSON文件（返回独立的副本）
+        :param source_path: JSON文件路径
+        """
+        return pickle.loads(self._load_payload(os.path.abspath(source_path)))
+
+    def clear(self):
+        """清空进程内缓存（磁盘缓存按mtime自动失效，无需清理）"""
+        with self._lock:
+            self._memory_cache.clear()
+
+
+REGISTRYLOADER = RegistryLoader()
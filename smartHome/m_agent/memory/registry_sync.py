@@ -0,0 +1,266 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from smartHome.m_agent.common.ha_client import get_ha_client
+from smartHome.m_agent.memory.area_index import AREAINDEX
+from smartHome.m_agent.memory.capability_index import CAPABILITYINDEX
+from smartHome.m_agent.memory.device_info import DEVICEINFO
+
+# 参与比较的实体静态属性：只有这些变化才需要重新提取事实；状态值、亮度、音量等随使用变化的属性不参与
+STATIC_ENTITY_ATTRIBUTES = (
+    "friendly_name", "device_class", "unit_of_measurement", "state_class", "supported_features",
+    "supported_color_modes", "min_color_temp_kelvin", "max_color_temp_kelvin", "min_mireds", "max_mireds",
+    "min", "max", "step", "mode", "options", "effect_list", "source_list", "icon",
+)
+# 参与比较的设备注册信息字段
+DEVICE_FIELDS = ("name", "name_by_user", "area_id", "manufacturer", "model", "sw_version", "disabled_by")
+
+
+@dataclass
+class RegistryChange:
+    """注册表的一条变化"""
+    kind: str  # device / entity
+    action: str  # added / changed / removed
+    item_id: str
+    old: Optional[Dict[str, Any]] = None  # 变化前参与比较的字段
+    new: Optional[Dict[str, Any]] = None  # 变化后参与比较的字段
+    changed_fields: List[str] = field(default_factory=list)
+
+
+def _unwrap(payload: Any, key: str) -> List[Dict[str, Any]]:
+    """兼容 列表 / {"data": {key: [...]}}（.storage文件格式） / {"result": [...]}（websocket格式）"""
+    if isinstance(payload, list):
+        return payload
+    if "data" in payload:
+        return payload["data"][key]
+    return payload.get("result") or payload.get(key) or []
+
+
+class HARegistrySource():
+    """
+    从Home Assistant的REST接口拉取 实体状态 / 设备注册表 / 实体注册表。
+    base_url可指向本地的HA替身服务器，便于离线测试同步逻辑
+    """
+    STATES_PATH = "/api/states"
+    DEVICE_REGISTRY_PATH = "/api/config/device_registry/list"
+    ENTITY_REGISTRY_PATH = "/api/config/entity_registry/list"
+
+    def __init__(self, base_url: Optional[str] = None, token: Optional[str] = None, timeout: float = 10):
+        # 与HA工具共用连接池
+        self.client = get_ha_client(base_url, token)
+        self.base_url = self.client.base_url
+        self.timeout = timeout
+
+    def _get(self, path: str) -> Any:
+        return self.client.get(path, timeout=self.timeout)
+
+    def fetch_states(self) -> List[Dict[str, Any]]:
+        return self._get(self.STATES_PATH)
+
+    def fetch_devices(self) -> List[Dict[str, Any]]:
+        return _unwrap(self._get(self.DEVICE_REGISTRY_PATH), "devices")
+
+    def fetch_entity_registry(self) -> List[Dict[str, Any]]:
+        return _unwrap(self._get(self.ENTITY_REGISTRY_PATH), "entities")
+
+
+class RegistrySync():
+    """
+    注册表增量同步：拉取HA的实体状态和注册表，按entity_id/device_id与本地已知的注册信息比较，
+    只把新增/变化/删除的部分应用到DEVICEINFO，并只对变化的实体/设备重新提取事实。
+    比较只看静态字段（见STATIC_ENTITY_ATTRIBUTES、DEVICE_FIELDS），实体状态值的变化不算注册表变化
+    """
+    def __init__(self, source: Optional[HARegistrySource] = None, device_info=DEVICEINFO, refresh_facts: bool = True):
+        self.source = source
+        self.device_info = device_info
+        self.refresh_facts = refresh_facts
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[List[RegistryChange]], None]] = []
+        # device_id / entity_id -> 上次同步时参与比较的字段
+        self._device_signatures: Optional[Dict[str, Dict[str, Any]]] = None
+        self._entity_signatures: Optional[Dict[str, Dict[str, Any]]] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------------- 签名 ----------------------
+    @staticmethod
+    def _device_signature(device: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: device.get(key) for key in DEVICE_FIELDS}
+
+    @staticmethod
+    def _entity_signature(entity: Dict[str, Any], device_id: Optional[str], area_id: Optional[str]) -> Dict[str, Any]:
+        attributes = entity.get("attributes", {})
+        signature = {key: attributes.get(key) for key in STATIC_ENTITY_ATTRIBUTES if key in attributes}
+        signature["device_id"] = device_id
+        signature["area_id"] = area_id
+        return signature
+
+    def _ensure_baseline(self):
+        """第一次同步前，以本地注册表（DEVICEINFO）作为比较基准"""
+        if self._device_signatures is not None:
+            return
+        self._device_signatures = {
+            device["id"]: self._device_signature(device) for device in self.device_info.devices
+        }
+        self._entity_signatures = {
+            entity["entity_id"]: self._entity_signature(
+                entity,
+                self.device_info.get_device_id_by_entity(entity["entity_id"]),
+                self.device_info.get_entity_area_id(entity["entity_id"])
+            )
+            for entity in self.device_info.entities
+        }
+
+    def subscribe(self, callback: Callable[[List[RegistryChange]], None]):
+        """订阅注册表变化，每次同步有变化时以变化列表调用callback"""
+        self._subscribers.append(callback)
+
+    # ---------------------- 比较 ----------------------
+    @staticmethod
+    def _diff_signatures(kind: str, old: Dict[str, Dict[str, Any]],
+                         new: Dict[str, Dict[str, Any]]) -> List[RegistryChange]:
+        changes = []
+        for item_id, new_signature in new.items():
+            old_signature = old.get(item_id)
+            if old_signature is None:
+                changes.append(RegistryChange(kind=kind, action="added", item_id=item_id, new=new_signature))
+            elif old_signature != new_signature:
+                changed_fields = sorted(
+                    key for key in set(old_signature) | set(new_signature)
+                    if old_signature.get(key) != new_signature.get(key)
+                )
+                changes.append(RegistryChange(kind=kind, action="changed", item_id=item_id, old=old_signature,
+                                              new=new_signature, changed_fields=changed_fields))
+        for item_id, old_signature in old.items():
+            if item_id not in new:
+                changes.append(RegistryChange(kind=kind, action="removed", item_id=item_id, old=old_signature))
+        return changes
+
+    def diff(self, states: List[Dict[str, Any]], devices: List[Dict[str, Any]],
+             entity_registry: List[Dict[str, Any]]) -> Tuple[List[RegistryChange], Dict[str, Dict[str, Any]],
+                                                            Dict[str, Dict[str, Any]]]:
+        """
+        比较远端数据与上次同步的结果
+        :return: (变化列表, device_id -> 设备, entity_id -> 实体状态)
+        """
+        self._ensure_baseline()
+        remote_devices = {device["id"]: device for device in devices}
+        remote_entities = {entity["entity_id"]: entity for entity in states}
+        registry_entries = {entry["entity_id"]: entry for entry in entity_registry}
+
+        device_signatures = {device_id: self._device_signature(device) for device_id, device in remote_devices.items()}
+        entity_signatures = {}
+        for entity_id, entity in remote_entities.items():
+            entry = registry_entries.get(entity_id, {})
+            # 与DEVICEINFO一致：只关联到存在的设备
+            device_id = entry.get("device_id") if entry.get("device_id") in remote_devices else None
+            entity_signatures[entity_id] = self._entity_signature(entity, device_id, entry.get("area_id"))
+
+        changes = self._diff_signatures("device", self._device_signatures, device_signatures)
+        changes += self._diff_signatures("entity", self._entity_signatures, entity_signatures)
+        return changes, remote_devices, remote_entities
+
+    # ---------------------- 应用 ----------------------
+    def apply(self, changes: List[RegistryChange], remote_devices: Dict[str, Dict[str, Any]],
+              remote_entities: Dict[str, Dict[str, Any]]):
+        """把变化增量应用到DEVICEINFO（先新增设备，再处理实体，最后删除设备），并按需重新提取事实"""
+        device_changes = [change for change in changes if change.kind == "device"]
+        entity_changes = [change for change in changes if change.kind == "entity"]
+        # 实体增减或转移后，原所属设备的事实也需要更新
+        touched_device_ids = []
+
+        # 步骤1：新增/更新设备
+        for change in device_changes:
+            if change.action != "removed":
+                self.device_info.upsert_device(remote_devices[change.item_id])
+                self._device_signatures[change.item_id] = change.new
+                touched_device_ids.append(change.item_id)
+
+        # 步骤2：新增/更新/删除实体
+        for change in entity_changes:
+            old_device_id = (change.old or {}).get("device_id")
+            if old_device_id and old_device_id != (change.new or {}).get("device_id"):
+                touched_device_ids.append(old_device_id)
+            if change.action == "removed":
+                self.device_info.remove_entity(change.item_id)
+                self._entity_signatures.pop(change.item_id, None)
+            else:
+                self.device_info.upsert_entity(
+                    remote_entities[change.item_id],
+                    registry_entry={"device_id": change.new["device_id"], "area_id": change.new["area_id"]}
+                )
+                self._entity_signatures[change.item_id] = change.new
+
+        # 步骤3：删除设备
+        removed_device_ids = [change.item_id for change in device_changes if change.action == "removed"]
+        for device_id in removed_device_ids:
+            self.device_info.remove_device(device_id)
+            self._device_signatures.pop(device_id, None)
+
+        # 步骤4：依赖注册表的索引下次使用时重建
+        AREAINDEX.invalidate()
+        CAPABILITYINDEX.invalidate()
+
+        if self.refresh_facts:
+            # 延迟导入：事实记忆依赖LLM和向量库，只有真正需要重新提取时才加载
+            from smartHome.m_agent.memory.fact_memory import SMARTHOMEMEMORY
+            SMARTHOMEMEMORY.refresh_registry_facts(
+                changed_entity_ids=[change.item_id for change in entity_changes if change.action != "removed"],
+                removed_entity_ids=[change.item_id for change in entity_changes if change.action == "removed"],
+                changed_device_ids=[device_id for device_id in dict.fromkeys(touched_device_ids)
+                                    if device_id not in removed_device_ids],
+                removed_device_ids=removed_device_ids,
+            )
+
+    def sync(self) -> List[RegistryChange]:
+        """
+        拉取一次并增量同步
+        :return: 本次的变化列表（没有变化时为空列表）
+        """
+        source = self.source or HARegistrySource()
+        with self._lock:
+            states = source.fetch_states()
+            devices = source.fetch_devices()
+            entity_registry = source.fetch_entity_registry()
+            changes, remote_devices, remote_entities = self.diff(states, devices, entity_registry)
+            if not changes:
+                return []
+            summary = {}
+            for change in changes:
+                summary[change.action] = summary.get(change.action, 0) + 1
+            print(f"注册表同步：新增{summary.get('added', 0)}，变化{summary.get('changed', 0)}，删除{summary.get('removed', 0)}")
+            self.apply(changes, remote_devices, remote_entities)
+        for callback in self._subscribers:
+            callback(changes)
+        return changes
+
+    # ---------------------- 后台轮询 ----------------------
+    def start(self, interval: float = 60):
+        """启动后台线程，每interval秒同步一次"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+
+        def loop():
+            while not self._stop_event.wait(interval):
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"⚠️  注册表同步失败，下次重试：{e}")
+
+        self._thread = threading.Thread(target=loop, name="registry_sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+REGISTRYSYNC = RegistrySync()
+
+if __name__ == "__main__":
+    for change in REGISTRYSYNC.sync():
+        print(change.kind, change.action, change.item_id, change.changed_fields)
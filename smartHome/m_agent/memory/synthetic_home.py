@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import random
+import re
+import string
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from smartHome.m_agent.memory.registry_loader import REGISTRYLOADER, DATA_DIR
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 房间：(area_id中的拼音片段, 中文名)，与AreaIndex的ROOM_ALIASES对应，生成的area_id可被房间索引识别
+ROOMS: List[Tuple[str, str]] = [
+    ("ke_ting", "客厅"), ("zhu_wo", "主卧"), ("ci_wo", "次卧"), ("shu_fang", "书房"), ("chu_fang", "厨房"),
+    ("can_ting", "餐厅"), ("wei_sheng_jian", "卫生间"), ("yang_tai", "阳台"), ("er_tong_fang", "儿童房"),
+    ("xuan_guan", "玄关"), ("zou_lang", "走廊"), ("che_ku", "车库"), ("hua_yuan", "花园"),
+]
+# 设备模板：model -> 权重（决定合成家庭中各类设备的比例）
+TEMPLATE_WEIGHTS: Dict[str, float] = {
+    "yeelink.light.mbulb3": 4,  # Yeelight灯泡
+    "philips.light.lite": 2,  # 飞利浦台灯
+    "cuco.plug.cp1": 3,  # 插座
+    "isa.magnet.dw2hl": 2,  # 门窗传感器
+    "xiaomi.motion.pir1": 2,  # 人体传感器
+    "xiaomi.wifispeaker.l15a": 1,  # 小米AI音箱
+    "lumi.gateway.mcn001": 0.5,  # 多模网关
+}
+
+
+@dataclass
+class DeviceTemplate:
+    """一类设备的模板：设备注册信息 + 实体注册信息 + 实体状态（取自原始数据中该型号的第一台设备）"""
+    model: str
+    device: Dict[str, Any]
+    registry_entries: List[Dict[str, Any]]
+    states: List[Dict[str, Any]]
+    # 设备标识（如cn_1061200910），出现在entity_id、unique_id等字段中
+    identifier: str = ""
+    display_name: str = ""
+
+
+@dataclass
+class SyntheticHome:
+    """生成结果，与copied_data下的四个JSON一一对应"""
+    device_registry: Dict[str, Any]
+    entity_registry: Dict[str, Any]
+    entities: List[Dict[str, Any]]
+    domains_services: List[Dict[str, Any]]
+    area_ids: List[str] = field(default_factory=list)
+
+
+class SyntheticHomeGenerator():
+    """
+    合成家庭生成器：以copied_data中的设备为模板，按固定随机种子生成N个设备、M个房间的一致数据集
+    （device_registry.json / entity_registry.json / entities.json / domains_services.json），用于规模测试。
+    复制的设备换用新的设备标识、设备ID和实体注册ID，entity_id保持原有命名规则（如台灯仍为
+    light.philips_cn_<设备号>_lite_s_2），因此模拟HA的服务（包括台灯按钮联动）可直接作用于生成的设备
+    """
+    def __init__(self, source_dir: Optional[str] = None, seed: int = 0):
+        self.source_dir = source_dir or DATA_DIR
+        self.random = random.Random(seed)
+        self._used_identifiers = set()
+        self.templates = self._load_templates()
+
+    def _load(self, file_name: str) -> Any:
+        return REGISTRYLOADER.load(os.path.join(self.source_dir, f"{file_name}.json"))
+
+    def _load_templates(self) -> Dict[str, DeviceTemplate]:
+        devices = self._load("device_registry")["data"]["devices"]
+        registry_entries = self._load("entity_registry")["data"]["entities"]
+        states = {state["entity_id"]: state for state in self._load("entities")}
+        templates = {}
+        for device in devices:
+            if device["model"] in templates or device["model"] not in TEMPLATE_WEIGHTS:
+                continue
+            entries = [entry for entry in registry_entries if entry["device_id"] == device["id"]]
+            templates[device["model"]] = DeviceTemplate(
+                model=device["model"],
+                device=device,
+                registry_entries=entries,
+                states=[states[entry["entity_id"]] for entry in entries if entry["entity_id"] in states],
+                identifier=device["identifiers"][0][1],
+                display_name=device["name"],
+            )
+        return templates
+
+    # ---------------------- 随机标识 ----------------------
+    def _hex(self, length: int) -> str:
+        return "".join(self.random.choice("0123456789abcdef") for _ in range(length))
+
+    def _ulid(self) -> str:
+        return "".join(self.random.choice(string.digits + "ABCDEFGHJKMNPQRSTVWXYZ") for _ in range(26))
+
+    def _new_identifier(self, identifier: str) -> str:
+        """生成与原标识同样形式的新标识：cn_<数字> 或 cn_blt_3_<小写字母数字>"""
+        while True:
+            if identifier.startswith("cn_blt_"):
+                prefix = identifier[:len("cn_blt_3_")]
+                suffix = "".join(self.random.choice(string.ascii_lowercase + string.digits)
+                                 for _ in range(len(identifier) - len(prefix)))
+                new_identifier = prefix + suffix
+            else:
+                new_identifier = "cn_" + str(self.random.randrange(10 ** 8, 10 ** 10))
+            if new_identifier not in self._used_identifiers:
+                self._used_identifiers.add(new_identifier)
+                return new_identifier
+
+    # ---------------------- 生成 ----------------------
+    def _areas(self, area_count: int) -> List[Tuple[str, str]]:
+        """生成(area_id, 房间中文名)；房间不够时同类房间加序号（如ke_ting_2）"""
+        home_prefix = self._hex(12)
+        areas = []
+        for index in range(area_count):
+            pinyin, room = ROOMS[index % len(ROOMS)]
+            round_number = index // len(ROOMS) + 1
+            if round_number > 1:
+                pinyin, room = f"{pinyin}_{round_number}", f"{room}{round_number}"
+            areas.append((f"{home_prefix}_jia_{pinyin}", room))
+        return areas
+
+    def _clone(self, template: DeviceTemplate, area_id: str, name: str) -> Tuple[Dict, List[Dict], List[Dict]]:
+        """复制模板设备：替换设备标识（entity_id/unique_id等随之改变）、设备ID、注册ID和上下文ID"""
+        new_identifier = self._new_identifier(template.identifier)
+        new_device_id = self._hex(32)
+        pattern = re.compile(r"(?<![0-9a-z])" + re.escape(template.identifier) + r"(?![0-9a-z])")
+        payload = pattern.sub(new_identifier, json.dumps(
+            [template.device, template.registry_entries, template.states], ensure_ascii=False
+        ))
+        device, registry_entries, states = json.loads(payload)
+
+        device.update({"id": new_device_id, "area_id": area_id, "name_by_user": name})
+        for entry in registry_entries:
+            entry.update({"id": self._hex(32), "device_id": new_device_id})
+        for state in states:
+            friendly_name = state["attributes"].get("friendly_name")
+            if friendly_name and friendly_name.startswith(template.display_name):
+                state["attributes"]["friendly_name"] = name + friendly_name[len(template.display_name):]
+            state["context"] = {"id": self._ulid(), "parent_id": None, "user_id": None}
+        return device, registry_entries, states
+
+    def generate(self, device_count: int, area_count: int) -> SyntheticHome:
+        """
+        :param device_count: 设备数
+        :param area_count: 房间数
+        """
+        areas = self._areas(area_count)
+        models = list(self.templates)
+        weights = [TEMPLATE_WEIGHTS[model] for model in models]
+        devices, registry_entries, states = [], [], []
+        # (房间, 设备类型) -> 已有数量，用于给同一房间的同类设备编号
+        name_counts: Dict[Tuple[str, str], int] = {}
+        for _ in range(device_count):
+            template = self.templates[self.random.choices(models, weights)[0]]
+            area_id, room = self.random.choice(areas)
+            base_name = template.device.get("name_by_user") or template.display_name
+            count = name_counts[(room, base_name)] = name_counts.get((room, base_name), 0) + 1
+            name = f"{room}{base_name}" + (str(count) if count > 1 else "")
+            device, entries, device_states = self._clone(template, area_id, name)
+            devices.append(device)
+            registry_entries.extend(entries)
+            states.extend(device_states)
+
+        device_registry = self._load("device_registry")
+        device_registry["data"] = {"devices": devices, "deleted_devices": []}
+        entity_registry = self._load("entity_registry")
+        entity_registry["data"] = {"entities": registry_entries, "deleted_entities": []}
+        return SyntheticHome(
+            device_registry=device_registry,
+            entity_registry=entity_registry,
+            entities=states,
+            # 服务按domain定义，与设备数量无关，直接沿用
+            domains_services=self._load("domains_services"),
+            area_ids=[area_id for area_id, _ in areas],
+        )
+
+    @staticmethod
+    def save(home: SyntheticHome, output_dir: str):
+        """写出四个JSON，目录可直接作为SMARTHOME_DATA_DIR或new_home(data_dir=...)使用"""
+        os.makedirs(output_dir, exist_ok=True)
+        for file_name, data in (("device_registry", home.device_registry), ("entity_registry", home.entity_registry),
+                                ("entities", home.entities), ("domains_services", home.domains_services)):
+            with open(os.path.join(output_dir, f"{file_name}.json"), "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以copied_data中的设备为模板生成合成家庭数据")
+    parser.add_argument("--devices", type=int, default=100, help="设备数")
+    parser.add_argument("--areas", type=int, default=8, help="房间数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子，相同参数生成相同数据")
+    parser.add_argument("--output", default=None, help="输出目录，默认temp_output/synthetic_<设备数>_<种子>")
+    args = parser.parse_args()
+
+    output_dir = args.output or os.path.join(current_dir, "temp_output", f"synthetic_{args.devices}_{args.seed}")
+    home = SyntheticHomeGenerator(seed=args.seed).generate(args.devices, args.areas)
+    SyntheticHomeGenerator.save(home, output_dir)
+    print(f"已生成合成家庭：{len(home.device_registry['data']['devices'])}个设备，{len(home.entities)}个实体，"
+          f"{len(home.area_ids)}个房间 -> {output_dir}")
+    print(f"使用方式：SMARTHOME_DATA_DIR={output_dir}")
+
+
+if __name__ == "__main__":
+    main()
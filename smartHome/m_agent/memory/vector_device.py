@@ -13,6 +13,7 @@ from langchain.tools import tool
 from smartHome.m_agent.agent.langchain_middleware import log_response, log_before, log_before_agent, log_after_agent, \
     AgentContext
 from smartHome.m_agent.common.get_llm import get_llm
+from smartHome.m_agent.common.keyed_lock import KeyedLock
 
 
 
@@ -61,12 +62,19 @@ class VectorDB():
         current_dir = os.path.dirname(os.path.abspath(__file__))
         db_dir=f"{GLOBALCONFIG.provider}_{GLOBALCONFIG.model}_chroma_text_db"
         file_path = os.path.join(current_dir, db_dir)
+        self.db_path = file_path
         self.client = chromadb.PersistentClient(path=file_path)
         # 定义极小值，避免除零错误（保证d>0）
         self.epsilon = 1e-6
         # 定义默认距离（无匹配/空集合时使用，代表低匹配度）
         self.default_distance = 1.0
 
+    def reopen(self):
+        """数据库目录被整体替换（如恢复快照）后，丢弃chroma缓存的客户端并重新打开"""
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+        self.client = chromadb.PersistentClient(path=self.db_path)
+
     def get_or_create_collection(self, collection_name: str, device_name: str="N/A") -> Collection:
         """
         获取或者创建以 "设备ID" 为名的集合
@@ -726,6 +734,130 @@ class VectorDB():
         return f"{device_id}({collection.metadata['device_name']}):{'、'.join(unique_contents)}"
 
 VECTORDB=VectorDB()
+# 按设备ID串行化记忆写入：后台多个记忆更新任务同时修改同一设备时，检索-修改-写入不会交错
+DEVICE_WRITE_LOCKS=KeyedLock()
+
+
+class MemoryEdit(BaseModel):
+    """单条记忆修改：new_content为None表示删除old_content对应的记忆"""
+    device_id: str = Field(description="设备ID（即向量库中的集合名）")
+    old_content: str = Field(description="要修改/删除的原有记忆内容")
+    new_content: Optional[str] = Field(default=None, description="新的记忆内容；不填（null）表示删除，不能为空字符串")
+
+
+class NearestDocResolver():
+    """
+    记忆修改的确定性文档定位：
+    对old_content做一次向量检索，若Top1距离足够小、且与Top2拉开足够差距，则直接确定要修改的doc_id；
+    只有不满足条件（有歧义）的修改才交给LLM判断。
+    批量修改时，同一设备的所有old_content合并为一次检索、一次更新和一次删除
+    """
+    def __init__(self, vector_db: VectorDB, max_distance: float = 0.35, min_margin: float = 0.1, topk: int = 3):
+        """
+        :param max_distance: Top1距离上限（Chroma默认L2²距离，越小越相似）
+        :param min_margin: Top2与Top1距离的最小差值
+        :param topk: 检索的候选数量（用于歧义时交给LLM）
+        """
+        self.vector_db = vector_db
+        self.max_distance = max_distance
+        self.min_margin = min_margin
+        self.topk = topk
+
+    def _query_candidates(self, device_id: str, old_contents: List[str]) -> List[List[Dict[str, Any]]]:
+        """对同一设备的多个old_content做一次批量检索，返回每个old_content的候选文档（按距离升序）"""
+        try:
+            collection = self.vector_db.client.get_collection(
+                name=device_id,
+                embedding_function=self.vector_db.embedding_func
+            )
+        except Exception:
+            return [[] for _ in old_contents]
+        doc_count = collection.count()
+        if doc_count == 0:
+            return [[] for _ in old_contents]
+        query_results = collection.query(
+            query_texts=[content.strip() for content in old_contents],
+            n_results=min(self.topk, doc_count),
+            include=["documents", "distances"]
+        )
+        all_candidates = []
+        for ids, documents, distances in zip(query_results["ids"], query_results["documents"],
+                                             query_results["distances"]):
+            all_candidates.append([
+                {"doc_id": doc_id, "content": content, "distance": distance}
+                for doc_id, content, distance in zip(ids, documents, distances)
+            ])
+        return all_candidates
+
+    def pick(self, old_content: str, candidates: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        依据阈值判断是否能确定doc_id
+        :return: 确定的doc_id；有歧义或无候选时返回None
+        """
+        if not candidates:
+            return None
+        top = candidates[0]
+        if top["content"].strip() == old_content.strip():
+            return top["doc_id"]
+        if top["distance"] > self.max_distance:
+            return None
+        if len(candidates) > 1 and candidates[1]["distance"] - top["distance"] < self.min_margin:
+            return None
+        return top["doc_id"]
+
+    def resolve(self, device_id: str, old_content: str) -> Dict[str, Any]:
+        """
+        定位单条记忆
+        :return: {"doc_id": 确定的doc_id或None, "candidates": 候选文档列表}
+        """
+        candidates = self._query_candidates(device_id, [old_content])[0]
+        return {"doc_id": self.pick(old_content, candidates), "candidates": candidates}
+
+    def apply_batch(self, edits: List[MemoryEdit]) -> List[Dict[str, Any]]:
+        """
+        批量执行记忆修改，能确定doc_id的直接写入
+        :param edits: MemoryEdit列表（new_content为None表示删除）
+        :return: 与edits一一对应的结果：{"edit", "status": updated/deleted/ambiguous/not_found/invalid, "doc_id", "candidates"}
+                 new_content为空字符串的修改不执行（status=invalid），避免误删记忆
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(edits)
+        edits_by_device: Dict[str, List[int]] = {}
+        for idx, edit in enumerate(edits):
+            if edit.new_content is not None and not edit.new_content.strip():
+                results[idx] = {"edit": edit, "status": "invalid", "doc_id": None, "candidates": []}
+                continue
+            edits_by_device.setdefault(edit.device_id, []).append(idx)
+
+        for device_id, indexes in edits_by_device.items():
+            with DEVICE_WRITE_LOCKS.hold(device_id):
+                all_candidates = self._query_candidates(device_id, [edits[idx].old_content for idx in indexes])
+                update_ids, update_docs, delete_ids = [], [], []
+                for idx, candidates in zip(indexes, all_candidates):
+                    edit = edits[idx]
+                    doc_id = self.pick(edit.old_content, candidates)
+                    if doc_id is None or doc_id in update_ids or doc_id in delete_ids:
+                        status = "ambiguous" if candidates else "not_found"
+                        results[idx] = {"edit": edit, "status": status, "doc_id": None, "candidates": candidates}
+                        continue
+                    if edit.new_content is not None:
+                        update_ids.append(doc_id)
+                        update_docs.append(edit.new_content.strip())
+                        status = "updated"
+                    else:
+                        delete_ids.append(doc_id)
+                        status = "deleted"
+                    results[idx] = {"edit": edit, "status": status, "doc_id": doc_id, "candidates": candidates}
+
+                if update_ids or delete_ids:
+                    collection = self.vector_db.get_or_create_collection(collection_name=device_id)
+                    if update_ids:
+                        collection.update(ids=update_ids, documents=update_docs)
+                    if delete_ids:
+                        collection.delete(ids=delete_ids)
+        return results
+
+
+NEARESTDOCRESOLVER=NearestDocResolver(VECTORDB)
 
 
 def format_collections_to_string(sorted_collections):
@@ -799,7 +931,8 @@ def add(device_id:str,content:str,tag:str):
         content=content
     )
     setattr(text_instance, tag, True)
-    VECTORDB.add_text_to_vector_db(text_instance,VECTORDB.get_or_create_collection(device_id))
+    with DEVICE_WRITE_LOCKS.hold(device_id):
+        VECTORDB.add_text_to_vector_db(text_instance,VECTORDB.get_or_create_collection(device_id))
     return "添加成功"
 
 @tool
@@ -811,32 +944,46 @@ def tool_update_doc_content(device_id: str,doc_id: str,new_content: str):
 @tool
 def update(device_id:str,old_content:str,new_content:str):
     """
-    添加事实信息
+    更新事实信息：将与old_content最相似的记忆替换为new_content
     :param device_id:
-    :param content:
-    :param tag:
+    :param old_content:
+    :param new_content:
     :return:
     """
-    retrieve_result=VECTORDB.retrieve_similar_content(collection_name=device_id, old_content=old_content)
-    prompt = f"""
-    根据检索结果找到与{old_content}最相似的doc_id，然后调用工具将内容更新为{new_content}
-    【检索结果】:{retrieve_result}
-    """
+    # 检索-修改-写入期间持有该设备的写锁，同一设备的记忆更新串行执行
+    with DEVICE_WRITE_LOCKS.hold(device_id):
+        # 常见情况：Top1明确，一次检索+一次写入完成，不需要LLM
+        result = NEARESTDOCRESOLVER.apply_batch(
+            [MemoryEdit(device_id=device_id, old_content=old_content, new_content=new_content)]
+        )[0]
+        if result["status"] == "updated":
+            return f"更新成功：集合「{device_id}」中的文档「{result['doc_id']}」内容已替换为新内容"
+        if result["status"] == "invalid":
+            return "更新失败：新内容（new_content）不能为空；如需删除记忆请调用delete"
+        if result["status"] == "not_found":
+            return f"更新失败：集合「{device_id}」中无任何文档"
+
+        # 有歧义时才交给LLM从候选中选择
+        retrieve_result = [{"doc_id": c["doc_id"], "content": c["content"]} for c in result["candidates"]]
+        prompt = f"""
+        根据检索结果找到与{old_content}最相似的doc_id，然后调用工具将内容更新为{new_content}
+        【检索结果】:{retrieve_result}
+        """
 
-    agent = create_agent(model=get_llm(),
-                         tools=[tool_update_doc_content],
-                         middleware=[log_before, log_response, log_before_agent, log_after_agent],
-                         context_schema=AgentContext
-                         )
+        agent = create_agent(model=get_llm(),
+                             tools=[tool_update_doc_content],
+                             middleware=[log_before, log_response, log_before_agent, log_after_agent],
+                             context_schema=AgentContext
+                             )
 
-    result = agent.invoke(
-        input={"messages": [
-            {"role": "system", "content": prompt},
-        ]},
-        context=AgentContext(agent_name="对话__记忆更新阶段")
-    )
+        result = agent.invoke(
+            input={"messages": [
+                {"role": "system", "content": prompt},
+            ]},
+            context=AgentContext(agent_name="对话__记忆更新阶段")
+        )
 
-    return result["messages"][-1].content
+        return result["messages"][-1].content
 
 @tool
 def tool_delete_doc_content(device_id: str,doc_id: str):
@@ -847,32 +994,64 @@ def tool_delete_doc_content(device_id: str,doc_id: str):
 @tool
 def delete(device_id:str,content:str):
     """
-    添加事实信息
+    删除事实信息：删除与content最相似的记忆
     :param device_id:
     :param content:
-    :param tag:
     :return:
     """
-    retrieve_result = VECTORDB.retrieve_similar_content(collection_name=device_id, old_content=content)
-    prompt = f"""
-        根据检索结果找到与{content}最相似的doc_id，然后调用工具将其删除
-        【检索结果】:{retrieve_result}
-        """
+    # 检索-修改-写入期间持有该设备的写锁，同一设备的记忆更新串行执行
+    with DEVICE_WRITE_LOCKS.hold(device_id):
+        # 常见情况：Top1明确，一次检索+一次删除完成，不需要LLM
+        result = NEARESTDOCRESOLVER.apply_batch([MemoryEdit(device_id=device_id, old_content=content)])[0]
+        if result["status"] == "deleted":
+            return f"删除成功：集合「{device_id}」中的文档「{result['doc_id']}」已被完整移除"
+        if result["status"] == "not_found":
+            return f"删除失败：集合「{device_id}」中无任何文档"
+
+        # 有歧义时才交给LLM从候选中选择
+        retrieve_result = [{"doc_id": c["doc_id"], "content": c["content"]} for c in result["candidates"]]
+        prompt = f"""
+            根据检索结果找到与{content}最相似的doc_id，然后调用工具将其删除
+            【检索结果】:{retrieve_result}
+            """
 
-    agent = create_agent(model=get_llm(),
-                         tools=[tool_delete_doc_content],
-                         middleware=[log_before, log_response, log_before_agent, log_after_agent],
-                         context_schema=AgentContext
-                         )
+        agent = create_agent(model=get_llm(),
+                             tools=[tool_delete_doc_content],
+                             middleware=[log_before, log_response, log_before_agent, log_after_agent],
+                             context_schema=AgentContext
+                             )
 
-    result = agent.invoke(
-        input={"messages": [
-            {"role": "system", "content": prompt},
-        ]},
-        context=AgentContext(agent_name="检索__删除记忆阶段")
-    )
+        result = agent.invoke(
+            input={"messages": [
+                {"role": "system", "content": prompt},
+            ]},
+            context=AgentContext(agent_name="检索__删除记忆阶段")
+        )
 
-    return result["messages"][-1].content
+        return result["messages"][-1].content
+
+@tool
+def batch_update(edits: List[MemoryEdit]):
+    """
+    批量更新/删除事实信息，一次调用完成多条修改
+    :param edits: 修改列表，每项包含device_id、old_content、new_content（不填new_content表示删除，不能为空字符串）
+    :return: 每条修改的结果；无法确定对应记忆的修改会列出候选，可再调用update/delete逐条处理
+    """
+    results = NEARESTDOCRESOLVER.apply_batch(edits)
+    ans_str_list = []
+    for result in results:
+        edit = result["edit"]
+        if result["status"] in ("updated", "deleted"):
+            action = "更新" if result["status"] == "updated" else "删除"
+            ans_str_list.append(f"{action}成功：{edit.device_id}「{edit.old_content}」(doc_id={result['doc_id']})")
+        elif result["status"] == "not_found":
+            ans_str_list.append(f"失败：{edit.device_id}中无任何记忆「{edit.old_content}」")
+        elif result["status"] == "invalid":
+            ans_str_list.append(f"未执行：{edit.device_id}「{edit.old_content}」的新内容为空（删除请不填new_content）")
+        else:
+            candidates = [c["content"] for c in result["candidates"]]
+            ans_str_list.append(f"未执行（有歧义）：{edit.device_id}「{edit.old_content}」，候选：{candidates}")
+    return "\n".join(ans_str_list)
 
 # @tool
 def get_device_constraints_individual_match_text(
@@ -11,11 +11,8 @@ class Device_info_doc:
         """
         result = []
         from smartHome.m_agent.memory.fake.fake_request import HOMEASSITANT_DATA
-        for entity in HOMEASSITANT_DATA.entities:  # 引用类属性entities
-            entity_id = entity['entity_id']
-            friendly_name = entity['attributes']['friendly_name']
-            capability = entity_id.split('.')[0]
-            result.append(f"{entity_id} ({friendly_name}): {capability}")
+        for record in HOMEASSITANT_DATA.entity_records():  # 紧凑记录，domain已预先解析
+            result.append(f"{record.entity_id} ({record.friendly_name}): {record.domain}")
 
         output = '\n'.join(result)
         return output
@@ -28,10 +25,8 @@ class Device_info_doc:
         """
         capabilities = set()
         from smartHome.m_agent.memory.fake.fake_request import HOMEASSITANT_DATA
-        for entity in HOMEASSITANT_DATA.entities:  # 引用类属性entities
-            entity_id = entity['entity_id']
-            capability = entity_id.split('.')[0]
-            capabilities.add(capability)
+        for record in HOMEASSITANT_DATA.entity_records():  # 紧凑记录，domain已预先解析
+            capabilities.add(record.domain)
 
         result = '\n'.join(sorted(capabilities))
         return result  # 返回结果而非打印
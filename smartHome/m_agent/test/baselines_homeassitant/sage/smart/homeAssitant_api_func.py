@@ -1,14 +1,19 @@
 import json
 
-import requests
 from agent_project.agentcore.config.global_config import HOMEASSITANT_AUTHORIZATION_TOKEN, HOMEASSITANT_SERVER, \
     ACTIVE_PROJECT_ENV, PRIVACYHANDLER
+from smartHome.m_agent.common.ha_client import get_ha_client
 
 token = HOMEASSITANT_AUTHORIZATION_TOKEN
 server = HOMEASSITANT_SERVER
 active_project_env = ACTIVE_PROJECT_ENV
 privacyHandler = PRIVACYHANDLER
 
+
+def _client():
+    """共享连接池的HA客户端（使用本基线自己的地址和令牌）"""
+    return get_ha_client(f"http://{server}", token)
+
 def get_all_entity_id():
     """
     Returns an array of state objects.
@@ -16,19 +21,8 @@ def get_all_entity_id():
     """
     result = None
     if active_project_env == "dev":
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-
-        url = f"http://{server}/api/states"
-
-        # 发送GET请求
-        response = requests.get(url, headers=headers)
-        # 检查请求是否成功
-        response.raise_for_status()
-        # 返回JSON响应内容
-        result = response.json()
+        # 发送GET请求（失败时抛出HTTPError）
+        result = _client().get_states()
 
     return result
 
@@ -37,19 +31,8 @@ def get_services_by_domain(domain):
     return all services included in the domain.
     """
     if active_project_env == "dev":
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-
-        url = f"http://{server}/api/services"
-
-        # 发送GET请求
-        response = requests.get(url, headers=headers)
-        # 检查请求是否成功
-        response.raise_for_status()
-        # 返回JSON响应内容
-        all_domain_and_services = response.json()
+        # 发送GET请求（失败时抛出HTTPError）
+        all_domain_and_services = _client().get_services()
         for domain_entry in all_domain_and_services:
             # 匹配目标 domain
             if domain_entry.get("domain") == domain:
@@ -66,19 +49,8 @@ def get_states_by_entity_id(entity_id) :
 
     result = None
     if active_project_env == "dev":
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-
-        url = f"http://{server}/api/states/{entity_id}"
-
-        # 发送GET请求
-        response = requests.get(url, headers=headers)
-        # 检查请求是否成功
-        response.raise_for_status()
-        # 返回JSON响应内容
-        result = response.json()
+        # 发送GET请求（失败时抛出HTTPError）
+        result = _client().get_state(entity_id)
 
     return result
 
@@ -100,28 +72,8 @@ def execute_domain_service_by_entity_id(
         logger.info("\n请求的body:\n" + body)
     result = None
     if active_project_env == "dev":
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-
-        url = f"http://{server}/api/services/{domain}/{service}"
-        # 设置请求体数据
-        # payload = {
-        #     "entity_id": entity_id
-        # }
-        payload = json.loads(body)
-
-        # 发送POST请求
-        response = requests.post(
-            url=url,
-            json=payload,  # 自动将字典转换为JSON并设置正确的Content-Type
-            headers=headers
-        )
-        # 检查请求是否成功
-        response.raise_for_status()
-        # 返回JSON响应
-        result = response.json()
+        # 发送POST请求（失败时抛出HTTPError）
+        result = _client().call_service(domain, service, json.loads(body))
 
     return result
 
@@ -10,6 +10,7 @@ from chromadb.api.models.Collection import Collection
 from smartHome.m_agent.common.get_llm import get_llm
 from smartHome.m_agent.agent.langchain_middleware import AgentContext, log_before, log_response, log_before_agent, \
     log_after_agent
+from smartHome.m_agent.memory.dialogue_stream import iter_dialogues, iter_batches, IngestCheckpoint
 
 preferences="""
 下面是根据历史交互总结出的您的偏好（按类别整理）：
@@ -114,6 +115,19 @@ class MemoryBank():
         )
         print(f"✅ 文本「{content}」已成功存入向量数据库")
 
+    def add_texts_to_vector_db(self, contents: list[str], collection_name: str = "user"):
+        """将一批交互记录一次性嵌入并存入向量数据库"""
+        if not contents:
+            return
+        collection = self.get_or_create_collection(collection_name)
+
+        # 批量入库：一次调用完成整批的嵌入计算和写入
+        collection.add(
+            ids=[get_short_uuid_by_cut() for _ in contents],
+            documents=contents,
+        )
+        print(f"✅ {len(contents)}条文本已成功存入向量数据库")
+
     def search(self, query: str, top_k: int, collection_name: str = "user") -> list[str]:
         """
         从数据库中检索出与query最相似的topk个记忆，仅返回文档内容列表
@@ -188,48 +202,40 @@ def UserProfileTool(query:str):
     )
     return result["messages"][-1].content
 
-def load_json_and_convert_dialogues():
+def load_json_and_convert_dialogues(json_file_path: str = "./dialogue_records.json"):
     """
-        加载JSON文件，将每段对话转换为一段格式化字符串
-        :param json_file_path: JSON文件的路径（相对路径或绝对路径）
-        :return: 包含每段对话字符串的列表，若执行失败返回空列表
+        流式加载对话记录文件（JSON数组或JSONL），逐段返回格式化后的对话字符串
+        :param json_file_path: 文件的路径（相对路径或绝对路径）
+        :return: 对话字符串的生成器；文件不存在或格式无效时打印错误并结束（格式错误之前已解析的对话照常返回）
         """
-    json_file_path="./dialogue_records.json"
-    # 初始化返回结果列表
-    dialogue_str_list = []
-
-    try:
-        # 1. 打开并加载JSON文件（with语句自动关闭文件，更安全）
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            dialogue_json = json.load(f)
-
-        # 2. 遍历JSON中的每一段对话（外层数组的每个子数组）
-        for single_dialogue in dialogue_json:
-            # 初始化单段对话的拼接字符串
-            dialogue_content = ""
-
-            # 3. 遍历单段对话中的每个角色消息（user/ai）
-            for msg_obj in single_dialogue:
-                # 提取user或ai的内容，避免KeyError
-                if "user" in msg_obj:
-                    dialogue_content += f"用户：{msg_obj['user']}\n"
-                elif "ai" in msg_obj:
-                    dialogue_content += f"AI：{msg_obj['ai']}\n"
-
-            # 4. 去除末尾多余的换行符，添加到结果列表（可选，提升整洁度）
-            dialogue_str_list.append(dialogue_content.rstrip('\n'))
-
-        return dialogue_str_list
-
-    except FileNotFoundError:
+    if not os.path.exists(json_file_path):
         print(f"错误：未找到指定的JSON文件 -> {json_file_path}")
-        return []
+        return
+    try:
+        yield from iter_dialogues(json_file_path)
     except json.JSONDecodeError:
         print("错误：JSON文件格式无效，无法解析")
-        return []
     except Exception as e:
         print(f"错误：执行过程中出现未知异常 -> {str(e)}")
-        return []
+
+def ingest_dialogues_to_memory_bank(json_file_path: str = "./dialogue_records.json", batch_size: int = 64,
+                                    checkpoint_path: str = "./memory_bank_ingest_checkpoint.json") -> int:
+    """
+    流式导入对话记录到向量库：边解析边按批嵌入、按批入库，内存占用与文件大小无关；
+    每批入库后推进检查点，中断后重新执行从检查点继续
+    :return: 已入库的对话数
+    """
+    checkpoint = IngestCheckpoint(checkpoint_path=checkpoint_path, source=json_file_path)
+    watermark = checkpoint.load()
+    dialogues = (
+        dialogue_str for idx, dialogue_str in enumerate(load_json_and_convert_dialogues(json_file_path))
+        if idx >= watermark
+    )
+    for batch in iter_batches(dialogues, batch_size):
+        MEMORYBANK.add_texts_to_vector_db(contents=batch)
+        watermark += len(batch)
+        checkpoint.save(watermark)
+    return watermark
 
 if __name__ == "__main__":
     # 初始偏好画像
@@ -239,9 +245,7 @@ if __name__ == "__main__":
     # print(ans)
 
     # 初始用户交互记录到向量库
-    # dialogue_str_list = load_json_and_convert_dialogues()
-    # for idx, dialogue_str in enumerate(dialogue_str_list, start=1):
-    #     MEMORYBANK.add_text_to_vector_db(content=dialogue_str)
+    # ingest_dialogues_to_memory_bank()
 
     # query="睡觉时的习惯"
     # result=MEMORYBANK.search(query=query, top_k=5)
@@ -3,11 +3,19 @@ import json
 import requests
 
 
-def init_env():
+def init_env(snapshot_name=None, checkpoint_name=None):
     """
+    :param snapshot_name: 记忆快照名；指定时恢复该快照（向量库、事实库、模拟HA状态），
+                          避免上一个用例的记忆更新泄漏到本用例。快照用memory_snapshot的CLI预先保存
+    :param checkpoint_name: 模拟HA的检查点名；指定时从该检查点的实体状态开始（HOMEASSITANT_DATA.checkpoint预先保存）
     :return:
     """
+    if snapshot_name:
+        from smartHome.m_agent.memory.memory_snapshot import MEMORYSNAPSHOT
+        MEMORYSNAPSHOT.restore(snapshot_name)
+        return
     from smartHome.m_agent.memory.fake.fake_request import HOMEASSITANT_DATA
-    HOMEASSITANT_DATA.init_entities()
+    # 只恢复上一个用例修改过的实体，不重新解析entities.json
+    HOMEASSITANT_DATA.reset(checkpoint_name)
     tdel=-1
 
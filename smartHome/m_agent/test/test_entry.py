@@ -5,6 +5,7 @@ import traceback
 from smartHome.m_agent.agent.home_agent import run_ourAgent
 from smartHome.m_agent.common.global_config import GLOBALCONFIG
 from smartHome.m_agent.common.logger import setup_dynamic_indent_logger
+from smartHome.m_agent.memory.memory_snapshot import MEMORYSNAPSHOT
 from smartHome.m_agent.test.baselines_homeassitant.sage.sage_coordinator import run_sageAgent
 from smartHome.m_agent.test.baselines_homeassitant.sashaAgent import run_sashaAgent
 
@@ -17,6 +18,13 @@ def process_testcases(agent_name,testNums=1):
     if agent_name not in ["singleAgent","sashaAgent","sageAgent","ourAgent"]:
         raise ValueError("无效的arg：agent_name")
 
+    # 固定的记忆快照：每个用例开始前（test_cases中的init_pinned_env）恢复该快照，用例中的记忆更新不会泄漏到后续用例。
+    # 快照必须事先在确认干净的记忆状态下保存，不自动保存当前状态（当前状态可能已被之前的运行修改）
+    snapshot_name = GLOBALCONFIG.test_snapshot
+    if not MEMORYSNAPSHOT.exists(snapshot_name):
+        raise FileNotFoundError(f"测试快照「{snapshot_name}」不存在，请先在干净的记忆状态下保存："
+                                f"python -m smartHome.m_agent.memory.memory_snapshot save {snapshot_name}")
+
     # 遍历测试用例
     from test_cases import init_devices
     for index, func in enumerate(init_devices.registered_functions):